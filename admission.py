@@ -0,0 +1,238 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, NamedTuple, Optional, Tuple
+
+from starlette.responses import StreamingResponse
+
+from config import ADMISSION_CPU, ADMISSION_MEMORY_MB, ADMISSION_QUEUE, ADMISSION_TIMEOUT, EXTRACT_WORKERS
+from metrics import ADMISSION_REJECTED, ADMISSION_RESERVED, ADMISSION_WAIT
+
+# 优先级，数值小的先执行；同一优先级按到达顺序
+PRIORITY_CPU = -1        # 已持有内存预算、获取完成后进入提取阶段的请求（见 AdmissionController.cpu_stage）
+PRIORITY_NODE = 0        # 指定 node_id 的 get_figma_data
+PRIORITY_FILE = 1        # 整个文件（get_figma_data、区域查询的空间索引）
+PRIORITY_IMAGES = 2      # download_image
+PRIORITY_EXPORT = 3      # /exports 打包下载
+PRIORITY_BACKGROUND = 4  # 后台刷新与预取
+
+# 原始 JSON 解码为 Python 对象、再提取为精简树后的内存约为响应大小的倍数
+EXPANSION = 8
+# 未获取过的响应按该大小（MB）估算；depth 不超过 2 的文件请求按节点请求估算
+DEFAULT_NODE_MB = 2
+DEFAULT_FILE_MB = 16
+# 每张位图解码与处理（裁剪、转码）占用的内存（MB），按 2 倍导出估算，随 png_scale 的平方缩放
+IMAGE_MB = 4
+# 记录最近响应大小的地址数
+SIZE_ENTRIES = 1024
+
+
+class Overloaded(Exception):
+    """
+    超出预算且无法排队的请求：等待队列已满或排队超时；retry_after 为建议的重试等待秒数
+    """
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Cost(NamedTuple):
+    memory_mb: float
+    cpu: float
+
+
+def design_cost(size: Optional[int], node: bool, depth: Optional[int]) -> Cost:
+    """
+    size 为同一地址上次的响应字节数；整个文件且 FIGMA_EXTRACT_WORKERS 大于 1 时按并行提取的进程数计 CPU
+    """
+    if size:
+        memory = size / 1024 / 1024 * EXPANSION
+    elif node or (depth is not None and depth <= 2):
+        memory = DEFAULT_NODE_MB * EXPANSION
+    else:
+        memory = DEFAULT_FILE_MB * EXPANSION
+    return Cost(memory, 1 if node else max(EXTRACT_WORKERS, 1))
+
+
+def image_cost(count: int, scale: float, variants: bool = False) -> Cost:
+    per_image = IMAGE_MB * max(scale, 1) ** 2 / 4 * (2 if variants else 1)
+    return Cost(count * per_image, 1)
+
+
+class Ticket:
+    """
+    已分配的预算；released 保证同一份预算只归还一次
+    """
+
+    def __init__(self, tool: str, cost: Cost):
+        self.tool = tool
+        self.cost = cost
+        self.released = False
+
+
+class AdmissionController:
+    """
+    按估算的内存与 CPU 占用准入工具调用：预算不足时按优先级排队，队列已满或排队超时则立即抛出 Overloaded；
+    单个超过整个预算的请求在没有其他请求执行时独占执行。预算按进程计算，只在事件循环中使用
+    """
+
+    def __init__(self, memory_mb: float, cpu: float, max_queue: int, timeout: float):
+        self.memory_mb = memory_mb
+        self.cpu = max(cpu, 1)
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.used_memory = 0.0
+        self.used_cpu = 0.0
+        self.running = 0
+        self.waiting: List[Tuple[int, int, Ticket, asyncio.Future]] = []
+        self.counter = itertools.count()
+        self.sizes: "OrderedDict[str, int]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.memory_mb > 0
+
+    def record_size(self, endpoint: str, size: int):
+        self.sizes[endpoint] = size
+        self.sizes.move_to_end(endpoint)
+        while len(self.sizes) > SIZE_ENTRIES:
+            self.sizes.popitem(last=False)
+
+    def expected_size(self, endpoint: str) -> Optional[int]:
+        return self.sizes.get(endpoint)
+
+    def clamp(self, cost: Cost) -> Cost:
+        return Cost(min(cost.memory_mb, self.memory_mb), min(cost.cpu, self.cpu))
+
+    def fits(self, cost: Cost) -> bool:
+        return self.running == 0 or (
+            self.used_memory + cost.memory_mb <= self.memory_mb and self.used_cpu + cost.cpu <= self.cpu
+        )
+
+    def reserve(self, ticket: Ticket):
+        self.used_memory += ticket.cost.memory_mb
+        self.used_cpu += ticket.cost.cpu
+        self.running += 1
+        self.update_gauges()
+
+    def queued(self) -> int:
+        return sum(1 for entry in self.waiting if not entry[3].done())
+
+    def update_gauges(self):
+        ADMISSION_RESERVED.set(self.used_memory, resource="memory_mb")
+        ADMISSION_RESERVED.set(self.used_cpu, resource="cpu")
+        ADMISSION_RESERVED.set(self.queued(), resource="queued")
+
+    def dispatch(self):
+        # 严格按优先级：队首放不下时后面的请求也继续等待，避免大请求一直排不上
+        while self.waiting:
+            _, _, ticket, future = self.waiting[0]
+            if future.done():
+                heapq.heappop(self.waiting)
+                continue
+            if not self.fits(ticket.cost):
+                break
+            heapq.heappop(self.waiting)
+            self.reserve(ticket)
+            future.set_result(None)
+        self.update_gauges()
+
+    def reject(self, tool: str, reason: str, message: str):
+        ADMISSION_REJECTED.inc(tool=tool, reason=reason)
+        raise Overloaded(f"Server busy ({message}), retry after {self.timeout:g}s", self.timeout)
+
+    async def acquire(self, tool: str, cost: Cost, priority: int) -> Optional[Ticket]:
+        if not self.enabled:
+            return None
+        ticket = Ticket(tool, self.clamp(cost))
+        start = time.perf_counter()
+        if not any(entry[0] <= priority and not entry[3].done() for entry in self.waiting) and self.fits(ticket.cost):
+            self.reserve(ticket)
+            ADMISSION_WAIT.observe(0, tool=tool)
+            return ticket
+        # 提取阶段的请求已持有内存预算、完成了获取，不因队列已满而放弃
+        if self.queued() >= self.max_queue and priority > PRIORITY_CPU:
+            self.reject(tool, "queue_full", f"{self.queued()} requests queued")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiting, (priority, next(self.counter), ticket, future))
+        self.update_gauges()
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.dispatch()
+                self.reject(tool, "timeout", f"queued for {self.timeout:g}s, {self.used_memory:.0f}MB / {self.memory_mb:.0f}MB reserved")
+        except asyncio.CancelledError:
+            # 调用方取消时，已分配的预算交给 release 归还，未分配的直接出队
+            if future.done() and not future.cancelled():
+                self.release(ticket)
+            else:
+                future.cancel()
+                self.dispatch()
+            raise
+        ADMISSION_WAIT.observe(time.perf_counter() - start, tool=tool)
+        return ticket
+
+    def release(self, ticket: Optional[Ticket]):
+        """
+        可重复调用，只有第一次归还预算
+        """
+        if ticket is None or ticket.released:
+            return
+        ticket.released = True
+        self.used_memory = max(self.used_memory - ticket.cost.memory_mb, 0.0)
+        self.used_cpu = max(self.used_cpu - ticket.cost.cpu, 0.0)
+        self.running -= 1
+        self.dispatch()
+
+    @asynccontextmanager
+    async def admit(self, tool: str, cost: Cost, priority: int) -> AsyncIterator[None]:
+        ticket = await self.acquire(tool, cost, priority)
+        try:
+            yield
+        finally:
+            self.release(ticket)
+
+    def memory_stage(self, tool: str, cost: Cost, priority: int):
+        """
+        获取与提取分两段准入：整个过程只占用内存预算，等待上游响应时不占 CPU，
+        CPU 在提取时由嵌套的 cpu_stage 占用
+        """
+        return self.admit(tool, Cost(cost.memory_mb, 0), priority)
+
+    def cpu_stage(self, tool: str, cost: Cost):
+        """
+        在 memory_stage 内执行 CPU 密集的提取：只占用 CPU，优先于尚未开始的请求，
+        不会等待内存，因此不会与持有内存等待 CPU 的请求互相等待
+        """
+        return self.admit(f"{tool}:cpu", Cost(0, cost.cpu), PRIORITY_CPU)
+
+
+class AdmittedStreamingResponse(StreamingResponse):
+    """
+    发送完毕、出错或客户端断开后关闭响应体并归还预算；客户端在响应体开始迭代前断开时同样归还
+    """
+
+    def __init__(self, content: AsyncIterator[bytes], ticket: Optional[Ticket], **kwargs):
+        super().__init__(content, **kwargs)
+        self.ticket = ticket
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            try:
+                aclose = getattr(self.body_iterator, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            finally:
+                ADMISSION.release(self.ticket)
+
+
+ADMISSION = AdmissionController(ADMISSION_MEMORY_MB, ADMISSION_CPU, ADMISSION_QUEUE, ADMISSION_TIMEOUT)
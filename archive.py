@@ -0,0 +1,143 @@
+import asyncio
+import json
+import time
+import zipfile
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional, Tuple
+
+# 每个进行中的下载最多缓冲的分块数，内存占用约为 并发数 × QUEUE_CHUNKS × 分块大小
+QUEUE_CHUNKS = 8
+# 已压缩的位图直接存储，SVG 等文本格式使用 deflate
+DEFLATE_SUFFIXES = (".svg", ".json", ".txt")
+
+
+class ZipStream:
+    """
+    写入不可 seek 的流的 zip（条目使用 data descriptor），输出的字节暂存在 chunks 中，由调用方随写随取
+    """
+
+    def __init__(self):
+        self.chunks: List[bytes] = []
+        self.names: set = set()
+        self.zip = zipfile.ZipFile(self, "w")
+
+    def write(self, data: bytes) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+    def unique_name(self, name: str) -> str:
+        base, dot, ext = name.rpartition(".")
+        if not dot:
+            base, ext = name, ""
+        candidate, index = name, 1
+        while candidate in self.names:
+            candidate = f"{base}-{index}{dot}{ext}"
+            index += 1
+        self.names.add(candidate)
+        return candidate
+
+    def open(self, name: str):
+        info = zipfile.ZipInfo(name, time.localtime()[:6])
+        info.compress_type = zipfile.ZIP_DEFLATED if name.lower().endswith(DEFLATE_SUFFIXES) else zipfile.ZIP_STORED
+        return self.zip.open(info, "w")
+
+    def mark_partial(self, name: str) -> str:
+        """
+        中途失败的条目：内容已随本地文件头输出，无法撤回，改为在中央目录中以 <name>.partial 列出，
+        解压工具按中央目录命名，不会得到与正常文件同名的不完整文件
+        """
+        partial = self.unique_name(f"{name}.partial")
+        info = self.zip.NameToInfo.pop(name)
+        info.filename = info.orig_filename = partial
+        self.zip.NameToInfo[partial] = info
+        return partial
+
+    def close(self):
+        self.zip.close()
+
+
+ArchiveEntry = Tuple[str, Callable[[], AsyncIterator[bytes]], Optional[Callable[[bytes], bytes]]]
+
+
+async def stream_zip(entries: List[ArchiveEntry], concurrency: int, manifest: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+    """
+    按顺序把 (文件名, 内容分块的异步迭代器, 可选的整体处理函数) 写入 zip 并逐块输出；
+    之后的 concurrency 个条目提前开始下载，各自最多缓冲 QUEUE_CHUNKS 个分块。
+    有处理函数的条目（如裁剪）需要完整内容，会整体读入后在线程中处理，失败时不写入；
+    边下载边写入的条目中途失败时以 <name>.partial 列出（见 ZipStream.mark_partial）；
+    最后写入 manifest.json，记录每个文件的大小或失败原因
+    """
+    archive = ZipStream()
+    files: List[Dict[str, Any]] = []
+    pending: Deque[Tuple[ArchiveEntry, asyncio.Queue, asyncio.Task]] = deque()
+    upcoming = iter(entries)
+    current: Optional[asyncio.Task] = None
+
+    async def produce(source: Callable[[], AsyncIterator[bytes]], queue: asyncio.Queue):
+        try:
+            async for chunk in source():
+                await queue.put(chunk)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    def refill():
+        while len(pending) < max(concurrency, 1):
+            entry = next(upcoming, None)
+            if entry is None:
+                return
+            queue: asyncio.Queue = asyncio.Queue(QUEUE_CHUNKS)
+            pending.append((entry, queue, asyncio.create_task(produce(entry[1], queue))))
+
+    try:
+        refill()
+        while pending:
+            (name, _, transform), queue, current = pending.popleft()
+            refill()
+            name = archive.unique_name(name)
+            size = 0
+            error: Optional[str] = None
+            if transform is None:
+                # 边下载边写入（data descriptor，CRC 逐块计算），内存占用与文件大小无关
+                with archive.open(name) as target:
+                    while (chunk := await queue.get()) is not None:
+                        if isinstance(chunk, Exception):
+                            error = str(chunk)
+                            break
+                        target.write(chunk)
+                        size += len(chunk)
+                        yield archive.take()
+                if error is not None:
+                    name = archive.mark_partial(name)
+            else:
+                parts = []
+                while (chunk := await queue.get()) is not None:
+                    if isinstance(chunk, Exception):
+                        error = str(chunk)
+                        break
+                    parts.append(chunk)
+                if error is None:
+                    data = await asyncio.to_thread(transform, b"".join(parts))
+                    with archive.open(name) as target:
+                        target.write(data)
+                    size = len(data)
+            files.append({"fileName": name, "bytes": size, **({"error": error} if error else {})})
+            yield archive.take()
+
+        with archive.open(archive.unique_name("manifest.json")) as target:
+            target.write(json.dumps({**(manifest or {}), "files": files}, ensure_ascii=False, indent=2).encode("utf-8"))
+        archive.close()
+        yield archive.take()
+    finally:
+        # 客户端断开时取消仍在进行的下载
+        for task in [current, *(task for _, _, task in pending)]:
+            if task is not None:
+                task.cancel()
@@ -0,0 +1,64 @@
+"""
+批量颜色与几何转换的交叉点测试：对比逐节点转换与批量转换（NumPy / 纯 Python）在不同规模下的耗时
+
+    python -m benchmarks.bench_batch
+    python -m benchmarks.bench_batch --sizes 100 1000 10000 100000
+"""
+import argparse
+import time
+
+from benchmarks.fixtures import synthetic_nodes
+from handle_batch import collect, convert_colors_numpy, convert_colors_python, convert_geometry_numpy, convert_geometry_python, load_numpy
+from utils import COLOR_CACHE, compute_color, pixel_round
+
+
+def best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        COLOR_CACHE.clear()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def per_node(colors: list, boxes: list):
+    # 模拟提取阶段逐个调用转换函数的开销（不含缓存命中）
+    for key in colors:
+        compute_color(*key)
+    for _, x, y, parent_x, parent_y, width, height in boxes:
+        if parent_x is not None:
+            pixel_round(x - parent_x)
+            pixel_round(y - parent_y)
+        pixel_round(width)
+        pixel_round(height)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000, 50000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    has_numpy = load_numpy()
+    if not has_numpy:
+        print("NumPy 未安装，仅测试纯 Python 批量实现")
+
+    # batch 列为 collect + numpy，与 per-node 比较即可得到交叉点
+    print(f"{'nodes':>8}{'colors':>8}{'boxes':>8}{'collect ms':>12}{'per-node ms':>13}{'python ms':>11}{'numpy ms':>10}{'batch ms':>10}")
+    for size in args.sizes:
+        raw = synthetic_nodes(size)
+        frames = [n["document"] for n in raw["nodes"].values()]
+        collect_ms = best_of(lambda: collect(frames), args.repeat)
+        colors, boxes = collect(frames)
+        colors = list(colors)
+
+        per_node_ms = best_of(lambda: per_node(colors, boxes), args.repeat)
+        python_ms = best_of(lambda: (convert_colors_python(colors), convert_geometry_python(boxes)), args.repeat)
+        numpy_ms = best_of(lambda: (convert_colors_numpy(colors), convert_geometry_numpy(boxes)), args.repeat) if has_numpy else float("nan")
+        batch_ms = collect_ms + (numpy_ms if has_numpy else python_ms)
+        print(f"{size:>8}{len(colors):>8}{len(boxes):>8}{collect_ms:>12.2f}{per_node_ms:>13.2f}{python_ms:>11.2f}{numpy_ms:>10.2f}{batch_ms:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+转换函数微基准：逐个测量 paint / layout 转换的单次调用耗时，以及整棵树的单节点提取耗时
+
+    python -m benchmarks.bench_converters
+    python -m benchmarks.bench_converters --json bench_converters.json   # 保存结果便于对比
+"""
+import argparse
+import json
+import timeit
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.fixtures import synthetic_nodes
+from handle_layout import build_frame, build_layout, convert_align, convert_self_align, convert_sizing
+from main import parse_node
+from utils import convert_color, format_rgba_color, parse_paint, translate_scale_mode
+
+COLOR = {"r": 0.2, "g": 0.4, "b": 0.9, "a": 1}
+SOLID = {"type": "SOLID", "color": COLOR}
+SOLID_ALPHA = {"type": "SOLID", "color": COLOR, "opacity": 0.5}
+IMAGE = {"type": "IMAGE", "imageRef": "abc", "scaleMode": "FILL", "scalingFactor": None}
+IMAGE_CROP = {**IMAGE, "imageTransform": [[0.5, 0, 0.25], [0, 0.5, 0.25]]}
+GRADIENT = {
+    "type": "GRADIENT_LINEAR",
+    "gradientHandlePositions": [{"x": 0, "y": 0}, {"x": 1, "y": 1}],
+    "gradientStops": [{"position": 0, "color": COLOR}, {"position": 1, "color": {"r": 1, "g": 1, "b": 1, "a": 1}}],
+}
+PATTERN = {"type": "PATTERN", "sourceNodeId": "1:2", "horizontalAlignment": "CENTER", "verticalAlignment": "END"}
+CHILDREN = [{"layoutSizingHorizontal": "FILL", "layoutSizingVertical": "HUG"} for _ in range(4)]
+FRAME = {
+    "clipsContent": True,
+    "layoutMode": "HORIZONTAL",
+    "primaryAxisAlignItems": "SPACE_BETWEEN",
+    "counterAxisAlignItems": "CENTER",
+    "itemSpacing": 8,
+    "paddingLeft": 16,
+    "paddingRight": 16,
+    "children": CHILDREN,
+}
+BOX = {"x": 10, "y": 20, "width": 100, "height": 40}
+NODE = {"absoluteBoundingBox": BOX, "layoutSizingHorizontal": "FIXED", "layoutSizingVertical": "FIXED"}
+PARENT = {"clipsContent": True, "layoutMode": "NONE", "absoluteBoundingBox": {"x": 0, "y": 0, "width": 400, "height": 400}}
+
+CASES: List[Tuple[str, Callable[[], object]]] = [
+    ("convert_color", lambda: convert_color(COLOR, 0.8)),
+    ("format_rgba_color", lambda: format_rgba_color(COLOR, 0.8)),
+    ("parse_paint[SOLID]", lambda: parse_paint(SOLID)),
+    ("parse_paint[SOLID+opacity]", lambda: parse_paint(SOLID_ALPHA)),
+    ("parse_paint[IMAGE]", lambda: parse_paint(IMAGE, True)),
+    ("parse_paint[IMAGE+crop]", lambda: parse_paint(IMAGE_CROP)),
+    ("parse_paint[GRADIENT]", lambda: parse_paint(GRADIENT)),
+    ("parse_paint[PATTERN]", lambda: parse_paint(PATTERN)),
+    ("translate_scale_mode", lambda: translate_scale_mode("FIT", False)),
+    ("convert_align", lambda: convert_align("CENTER", {"children": CHILDREN, "axis": "primary", "mode": "row"})),
+    ("convert_self_align", lambda: convert_self_align("STRETCH")),
+    ("convert_sizing", lambda: convert_sizing("FILL")),
+    ("build_frame", lambda: build_frame(FRAME)),
+    ("build_layout", lambda: build_layout(NODE, "none", PARENT)),
+]
+
+
+def bench_case(fn: Callable[[], object], repeat: int) -> float:
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    # 取多轮中的最小值，单位纳秒/次
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+
+def bench_extraction(node_count: int, repeat: int) -> float:
+    raw = synthetic_nodes(node_count)
+    best = min(timeit.repeat(lambda: parse_node(raw, {"maxDepth": None}), repeat=repeat, number=1))
+    return best / node_count * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--nodes", type=int, default=5000, help="单节点提取耗时所用合成文档的节点数")
+    parser.add_argument("--json", dest="output", help="将结果写入 JSON 文件")
+    args = parser.parse_args()
+
+    results: Dict[str, float] = {}
+    for name, fn in CASES:
+        results[name] = bench_case(fn, args.repeat)
+        print(f"{name:<32}{results[name]:>10.0f} ns/call")
+
+    name = f"parse_node per node ({args.nodes})"
+    results[name] = bench_extraction(args.nodes, args.repeat)
+    print(f"{name:<32}{results[name]:>10.0f} ns/node")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
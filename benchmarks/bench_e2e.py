@@ -0,0 +1,200 @@
+"""
+端到端基准：本地桩服务回放 Figma 响应，MCP 服务以子进程运行，通过 MCP 客户端调用工具，
+记录工具延迟、并发会话吞吐、服务进程峰值 RSS 以及 parse_node / download_images 各阶段耗时，结果写入 JSON 文件
+
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --sizes 1000 10000 100000 --concurrency 4 --output results.json
+    python -m benchmarks.bench_e2e --fixtures recordings/ --file-keys <file_key>
+    python -m benchmarks.bench_e2e --compare base.json new.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+from benchmarks.harness import ROOT, ServerProcess, call_tool, mcp_session, scrape_stages, stage_delta, summarize
+from benchmarks.stub_server import start_stub, walk
+
+RESULTS_DIR = ROOT / "benchmarks" / "results"
+
+
+async def run_calls(base_url: str, tool: str, arguments: Dict[str, Any], sessions: int, calls: int) -> Dict[str, Any]:
+    """
+    sessions 个会话并发，每个会话顺序调用 calls 次
+    """
+    latencies: List[float] = []
+    errors = 0
+    sizes: List[int] = []
+
+    async def worker():
+        nonlocal errors
+        async with mcp_session(base_url) as session:
+            for _ in range(calls):
+                elapsed, ok, size = await call_tool(session, tool, arguments)
+                if ok:
+                    latencies.append(elapsed)
+                    sizes.append(size)
+                else:
+                    errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(sessions)))
+    wall = time.perf_counter() - start
+    return {
+        "sessions": sessions,
+        "calls": sessions * calls,
+        "errors": errors,
+        "wallSeconds": round(wall, 4),
+        "throughput": round(len(latencies) / wall, 3) if wall else None,
+        "latency": summarize(latencies),
+        "outputBytes": max(sizes) if sizes else 0,
+    }
+
+
+def download_nodes(document: dict, count: int) -> List[dict]:
+    """
+    从文档中选取图片填充（imageRef）、PNG 渲染节点与 SVG 图标，各占约三分之一
+    """
+    fills, frames, vectors = [], [], []
+    for node in walk(document["document"]):
+        for paint in node.get("fills", []):
+            if paint.get("type") == "IMAGE" and paint.get("imageRef"):
+                fills.append({"imageRef": paint["imageRef"], "fileName": f"{paint['imageRef']}.png", "requiresImageDimensions": True})
+        if node.get("type") == "FRAME":
+            frames.append({"nodeId": node["id"], "fileName": f"frame-{node['id'].replace(':', '-')}.png"})
+        elif node.get("type") == "VECTOR" and not node["id"].startswith("I"):
+            vectors.append({"nodeId": node["id"], "fileName": f"icon-{node['id'].replace(':', '-')}.svg"})
+    per_kind = max(1, count // 3)
+    return fills[:per_kind] + frames[:per_kind] + vectors[:count - 2 * per_kind]
+
+
+async def run_scenario(server: ServerProcess, name: str, tool: str, arguments: Dict[str, Any], args) -> Dict[str, Any]:
+    server.reset_peak_rss()
+    before = scrape_stages(server.base_url)
+    # 第一次调用包含桩服务生成文档与服务端冷启动的开销，单独记录
+    cold = await run_calls(server.base_url, tool, arguments, 1, 1)
+    sequential = await run_calls(server.base_url, tool, arguments, 1, args.repeat)
+    concurrent = await run_calls(server.base_url, tool, arguments, args.concurrency, args.repeat) if args.concurrency > 1 else None
+    after = scrape_stages(server.base_url)
+    result = {
+        "name": name,
+        "tool": tool,
+        "coldSeconds": cold["latency"]["max"],
+        "sequential": sequential,
+        "concurrent": concurrent,
+        "peakRssMb": server.peak_rss_mb(),
+        "stages": stage_delta(before, after),
+    }
+    latency = sequential["latency"]
+    p50 = f"{latency['p50'] * 1000:.1f}" if latency["p50"] is not None else "-"
+    throughput = concurrent["throughput"] if concurrent else sequential["throughput"]
+    print(f"{name:<34}{p50:>10} ms p50{throughput or 0:>10.2f} calls/s{result['peakRssMb'] or 0:>10.1f} MB"
+          f"  errors {sequential['errors'] + (concurrent['errors'] if concurrent else 0)}")
+    return result
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def run(args) -> Dict[str, Any]:
+    stub = start_stub(fixtures_dir=args.fixtures, latency=args.latency, image_size=args.image_size)
+    file_keys = args.file_keys or [f"synthetic-{size}" for size in args.sizes]
+    env = {key: value for key, value in (item.split("=", 1) for item in args.env)}
+    scenarios = []
+    with ServerProcess(f"{stub.base_url}/v1", env=env) as server:
+        for file_key in file_keys:
+            scenarios.append(await run_scenario(server, f"get_figma_data {file_key}", "get_figma_data", {
+                "file_key": file_key,
+                "node_id": "",
+                "output_format": args.output_format,
+            }, args))
+
+        download_key = args.download_file_key or file_keys[0]
+        nodes = download_nodes(stub.store.get_file(download_key), args.images)
+        with tempfile.TemporaryDirectory() as local_path:
+            scenarios.append(await run_scenario(server, f"download_image x{len(nodes)}", "download_image", {
+                "file_key": download_key,
+                "nodes": nodes,
+                "png_scale": 2,
+                "local_path": local_path,
+            }, args))
+    stub.shutdown()
+
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "revision": git_revision(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "cpuCount": os.cpu_count(),
+            "options": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "stubRequests": stub.request_count,
+        },
+        "scenarios": scenarios,
+    }
+
+
+def compare(base_path: str, new_path: str):
+    base = {s["name"]: s for s in json.loads(Path(base_path).read_text(encoding="utf-8"))["scenarios"]}
+    new = {s["name"]: s for s in json.loads(Path(new_path).read_text(encoding="utf-8"))["scenarios"]}
+
+    def ratio(old, current):
+        return f"{current / old:>8.2f}x" if old and current is not None else f"{'-':>9}"
+
+    print(f"{'scenario':<34}{'p50':>9}{'p95':>9}{'calls/s':>9}{'rss':>9}")
+    for name, scenario in new.items():
+        if name not in base:
+            continue
+        old = base[name]
+        old_concurrent = old["concurrent"] or old["sequential"]
+        new_concurrent = scenario["concurrent"] or scenario["sequential"]
+        print(
+            f"{name:<34}"
+            f"{ratio(old['sequential']['latency']['p50'], scenario['sequential']['latency']['p50'])}"
+            f"{ratio(old['sequential']['latency']['p95'], scenario['sequential']['latency']['p95'])}"
+            f"{ratio(old_concurrent['throughput'], new_concurrent['throughput'])}"
+            f"{ratio(old['peakRssMb'], scenario['peakRssMb'])}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000], help="合成文档的节点数")
+    parser.add_argument("--fixtures", help="录制的响应目录（见 benchmarks.stub_server record）")
+    parser.add_argument("--file-keys", nargs="+", help="要测试的 file_key，默认为各规模的合成文档")
+    parser.add_argument("--download-file-key", help="download_image 使用的 file_key，默认为第一个")
+    parser.add_argument("--images", type=int, default=12, help="download_image 每次下载的图片数")
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--repeat", type=int, default=3, help="每个会话的调用次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发会话数")
+    parser.add_argument("--latency", type=float, default=0.0, help="桩服务的模拟 API 延迟（秒）")
+    parser.add_argument("--output-format", default="json")
+    parser.add_argument("--env", nargs="*", default=[], help="传给 MCP 服务的环境变量，如 FIGMA_EXTRACT_WORKERS=4")
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/e2e-<时间>.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="对比两次结果")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    results = asyncio.run(run(args))
+    output = Path(args.output) if args.output else RESULTS_DIR / f"e2e-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results: {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+对比 get_figma_data 各输出编码的体积：字节数与估算 token 数
+
+    python -m benchmarks.bench_encoding                     # 使用合成文档
+    python -m benchmarks.bench_encoding response.json ...   # 使用录制的 Figma 响应
+"""
+import argparse
+import re
+import time
+from typing import Callable
+
+from benchmarks.fixtures import load_samples
+from encoding import OUTPUT_FORMATS, encode_design
+from main import parse_node
+
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]|\s+", re.UNICODE)
+
+
+def token_counter() -> Callable[[str], int]:
+    """
+    优先使用 tiktoken 计数；未安装时按单词、标点与空白段近似估算
+    """
+    try:
+        import tiktoken
+        encoder = tiktoken.get_encoding("cl100k_base")
+        return lambda text: len(encoder.encode(text))
+    except ImportError:
+        return lambda text: len(TOKEN_PATTERN.findall(text))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="录制的 /files 或 /nodes 响应 JSON")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="合成文档节点数")
+    parser.add_argument("--compress-components", action="store_true", help="启用组件压缩")
+    args = parser.parse_args()
+
+    count_tokens = token_counter()
+    print(f"{'sample':<24}{'format':<10}{'bytes':>12}{'tokens':>12}{'encode ms':>12}")
+    for name, raw in load_samples(args.files, args.sizes).items():
+        design = parse_node(raw, {"maxDepth": None, "compressComponents": args.compress_components})
+        for output_format in OUTPUT_FORMATS:
+            start = time.perf_counter()
+            text = encode_design(design, output_format)
+            elapsed = (time.perf_counter() - start) * 1000
+            size = len(text.encode("utf-8"))
+            print(f"{name:<24}{output_format:<10}{size:>12}{count_tokens(text):>12}{elapsed:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+JSON 序列化基准：对比 parse_node 输出的序列化方式，以及 Figma 原始响应的解析方式
+
+    python -m benchmarks.bench_serialize
+    python -m benchmarks.bench_serialize --sizes 1000 10000 50000
+"""
+import argparse
+import json
+import time
+from typing import Callable, Dict
+
+import pydantic_core
+
+from benchmarks.fixtures import synthetic_nodes
+from main import parse_node
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def best_of(fn: Callable[[], object], repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson 未安装，仅测试标准库与 pydantic")
+
+    for size in args.sizes:
+        raw = synthetic_nodes(size)
+        raw_bytes = json.dumps(raw).encode("utf-8")
+        design = parse_node(raw, {"maxDepth": None})
+
+        # FastMCP 对非字符串返回值使用 pydantic_core.to_json(indent=2)
+        dumps_cases: Dict[str, Callable[[], object]] = {
+            "pydantic to_json indent=2": lambda: pydantic_core.to_json(design, fallback=str, indent=2),
+            "json.dumps indent=2": lambda: json.dumps(design, ensure_ascii=False, indent=2),
+            "json.dumps compact": lambda: json.dumps(design, ensure_ascii=False, separators=(",", ":")),
+            "pydantic to_json compact": lambda: pydantic_core.to_json(design),
+        }
+        loads_cases: Dict[str, Callable[[], object]] = {
+            "json.loads": lambda: json.loads(raw_bytes),
+        }
+        if orjson is not None:
+            dumps_cases["orjson indent=2"] = lambda: orjson.dumps(design, option=orjson.OPT_INDENT_2).decode("utf-8")
+            dumps_cases["orjson compact"] = lambda: orjson.dumps(design).decode("utf-8")
+            loads_cases["orjson.loads"] = lambda: orjson.loads(raw_bytes)
+
+        output_size = len(json.dumps(design, ensure_ascii=False).encode("utf-8"))
+        print(f"\n{size} nodes: output {output_size / 1024:.0f} KiB, raw response {len(raw_bytes) / 1024:.0f} KiB")
+        for name, fn in {**dumps_cases, **loads_cases}.items():
+            print(f"  {name:<28}{best_of(fn, args.repeat):>10.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+冷启动基准：服务进程启动到首个 list_tools 响应的耗时，以及 `python -X importtime` 的导入耗时报告
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --target 1.5 --top 20 --output startup.json
+
+目标时间未达成时以退出码 1 结束，可直接用于 CI
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_e2e import RESULTS_DIR
+from benchmarks.harness import ROOT, ServerProcess, mcp_session
+from benchmarks.stub_server import start_stub
+
+# 这些模块应在首次需要时才导入（见 handle_image、handle_batch）
+LAZY_MODULES = ("PIL", "aiohttp", "numpy")
+
+
+def import_report(top: int) -> Dict[str, Any]:
+    """
+    解析 -X importtime 输出（微秒），按累计耗时列出顶层导入最慢的模块
+    """
+    code = f"import sys, main; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    modules = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        if not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        modules.append({
+            "module": name.strip(),
+            "depth": (len(name) - len(name.lstrip())) // 2,
+            "selfMs": int(fields[0]) / 1000,
+            "cumulativeMs": int(fields[1]) / 1000,
+        })
+    main_module = next((m for m in modules if m["module"] == "main"), None)
+    # 只列出 main 直接或间接导入的第一、二层模块，避免重复统计
+    top_modules = sorted((m for m in modules if m["depth"] <= 2), key=lambda m: m["cumulativeMs"], reverse=True)[:top]
+    return {
+        "importMainMs": main_module["cumulativeMs"] if main_module else None,
+        "processWallMs": round(wall * 1000, 1),
+        "eagerLazyModules": [m for m in completed.stdout.strip().split(",") if m],
+        "topModules": top_modules,
+    }
+
+
+async def first_list_tools(server: ServerProcess, timeout: float) -> float:
+    """
+    从启动进程开始计时，轮询直到 list_tools 返回
+    """
+    start = time.perf_counter()
+    server.launch()
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.process.poll() is not None:
+            raise RuntimeError(f"MCP server exited with code {server.process.returncode}")
+        try:
+            async with mcp_session(server.base_url) as session:
+                await session.list_tools()
+            return time.perf_counter() - start
+        except Exception:
+            await asyncio.sleep(0.02)
+    raise TimeoutError("list_tools did not respond in time")
+
+
+async def measure_startup(runs: int, env: Dict[str, str], timeout: float) -> List[float]:
+    stub = start_stub()
+    timings = []
+    try:
+        for _ in range(runs):
+            server = ServerProcess(f"{stub.base_url}/v1", env=env)
+            try:
+                timings.append(await first_list_tools(server, timeout))
+            finally:
+                server.stop()
+    finally:
+        stub.shutdown()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--target", type=float, default=2.0, help="首个 list_tools 响应的目标时间（秒）")
+    parser.add_argument("--top", type=int, default=15, help="导入报告列出的模块数")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--env", nargs="*", default=[], help="传给 MCP 服务的环境变量")
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/startup-<时间>.json")
+    args = parser.parse_args()
+
+    report = import_report(args.top)
+    print(f"import main: {report['importMainMs']:.1f} ms (process {report['processWallMs']:.1f} ms)")
+    for module in report["topModules"]:
+        print(f"  {'  ' * module['depth']}{module['module']:<{40 - 2 * module['depth']}}{module['cumulativeMs']:>10.1f} ms")
+    if report["eagerLazyModules"]:
+        print(f"warning: imported at startup: {', '.join(report['eagerLazyModules'])}")
+
+    env = {key: value for key, value in (item.split("=", 1) for item in args.env)}
+    timings = asyncio.run(measure_startup(args.runs, env, args.timeout))
+    median: Optional[float] = statistics.median(timings) if timings else None
+    passed = median is not None and median <= args.target
+    print(f"time to first list_tools: median {median:.3f} s, runs {', '.join(f'{t:.3f}' for t in timings)} "
+          f"(target {args.target:.3f} s, {'ok' if passed else 'exceeded'})")
+
+    output = Path(args.output) if args.output else RESULTS_DIR / f"startup-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps({
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "python": sys.version.split()[0], "options": vars(args)},
+        "imports": report,
+        "firstListToolsSeconds": timings,
+        "medianSeconds": median,
+        "target": args.target,
+        "passed": passed,
+    }, indent=2), encoding="utf-8")
+    print(f"results: {output}")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+合成 Figma 文档，用于在没有真实设计稿时进行基准测试。
+生成的结构与 Figma REST API 的 /files 和 /files/:key/nodes 响应一致，
+包含自动布局 Frame、文本、图片填充、矢量图标和组件实例。
+"""
+import json
+import random
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+PALETTE = [
+    {"r": 0.0, "g": 0.0, "b": 0.0, "a": 1},
+    {"r": 1.0, "g": 1.0, "b": 1.0, "a": 1},
+    {"r": 0.2, "g": 0.4, "b": 0.9, "a": 1},
+    {"r": 0.95, "g": 0.3, "b": 0.25, "a": 1},
+    {"r": 0.96, "g": 0.96, "b": 0.97, "a": 1},
+    {"r": 0.1, "g": 0.7, "b": 0.45, "a": 0.8},
+]
+FONT_SIZES = [12, 14, 16, 20, 24, 32]
+WORDS = ["Submit", "Cancel", "Profile", "Settings", "Overview", "Dashboard", "Search", "Total", "Orders", "Revenue"]
+
+
+class Builder:
+    def __init__(self, seed: int):
+        self.rng = random.Random(seed)
+        self.next_id = 1
+        self.count = 0
+
+    def new_id(self) -> str:
+        self.next_id += 1
+        return f"{self.next_id // 1000 + 1}:{self.next_id % 1000}"
+
+    def solid(self) -> dict:
+        paint = {"type": "SOLID", "color": dict(self.rng.choice(PALETTE))}
+        if self.rng.random() < 0.2:
+            paint["opacity"] = self.rng.choice([0.5, 0.8])
+        return paint
+
+    def box(self, x: float, y: float, width: float, height: float) -> dict:
+        return {"x": x, "y": y, "width": width, "height": height}
+
+    def text(self, x: float, y: float, node_id: Optional[str] = None) -> dict:
+        self.count += 1
+        size = self.rng.choice(FONT_SIZES)
+        return {
+            "id": node_id or self.new_id(),
+            "name": "Label",
+            "type": "TEXT",
+            "characters": " ".join(self.rng.choice(WORDS) for _ in range(self.rng.randint(1, 4))),
+            "style": {
+                "fontFamily": "Inter",
+                "fontWeight": self.rng.choice([400, 500, 700]),
+                "fontSize": size,
+                "lineHeightPx": size * 1.5,
+                "letterSpacing": 0,
+                "textAlignHorizontal": "LEFT",
+                "textAlignVertical": "TOP",
+            },
+            "fills": [self.solid()],
+            "absoluteBoundingBox": self.box(x, y, 120, size * 1.5),
+            "layoutSizingHorizontal": "HUG",
+            "layoutSizingVertical": "HUG",
+        }
+
+    def vector(self, x: float, y: float, node_id: Optional[str] = None) -> dict:
+        self.count += 1
+        return {
+            "id": node_id or self.new_id(),
+            "name": "icon",
+            "type": "VECTOR",
+            "fills": [self.solid()],
+            "strokes": [self.solid()],
+            "strokeWeight": 1.5,
+            "absoluteBoundingBox": self.box(x, y, 24, 24),
+        }
+
+    def image(self, x: float, y: float) -> dict:
+        self.count += 1
+        return {
+            "id": self.new_id(),
+            "name": "Photo",
+            "type": "RECTANGLE",
+            "fills": [{
+                "type": "IMAGE",
+                "imageRef": f"img{self.rng.randint(0, 20):04d}",
+                "scaleMode": self.rng.choice(["FILL", "FIT", "TILE", "STRETCH"]),
+                "scalingFactor": 0.5,
+            }],
+            "cornerRadius": 8,
+            "effects": [{
+                "type": "DROP_SHADOW",
+                "visible": True,
+                "color": {"r": 0, "g": 0, "b": 0, "a": 0.25},
+                "offset": {"x": 0, "y": 4},
+                "radius": 8,
+                "spread": 0,
+            }],
+            "absoluteBoundingBox": self.box(x, y, 160, 120),
+        }
+
+    def instance(self, x: float, y: float, component_id: str) -> dict:
+        self.count += 1
+        instance_id = self.new_id()
+        prefix = f"I{instance_id};"
+        children = [
+            self.vector(x + 12, y + 8, node_id=f"{prefix}{component_id}0"),
+            self.text(x + 44, y + 8, node_id=f"{prefix}{component_id}1"),
+        ]
+        return {
+            "id": instance_id,
+            "name": "Button",
+            "type": "INSTANCE",
+            "componentId": component_id,
+            "componentProperties": {"Size": {"type": "VARIANT", "value": self.rng.choice(["sm", "md", "lg"])}},
+            "clipsContent": False,
+            "layoutMode": "HORIZONTAL",
+            "primaryAxisAlignItems": "CENTER",
+            "counterAxisAlignItems": "CENTER",
+            "itemSpacing": 8,
+            "paddingLeft": 12,
+            "paddingRight": 12,
+            "paddingTop": 8,
+            "paddingBottom": 8,
+            "fills": [self.solid()],
+            "cornerRadius": 6,
+            "absoluteBoundingBox": self.box(x, y, 160, 40),
+            "children": children,
+        }
+
+    def frame(self, x: float, y: float, budget: int, depth: int, component_ids: List[str]) -> dict:
+        self.count += 1
+        horizontal = self.rng.random() < 0.5
+        node: Dict[str, Any] = {
+            "id": self.new_id(),
+            "name": "Frame",
+            "type": "FRAME",
+            "clipsContent": True,
+            "layoutMode": "HORIZONTAL" if horizontal else "VERTICAL",
+            "primaryAxisAlignItems": self.rng.choice(["MIN", "CENTER", "SPACE_BETWEEN"]),
+            "counterAxisAlignItems": self.rng.choice(["MIN", "CENTER", "MAX"]),
+            "itemSpacing": self.rng.choice([0, 8, 16]),
+            "paddingLeft": 16,
+            "paddingRight": 16,
+            "paddingTop": 16,
+            "paddingBottom": 16,
+            "layoutSizingHorizontal": self.rng.choice(["FIXED", "FILL", "HUG"]),
+            "layoutSizingVertical": self.rng.choice(["FIXED", "HUG"]),
+            "fills": [self.solid()],
+            "absoluteBoundingBox": self.box(x, y, 800, 600),
+            "children": [],
+        }
+        children: List[dict] = node["children"]
+        offset = 0.0
+        while budget > 0:
+            before = self.count
+            kind = self.rng.random()
+            cx, cy = (x + offset, y) if horizontal else (x, y + offset)
+            if depth < 6 and budget > 12 and kind < 0.3:
+                children.append(self.frame(cx, cy, min(budget, self.rng.randint(8, 60)), depth + 1, component_ids))
+            elif kind < 0.55:
+                children.append(self.text(cx, cy))
+            elif kind < 0.7:
+                children.append(self.instance(cx, cy, self.rng.choice(component_ids)))
+            elif kind < 0.85:
+                children.append(self.vector(cx, cy))
+            else:
+                children.append(self.image(cx, cy))
+            budget -= self.count - before
+            offset += 48
+        return node
+
+
+def synthetic_frames(node_count: int, seed: int = 0) -> Tuple[List[dict], Dict[str, dict]]:
+    builder = Builder(seed)
+    component_ids = [f"90:{i}" for i in range(8)]
+    components = {
+        component_id: {"key": f"key{i}", "name": f"Button/{i}", "description": "", "componentSetId": "91:0"}
+        for i, component_id in enumerate(component_ids)
+    }
+    frames = []
+    y = 0.0
+    while builder.count < node_count:
+        frames.append(builder.frame(0, y, min(node_count - builder.count, 2000), 0, component_ids))
+        y += 1000
+    return frames, components
+
+
+def synthetic_file(node_count: int, seed: int = 0) -> dict:
+    """
+    /v1/files/:key 形式的响应，所有顶层 Frame 位于同一页面
+    """
+    frames, components = synthetic_frames(node_count, seed)
+    return {
+        "name": f"Synthetic {node_count}",
+        "lastModified": "2024-01-01T00:00:00Z",
+        "thumbnailUrl": "",
+        "version": "1",
+        "document": {
+            "id": "0:0",
+            "name": "Document",
+            "type": "DOCUMENT",
+            "children": [{"id": "0:1", "name": "Page 1", "type": "CANVAS", "children": frames}],
+        },
+        "components": components,
+        "componentSets": {"91:0": {"key": "set0", "name": "Button", "description": ""}},
+    }
+
+
+def synthetic_nodes(node_count: int, seed: int = 0) -> dict:
+    """
+    /v1/files/:key/nodes 形式的响应，每个顶层 Frame 作为一个请求节点
+    """
+    frames, components = synthetic_frames(node_count, seed)
+    return {
+        "name": f"Synthetic {node_count}",
+        "lastModified": "2024-01-01T00:00:00Z",
+        "thumbnailUrl": "",
+        "version": "1",
+        "nodes": {
+            frame["id"]: {
+                "document": frame,
+                "components": components,
+                "componentSets": {"91:0": {"key": "set0", "name": "Button", "description": ""}},
+            }
+            for frame in frames
+        },
+    }
+
+
+def load_samples(paths: List[str], sizes: List[int]) -> Dict[str, dict]:
+    """
+    读取录制的 Figma 响应文件；未提供时按 sizes 生成合成文档
+    """
+    if paths:
+        return {Path(path).name: json.loads(Path(path).read_text(encoding="utf-8")) for path in paths}
+    return {f"synthetic-{size}": synthetic_nodes(size) for size in sizes}
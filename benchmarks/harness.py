@@ -0,0 +1,189 @@
+"""
+端到端基准的公共部分：以子进程启动 MCP 服务（指向桩服务），通过 MCP 客户端调用工具，
+读取 /metrics 中的阶段耗时以及服务进程的 RSS
+"""
+import os
+import re
+import socket
+import subprocess
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from mcp import ClientSession
+from mcp.client.streamable_http import streamablehttp_client
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE_PATTERN = re.compile(r'^(\w+)\{(\w+)="([^"]*)"\} (\S+)$')
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(latencies: List[float]) -> Dict[str, Optional[float]]:
+    return {
+        "count": len(latencies),
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies) if latencies else None,
+    }
+
+
+class ServerProcess:
+    """
+    以子进程运行 main.py，环境变量可覆盖 config 中的配置
+    """
+
+    def __init__(self, api_base: str, env: Optional[Dict[str, str]] = None, port: Optional[int] = None):
+        self.port = port or free_port()
+        self.env = {**os.environ, **(env or {}), "FIGMA_API_BASE": api_base, "MCP_PORT": str(self.port)}
+        self.process: Optional[subprocess.Popen] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def launch(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "main.py"], cwd=ROOT, env=self.env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        )
+
+    def start(self, timeout: float = 30):
+        self.launch()
+        self.wait_ready(timeout)
+
+    def wait_ready(self, timeout: float = 30):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"MCP server exited with code {self.process.returncode}")
+            try:
+                if httpx.get(f"{self.base_url}/metrics", timeout=1).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                time.sleep(0.2)
+        raise TimeoutError("MCP server did not start in time")
+
+    def stop(self):
+        if self.process is not None and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def pids(self) -> List[int]:
+        # 多 worker 模式下 uvicorn 会派生子进程，统计整个进程树
+        pids = [self.process.pid]
+        for pid in pids:
+            children = Path(f"/proc/{pid}/task/{pid}/children")
+            if children.exists():
+                pids.extend(int(child) for child in children.read_text().split())
+        return pids
+
+    def peak_rss_mb(self) -> Optional[float]:
+        """
+        VmHWM（峰值常驻内存），仅 Linux；多进程时为各进程峰值之和
+        """
+        total = 0
+        try:
+            for pid in self.pids():
+                for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+                    if line.startswith("VmHWM:"):
+                        total += int(line.split()[1])
+        except OSError:
+            return None
+        return round(total / 1024, 1)
+
+    def reset_peak_rss(self):
+        # 写入 5 重置 VmHWM（Linux 4.0+），失败时峰值从进程启动起计算
+        for pid in self.pids():
+            try:
+                Path(f"/proc/{pid}/clear_refs").write_text("5")
+            except OSError:
+                pass
+
+    def __enter__(self) -> "ServerProcess":
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def scrape_stages(base_url: str) -> Dict[str, Tuple[float, float]]:
+    """
+    读取 /metrics 中各阶段与提取器直方图的 (sum, count)
+    """
+    text = httpx.get(f"{base_url}/metrics", timeout=10).text
+    samples: Dict[str, Tuple[float, float]] = {}
+    for line in text.splitlines():
+        match = SAMPLE_PATTERN.match(line)
+        if not match:
+            continue
+        name, label, value, sample = match.groups()
+        for metric, prefix in (("figma_stage_duration_seconds", "stage"), ("figma_extractor_duration_seconds", "extractor")):
+            for suffix, position in (("_sum", 0), ("_count", 1)):
+                if name == metric + suffix:
+                    key = f"{prefix}:{value}"
+                    current = list(samples.get(key, (0.0, 0.0)))
+                    current[position] = float(sample)
+                    samples[key] = (current[0], current[1])
+    return samples
+
+
+def stage_delta(before: Dict[str, Tuple[float, float]], after: Dict[str, Tuple[float, float]]) -> Dict[str, dict]:
+    """
+    两次抓取之间每个阶段的调用次数、总耗时与平均耗时（秒）
+    """
+    delta = {}
+    for key, (total, count) in after.items():
+        previous_total, previous_count = before.get(key, (0.0, 0.0))
+        if count > previous_count:
+            delta[key] = {
+                "count": int(count - previous_count),
+                "totalSeconds": round(total - previous_total, 6),
+                "meanSeconds": round((total - previous_total) / (count - previous_count), 6),
+            }
+    return delta
+
+
+@asynccontextmanager
+async def mcp_session(base_url: str, token: str = "bench") -> AsyncIterator[ClientSession]:
+    async with streamablehttp_client(f"{base_url}/mcp?figma_token={token}", sse_read_timeout=900) as (read, write, _):
+        async with ClientSession(read, write) as session:
+            await session.initialize()
+            yield session
+
+
+async def call_tool(session: ClientSession, name: str, arguments: Dict[str, Any]) -> Tuple[float, bool, int]:
+    """
+    返回 (耗时秒数, 是否成功, 返回文本字节数)
+    """
+    start = time.perf_counter()
+    try:
+        result = await session.call_tool(name, arguments)
+    except Exception:
+        return time.perf_counter() - start, False, 0
+    elapsed = time.perf_counter() - start
+    size = sum(len(getattr(block, "text", "").encode("utf-8")) for block in result.content)
+    text = "".join(getattr(block, "text", "") for block in result.content)
+    ok = not result.isError and not text.startswith("Failed to download images")
+    return elapsed, ok, size
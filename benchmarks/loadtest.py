@@ -0,0 +1,212 @@
+"""
+streamable-HTTP MCP 端点压测：在本地桩服务之上，按混合比例通过真实 MCP 传输调用
+list_tools、get_figma_data、download_image，逐级提高并发会话数，
+报告各级 p50 / p95 / p99 延迟、错误率、吞吐与饱和点
+
+    python -m benchmarks.loadtest
+    python -m benchmarks.loadtest --levels 1 2 4 8 16 32 --duration 20 --mix list_tools=2 get_figma_data=2 download_image=1
+    # 压测已部署的服务（需将其 FIGMA_API_BASE 指向本脚本启动的桩服务）
+    python -m benchmarks.loadtest --url http://127.0.0.1:10081 --stub-port 18080
+
+饱和点为最后一个正常的并发级别：下一级吞吐不再明显增长（增幅低于 --saturation-gain）、p95 超过 --slo
+或错误率超过 --max-error-rate；结果中同时给出触发的原因（throughput / slo / error_rate）与触发的级别
+"""
+import argparse
+import asyncio
+import json
+import random
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from benchmarks.bench_e2e import RESULTS_DIR, download_nodes
+from benchmarks.harness import ServerProcess, call_tool, mcp_session, summarize
+from benchmarks.stub_server import start_stub
+
+TOOLS = ("list_tools", "get_figma_data", "download_image")
+
+
+def parse_mix(items: List[str]) -> Dict[str, float]:
+    mix = {}
+    for item in items:
+        name, _, weight = item.partition("=")
+        if name not in TOOLS:
+            raise SystemExit(f"unknown tool in --mix: {name}")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+async def virtual_user(base_url: str, arguments: Dict[str, dict], mix: Dict[str, float], deadline: float,
+                       records: Dict[str, List[float]], errors: Dict[str, int], rng: random.Random):
+    """
+    闭环虚拟用户：保持一个会话，按权重随机选择工具连续调用直到截止时间
+    """
+    names, weights = list(mix), list(mix.values())
+    try:
+        async with mcp_session(base_url) as session:
+            while time.monotonic() < deadline:
+                tool = rng.choices(names, weights)[0]
+                if tool == "list_tools":
+                    start = time.perf_counter()
+                    try:
+                        await session.list_tools()
+                        ok = True
+                    except Exception:
+                        ok = False
+                    elapsed = time.perf_counter() - start
+                else:
+                    elapsed, ok, _ = await call_tool(session, tool, arguments[tool])
+                if ok:
+                    records[tool].append(elapsed)
+                else:
+                    errors[tool] += 1
+    except Exception:
+        # 会话建立失败（连接被拒绝、超时等）计为一次错误
+        errors["session"] += 1
+
+
+async def run_level(base_url: str, concurrency: int, duration: float, arguments: Dict[str, dict], mix: Dict[str, float], seed: int) -> Dict[str, Any]:
+    records: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, int] = defaultdict(int)
+    deadline = time.monotonic() + duration
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        virtual_user(base_url, arguments, mix, deadline, records, errors, random.Random(seed + index))
+        for index in range(concurrency)
+    ))
+    # 截止时间后仍在进行的调用会被等待完成，按实际耗时计算吞吐
+    wall = time.perf_counter() - start
+    latencies = [value for values in records.values() for value in values]
+    total_errors = sum(errors.values())
+    total = len(latencies) + total_errors
+    return {
+        "concurrency": concurrency,
+        "wallSeconds": round(wall, 3),
+        "requests": total,
+        "errors": total_errors,
+        "errorRate": round(total_errors / total, 4) if total else 0.0,
+        "throughput": round(len(latencies) / wall, 3) if wall else 0.0,
+        "latency": summarize(latencies),
+        "tools": {
+            tool: {**summarize(records.get(tool, [])), "errors": errors.get(tool, 0)}
+            for tool in sorted(set(records) | set(errors))
+        },
+    }
+
+
+def saturation_point(levels: List[Dict[str, Any]], gain: float, slo: Optional[float], max_error_rate: float) -> Optional[Dict[str, Any]]:
+    """
+    返回 {"concurrency": 最后一个正常的级别（第一级即不满足时为 None）, "reason": 原因, "failedAt": 触发的级别}，未饱和时返回 None
+    """
+    for index, level in enumerate(levels):
+        p95 = level["latency"]["p95"]
+        reason = None
+        if level["errorRate"] > max_error_rate:
+            reason = "error_rate"
+        elif slo is not None and p95 is not None and p95 > slo:
+            reason = "slo"
+        elif index > 0:
+            previous = levels[index - 1]["throughput"]
+            if previous and level["throughput"] < previous * (1 + gain):
+                reason = "throughput"
+        if reason is not None:
+            return {
+                "concurrency": levels[index - 1]["concurrency"] if index > 0 else None,
+                "reason": reason,
+                "failedAt": level["concurrency"],
+            }
+    return None
+
+
+def format_ms(value: Optional[float]) -> str:
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+
+async def run(args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    stub = start_stub(port=args.stub_port, latency=args.latency, image_size=args.image_size)
+    file_key = f"synthetic-{args.size}"
+    local_path = tempfile.mkdtemp(prefix="figma-loadtest-")
+    arguments = {
+        "get_figma_data": {"file_key": file_key, "node_id": "", "output_format": args.output_format},
+        "download_image": {
+            "file_key": file_key,
+            "nodes": download_nodes(stub.store.get_file(file_key), args.images),
+            "png_scale": 2,
+            "local_path": local_path,
+        },
+    }
+    env = {key: value for key, value in (item.split("=", 1) for item in args.env)}
+
+    server = None
+    base_url = args.url
+    if base_url is None:
+        server = ServerProcess(f"{stub.base_url}/v1", env=env)
+        server.start()
+        base_url = server.base_url
+    else:
+        print(f"Figma stub API: {stub.base_url}/v1")
+
+    levels = []
+    print(f"{'sessions':>8}{'req':>7}{'err%':>7}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    try:
+        # 预热：生成桩文档并让服务端完成首次解析
+        await run_level(base_url, 1, 0.1, arguments, mix, args.seed)
+        for concurrency in args.levels:
+            level = await run_level(base_url, concurrency, args.duration, arguments, mix, args.seed)
+            levels.append(level)
+            latency = level["latency"]
+            print(f"{concurrency:>8}{level['requests']:>7}{level['errorRate'] * 100:>7.1f}{level['throughput']:>9.2f}"
+                  f"{format_ms(latency['p50']):>10}{format_ms(latency['p95']):>10}{format_ms(latency['p99']):>10}")
+    finally:
+        if server is not None:
+            server.stop()
+        stub.shutdown()
+
+    saturation = saturation_point(levels, args.saturation_gain, args.slo, args.max_error_rate)
+    if saturation is None:
+        print("saturation point: not reached")
+    else:
+        last_good = saturation["concurrency"] if saturation["concurrency"] is not None else "none"
+        print(f"saturation point: {last_good} concurrent sessions ({saturation['reason']} at {saturation['failedAt']} sessions)")
+    return {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "options": {key: value for key, value in vars(args).items() if key != "output"},
+        },
+        "levels": levels,
+        "saturationPoint": saturation,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--levels", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="依次测试的并发会话数")
+    parser.add_argument("--duration", type=float, default=10, help="每个并发级别的持续时间（秒）")
+    parser.add_argument("--mix", nargs="+", default=["list_tools=2", "get_figma_data=2", "download_image=1"], help="工具=权重")
+    parser.add_argument("--size", type=int, default=1000, help="get_figma_data 使用的合成文档节点数")
+    parser.add_argument("--images", type=int, default=6, help="download_image 每次下载的图片数")
+    parser.add_argument("--image-size", type=int, default=256)
+    parser.add_argument("--output-format", default="json")
+    parser.add_argument("--latency", type=float, default=0.05, help="桩服务的模拟 API 延迟（秒）")
+    parser.add_argument("--url", help="已运行的 MCP 服务地址，不指定时以子进程启动 main.py")
+    parser.add_argument("--stub-port", type=int, default=0)
+    parser.add_argument("--env", nargs="*", default=[], help="传给 MCP 服务的环境变量")
+    parser.add_argument("--saturation-gain", type=float, default=0.1, help="吞吐增幅低于该比例视为饱和")
+    parser.add_argument("--slo", type=float, help="p95 延迟上限（秒）")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="结果文件，默认 benchmarks/results/loadtest-<时间>.json")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    output = Path(args.output) if args.output else RESULTS_DIR / f"loadtest-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(f"results: {output}")
+
+
+if __name__ == "__main__":
+    main()
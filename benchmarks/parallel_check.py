@@ -0,0 +1,81 @@
+"""
+并行提取一致性检查：同一份合成响应（包含作为顶层节点的组件实例）分别按单进程与进程池提取，
+在开启与关闭组件压缩时比较输出是否一致；样式变量 id 随机生成，比较前替换为变量的内容。不一致时退出码为 1
+
+    python -m benchmarks.parallel_check
+    python -m benchmarks.parallel_check --size 5000 --workers 4
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict
+
+# extract_parallel 按 FIGMA_EXTRACT_WORKERS 分块，配置在导入时读取
+os.environ.setdefault("FIGMA_EXTRACT_WORKERS", "2")
+
+from benchmarks.fixtures import Builder, synthetic_nodes  # noqa: E402
+from handle_comp import compress_components  # noqa: E402
+from handle_node import extract_frames  # noqa: E402
+from main import extract_parallel  # noqa: E402
+
+
+def build_parse(size: int, seed: int) -> list:
+    response = synthetic_nodes(size, seed)
+    builder = Builder(seed + 1)
+    # 顶层实例：进程池路径中顶层节点单独提取，子节点交给进程池
+    instances = [builder.instance(0, index * 100.0, "90:0") for index in range(3)]
+    return [entry["document"] for entry in response["nodes"].values()] + instances
+
+
+def canonical(value: Any, styles: Dict[str, Any]) -> Any:
+    if isinstance(value, str) and value in styles:
+        return json.dumps(styles[value], sort_keys=True)
+    if isinstance(value, dict):
+        return {key: canonical(item, styles) for key, item in value.items()}
+    if isinstance(value, list):
+        return [canonical(item, styles) for item in value]
+    return value
+
+
+def extract(parse: list, option: dict, pool) -> Dict[str, Any]:
+    nodes, global_vars, _ = extract_parallel(parse, option, pool) if pool is not None else extract_frames(parse, option)
+    if option.get("compressComponents"):
+        compress_components(nodes, global_vars)
+    styles = global_vars.get("styles", {})
+    return {
+        "nodes": canonical(nodes, styles),
+        "components": canonical(global_vars.get("components", {}), styles),
+        "styles": sorted(json.dumps(value, sort_keys=True) for value in styles.values()),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2000, help="合成文档的节点数")
+    parser.add_argument("--workers", type=int, default=int(os.environ["FIGMA_EXTRACT_WORKERS"]))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    parse = build_parse(args.size, args.seed)
+    failures = []
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for compress in (False, True):
+            option = {"compressComponents": compress}
+            serial = extract(parse, option, None)
+            parallel = extract(parse, option, pool)
+            for part in ("nodes", "components", "styles"):
+                if serial[part] != parallel[part]:
+                    failures.append(f"compressComponents={compress}: {part} differ")
+            print(f"compressComponents={compress}: {len(serial['components'])} component templates")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
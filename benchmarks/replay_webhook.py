@@ -0,0 +1,90 @@
+"""
+本地回放 Figma webhook，无需在 Figma 中注册即可测试 /webhooks/figma 的缓存失效与刷新
+
+    FIGMA_WEBHOOK_PASSCODE=secret python main.py
+    python -m benchmarks.replay_webhook --passcode secret --file-key abc123
+    python -m benchmarks.replay_webhook --passcode secret --event FILE_VERSION_UPDATE --file-key abc123 def456
+    # 回放录制的请求体（JSON 数组或每行一个 JSON），passcode 会被替换
+    python -m benchmarks.replay_webhook --passcode secret --payloads webhook_requests.json
+    # 先让桩服务中的文件产生新版本，再发送 webhook
+    python -m benchmarks.replay_webhook --passcode secret --file-key synthetic-1000 --touch-stub http://127.0.0.1:18080
+"""
+import argparse
+import json
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import List
+
+import httpx
+
+EVENTS = ("FILE_UPDATE", "FILE_VERSION_UPDATE", "FILE_DELETE", "PING")
+
+
+def build_payload(event: str, file_key: str, passcode: str) -> dict:
+    """
+    与 Figma webhook v2 请求体的字段一致
+    """
+    payload = {
+        "event_type": event,
+        "file_key": file_key,
+        "file_name": f"Replayed {file_key}",
+        "passcode": passcode,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "webhook_id": "0",
+    }
+    if event == "FILE_VERSION_UPDATE":
+        payload.update({
+            "version_id": str(int(time.time())),
+            "label": "Replayed version",
+            "description": "",
+            "triggered_by": {"id": "0", "handle": "replay"},
+            "created_at": payload["timestamp"],
+        })
+    if event == "PING":
+        payload.pop("file_key")
+        payload.pop("file_name")
+        payload["webhook_id"] = uuid.uuid4().hex
+    return payload
+
+
+def load_payloads(path: str) -> List[dict]:
+    text = Path(path).read_text(encoding="utf-8").strip()
+    if text.startswith("["):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:10081", help="MCP 服务地址")
+    parser.add_argument("--passcode", default=os.getenv("FIGMA_WEBHOOK_PASSCODE", ""))
+    parser.add_argument("--event", choices=EVENTS, default="FILE_UPDATE")
+    parser.add_argument("--file-key", nargs="*", default=[])
+    parser.add_argument("--payloads", help="录制的 webhook 请求体文件")
+    parser.add_argument("--touch-stub", help="桩服务地址，发送前先更新文件版本（见 benchmarks.stub_server）")
+    parser.add_argument("--interval", type=float, default=0.0, help="事件之间的间隔（秒）")
+    args = parser.parse_args()
+
+    payloads = [{**payload, "passcode": args.passcode} for payload in load_payloads(args.payloads)] if args.payloads else []
+    payloads += [build_payload(args.event, file_key, args.passcode) for file_key in args.file_key]
+    if not payloads and args.event == "PING":
+        payloads.append(build_payload("PING", "", args.passcode))
+    if not payloads:
+        parser.error("需要 --file-key 或 --payloads")
+
+    with httpx.Client(timeout=30) as client:
+        for index, payload in enumerate(payloads):
+            if index and args.interval:
+                time.sleep(args.interval)
+            if args.touch_stub and payload.get("file_key"):
+                client.post(f"{args.touch_stub.rstrip('/')}/_stub/files/{payload['file_key']}/touch").raise_for_status()
+            start = time.perf_counter()
+            response = client.post(f"{args.url.rstrip('/')}/webhooks/figma", json=payload)
+            elapsed = (time.perf_counter() - start) * 1000
+            print(f"{payload.get('event_type')} {payload.get('file_key', '-')}: {response.status_code} {elapsed:.1f} ms {response.text}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+断点续传检查：本地桩服务按概率在图片下载中途断开连接，通过 download_figma_image 下载多张图片，
+校验内容与桩服务生成的图片一致、确实发生了 Range 续传、且没有遗留 .part / .part.json 文件；失败时退出码为 1
+
+    python -m benchmarks.resume_check
+    python -m benchmarks.resume_check --count 20 --drop-rate 0.5 --image-size 2048
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# 配置在导入时读取：关闭图片缓存，每次都经过网络；断线概率较高时放宽重试次数
+os.environ["FIGMA_IMAGE_CACHE_TTL"] = "0"
+os.environ.setdefault("FIGMA_DOWNLOAD_RETRIES", "20")
+
+from benchmarks.stub_server import start_stub  # noqa: E402
+from handle_image import download_figma_image  # noqa: E402
+
+
+async def download_all(base_url: str, directory: str, count: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def download(index: int):
+        async with semaphore:
+            return await download_figma_image(f"asset-{index}.png", directory, f"{base_url}/assets/asset-{index}.png")
+
+    return await asyncio.gather(*(download(index) for index in range(count)), return_exceptions=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--count", type=int, default=20, help="下载的图片数")
+    parser.add_argument("--drop-rate", type=float, default=0.5, help="中途断开连接的概率")
+    parser.add_argument("--image-size", type=int, default=2048, help="生成图片的边长（像素）")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    stub = start_stub(drop_rate=args.drop_rate, image_size=args.image_size)
+    expected = stub.assets["png"]
+    failures = []
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            results = asyncio.run(download_all(stub.base_url, directory, args.count, args.concurrency))
+            for index, result in enumerate(results):
+                if isinstance(result, Exception):
+                    failures.append(f"asset-{index}.png: {result}")
+                elif Path(result).read_bytes() != expected:
+                    failures.append(f"asset-{index}.png: content differs from the stub asset")
+            leftovers = sorted(path.name for path in Path(directory).iterdir() if path.name.endswith((".part", ".part.json")))
+            if leftovers:
+                failures.append(f"partial files left behind: {', '.join(leftovers)}")
+    finally:
+        stub.shutdown()
+        stub.server_close()
+
+    if stub.range_count == 0:
+        failures.append("no Range request was made; increase --drop-rate or --count")
+    print(f"downloaded {args.count} x {len(expected)} bytes, {stub.dropped_count} connections dropped, "
+          f"{stub.range_count} resumed with Range")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    if failures:
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+本地 Figma REST API 桩服务：回放录制的响应或按规模生成的合成文档，供端到端基准与压测使用。
+
+    # 启动（file_key 为 synthetic-<节点数> 时返回合成文档，其余从 --fixtures 目录读取 <file_key>.json）
+    python -m benchmarks.stub_server --port 18080 --fixtures recordings/
+    FIGMA_API_BASE=http://127.0.0.1:18080/v1 python main.py
+
+    # 从真实 Figma 录制 /me、/files、/files/:key/images 响应，指定 --node-ids 时同时录制这些节点的 /files/:key/nodes 响应
+    python -m benchmarks.stub_server record --token <token> --file-key <key> --out recordings/ [--node-ids 1:2 3:4]
+
+支持的接口：/v1/me、/v1/files/:key、/v1/files/:key/nodes、/v1/files/:key/images、/v1/images/:key，
+图片地址指向桩服务的 /assets/，返回生成的 PNG / SVG（支持 Range / If-Range，ETag 为内容的 MD5）；
+--drop-rate 大于 0 时按该概率在发送一半内容后断开连接，模拟不稳定的网络；
+POST /_stub/files/:key/touch 模拟文件被编辑（更新版本号）。
+"""
+import argparse
+import hashlib
+import io
+import json
+import random
+import socket
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import parse_qs, urlencode, urlparse
+
+from benchmarks.fixtures import synthetic_file
+
+SYNTHETIC_PREFIX = "synthetic-"
+
+
+def walk(node: dict) -> Iterator[dict]:
+    yield node
+    for child in node.get("children", []):
+        yield from walk(child)
+
+
+def trim_depth(node: dict, depth: int) -> dict:
+    """
+    按 Figma 的 depth 参数裁剪子树（depth=1 只保留节点自身的直接子节点）
+    """
+    if "children" not in node:
+        return node
+    if depth <= 0:
+        return {key: value for key, value in node.items() if key != "children"}
+    return {**node, "children": [trim_depth(child, depth - 1) for child in node["children"]]}
+
+
+def render_png(size: int) -> bytes:
+    from PIL import Image
+
+    # 渐变图案，压缩后的体积接近真实截图而不是纯色
+    image = Image.new("RGB", (size, size))
+    image.putdata([((x * 255) // size, (y * 255) // size, ((x ^ y) * 255) // size) for y in range(size) for x in range(size)])
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def render_svg(size: int) -> bytes:
+    return (
+        f'<svg xmlns="http://www.w3.org/2000/svg" width="{size}" height="{size}" viewBox="0 0 {size} {size}">'
+        f'<rect width="{size}" height="{size}" rx="8" fill="#3366E6"/>'
+        f'<path d="M4 4L{size - 4} {size - 4}" stroke="#FFFFFF" stroke-width="2"/></svg>'
+    ).encode("utf-8")
+
+
+class FixtureStore:
+    """
+    按 file_key 缓存文档、节点索引与预编码的响应
+    """
+
+    def __init__(self, fixtures_dir: Optional[str] = None, seed: int = 0):
+        self.fixtures_dir = Path(fixtures_dir) if fixtures_dir else None
+        self.seed = seed
+        self.files: Dict[str, dict] = {}
+        self.indexes: Dict[str, Dict[str, dict]] = {}
+        self.recorded_nodes: Dict[str, Dict[str, dict]] = {}
+        self.encoded: Dict[str, bytes] = {}
+        self.lock = threading.Lock()
+
+    def get_file(self, file_key: str) -> Optional[dict]:
+        with self.lock:
+            if file_key not in self.files:
+                document = self.load(file_key)
+                if document is None:
+                    return None
+                self.files[file_key] = document
+                self.indexes[file_key] = {node["id"]: node for node in walk(document["document"]) if "id" in node}
+            return self.files[file_key]
+
+    def load(self, file_key: str) -> Optional[dict]:
+        recorded = self.load_recording(f"{file_key}.json")
+        if recorded is not None:
+            return recorded
+        if file_key.startswith(SYNTHETIC_PREFIX) and file_key[len(SYNTHETIC_PREFIX):].isdigit():
+            return synthetic_file(int(file_key[len(SYNTHETIC_PREFIX):]), self.seed)
+        return None
+
+    def load_recording(self, name: str) -> Optional[dict]:
+        if self.fixtures_dir is None:
+            return None
+        path = self.fixtures_dir / name
+        return json.loads(path.read_text(encoding="utf-8")) if path.exists() else None
+
+    def me_response(self) -> dict:
+        return self.load_recording("me.json") or {"id": "0", "email": "bench@example.com", "handle": "bench"}
+
+    def get_recorded_nodes(self, file_key: str) -> Optional[dict]:
+        """
+        录制的 /files/:key/nodes 响应（<file_key>.nodes.json），录制时请求的节点以原样返回
+        """
+        with self.lock:
+            if file_key not in self.recorded_nodes:
+                self.recorded_nodes[file_key] = self.load_recording(f"{file_key}.nodes.json")
+            return self.recorded_nodes[file_key]
+
+    def touch(self, file_key: str) -> Optional[str]:
+        """
+        模拟文件被编辑：更新 version 与 lastModified，返回新版本号
+        """
+        document = self.get_file(file_key)
+        if document is None:
+            return None
+        with self.lock:
+            # Figma 的版本号为递增的数字字符串
+            version = str(int(document.get("version") or 0) + 1)
+            document["version"] = version
+            document["lastModified"] = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+            self.encoded.pop(f"file:{file_key}", None)
+        return version
+
+    def file_response(self, file_key: str, depth: Optional[int]) -> Optional[bytes]:
+        document = self.get_file(file_key)
+        if document is None:
+            return None
+        if depth is not None:
+            return json.dumps({**document, "document": trim_depth(document["document"], depth)}).encode("utf-8")
+        cache_key = f"file:{file_key}"
+        with self.lock:
+            if cache_key not in self.encoded:
+                self.encoded[cache_key] = json.dumps(document).encode("utf-8")
+            return self.encoded[cache_key]
+
+    def nodes_response(self, file_key: str, ids: list, depth: Optional[int]) -> Optional[bytes]:
+        recorded = self.get_recorded_nodes(file_key) or {}
+        recorded_nodes = recorded.get("nodes") or {}
+        document = self.get_file(file_key)
+        if document is None:
+            if not recorded:
+                return None
+            # 只录制了节点响应：未录制的节点按不存在处理
+            document = recorded
+        index = self.indexes.get(file_key, {})
+        nodes = {}
+        for node_id in ids:
+            entry = recorded_nodes.get(node_id)
+            if entry is not None:
+                nodes[node_id] = {**entry, "document": trim_depth(entry["document"], depth)} if depth is not None else entry
+                continue
+            node = index.get(node_id)
+            if node is None:
+                nodes[node_id] = None
+                continue
+            nodes[node_id] = {
+                "document": trim_depth(node, depth) if depth is not None else node,
+                "components": document.get("components", {}),
+                "componentSets": document.get("componentSets", {}),
+                "styles": document.get("styles", {}),
+            }
+        return json.dumps({
+            "name": document.get("name", ""),
+            "lastModified": document.get("lastModified", ""),
+            "thumbnailUrl": document.get("thumbnailUrl", ""),
+            "version": document.get("version", ""),
+            "nodes": nodes,
+        }).encode("utf-8")
+
+    def image_fill_refs(self, file_key: str) -> Optional[list]:
+        document = self.get_file(file_key)
+        if document is None:
+            return None
+        # 录制的 /images 响应只取 imageRef，地址统一改写为桩服务的图片
+        recorded = self.fixtures_dir / f"{file_key}.images.json" if self.fixtures_dir is not None else None
+        if recorded is not None and recorded.exists():
+            return list(json.loads(recorded.read_text(encoding="utf-8")).get("meta", {}).get("images", {}))
+        refs = []
+        for node in walk(document["document"]):
+            for paint in node.get("fills", []):
+                if paint.get("type") == "IMAGE" and paint.get("imageRef") and paint["imageRef"] not in refs:
+                    refs.append(paint["imageRef"])
+        return refs
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address: Tuple[str, int], store: FixtureStore, latency: float = 0.0, image_size: int = 256,
+                 drop_rate: float = 0.0, seed: int = 0):
+        super().__init__(address, StubHandler)
+        self.store = store
+        self.latency = latency
+        self.image_size = image_size
+        self.assets = {"png": render_png(image_size), "svg": render_svg(image_size)}
+        self.drop_rate = drop_rate
+        self.random = random.Random(seed)
+        self.request_count = 0
+        self.dropped_count = 0
+        self.range_count = 0
+        self.count_lock = threading.Lock()
+
+    def should_drop(self) -> bool:
+        with self.count_lock:
+            drop = self.drop_rate > 0 and self.random.random() < self.drop_rate
+            if drop:
+                self.dropped_count += 1
+            return drop
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    server: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_body(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_json(self, status: int, value: dict):
+        self.send_body(status, json.dumps(value).encode("utf-8"))
+
+    def send_asset(self, body: bytes, content_type: str):
+        """
+        与 CDN 一致地支持单段 Range 与 If-Range；需要模拟断线时只发送剩余内容的一半后关闭连接
+        """
+        etag = f'"{hashlib.md5(body).hexdigest()}"'
+        start = 0
+        byte_range = self.headers.get("Range", "")
+        if byte_range.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            first, _, last = byte_range[len("bytes="):].partition("-")
+            start = int(first or 0)
+            if start >= len(body) or (last and int(last) < start):
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{len(body)}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            with self.server.count_lock:
+                self.server.range_count += 1
+        content = body[start:]
+        self.send_response(206 if start else 200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        self.send_header("ETag", etag)
+        self.send_header("Accept-Ranges", "bytes")
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.end_headers()
+        if len(content) > 1 and self.server.should_drop():
+            self.wfile.write(content[:len(content) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(socket.SHUT_RDWR)
+            return
+        self.wfile.write(content)
+
+    def asset_url(self, name: str, fmt: str) -> str:
+        return f"{self.server.base_url}/assets/{name}.{fmt}"
+
+    def do_POST(self):
+        # POST /_stub/files/:key/touch 模拟文件更新，用于测试缓存刷新与 webhook
+        parts = [part for part in urlparse(self.path).path.split("/") if part]
+        if len(parts) == 4 and parts[:2] == ["_stub", "files"] and parts[3] == "touch":
+            version = self.server.store.touch(parts[2])
+            if version is not None:
+                return self.send_json(200, {"fileKey": parts[2], "version": version})
+        return self.send_json(404, {"status": 404, "err": "Not found"})
+
+    def do_GET(self):
+        with self.server.count_lock:
+            self.server.request_count += 1
+        url = urlparse(self.path)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        parts = [part for part in url.path.split("/") if part]
+
+        if parts[:1] == ["assets"] and len(parts) == 2:
+            fmt = parts[1].rsplit(".", 1)[-1]
+            if fmt not in self.server.assets:
+                return self.send_json(404, {"status": 404, "err": "Not found"})
+            return self.send_asset(self.server.assets[fmt], "image/svg+xml" if fmt == "svg" else "image/png")
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        if not self.headers.get("X-Figma-Token"):
+            return self.send_json(403, {"status": 403, "err": "Invalid token"})
+        if parts[:1] != ["v1"]:
+            return self.send_json(404, {"status": 404, "err": "Not found"})
+
+        store = self.server.store
+        depth = int(query["depth"]) if query.get("depth") else None
+        route = parts[1:]
+        if route == ["me"]:
+            return self.send_json(200, store.me_response())
+
+        if len(route) >= 2 and route[0] == "files":
+            file_key = route[1]
+            if len(route) == 2:
+                body = store.file_response(file_key, depth)
+                return self.send_body(200, body) if body is not None else self.send_json(404, {"status": 404, "err": "Not found"})
+            if route[2:] == ["nodes"]:
+                body = store.nodes_response(file_key, query.get("ids", "").split(","), depth)
+                return self.send_body(200, body) if body is not None else self.send_json(404, {"status": 404, "err": "Not found"})
+            if route[2:] == ["images"]:
+                refs = store.image_fill_refs(file_key)
+                if refs is None:
+                    return self.send_json(404, {"status": 404, "err": "Not found"})
+                images = {ref: self.asset_url(ref, "png") for ref in refs}
+                return self.send_json(200, {"error": False, "status": 200, "meta": {"images": images}})
+
+        if len(route) == 2 and route[0] == "images":
+            if store.get_file(route[1]) is None and store.get_recorded_nodes(route[1]) is None:
+                return self.send_json(404, {"status": 404, "err": "Not found"})
+            fmt = query.get("format", "png")
+            ids = [node_id for node_id in query.get("ids", "").split(",") if node_id]
+            images = {node_id: self.asset_url(node_id.replace(":", "-").replace(";", "_"), fmt) for node_id in ids}
+            return self.send_json(200, {"err": None, "images": images})
+
+        return self.send_json(404, {"status": 404, "err": "Not found"})
+
+
+def start_stub(
+    port: int = 0,
+    fixtures_dir: Optional[str] = None,
+    latency: float = 0.0,
+    image_size: int = 256,
+    host: str = "127.0.0.1",
+    drop_rate: float = 0.0,
+) -> StubServer:
+    """
+    在后台线程中启动桩服务，API 地址为 server.base_url + "/v1"
+    """
+    server = StubServer((host, port), FixtureStore(fixtures_dir), latency=latency, image_size=image_size, drop_rate=drop_rate)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def record(token: str, file_key: str, out: str, node_ids: Optional[list] = None, base: str = "https://api.figma.com/v1"):
+    out_dir = Path(out)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    targets = [
+        ("me.json", "/me"),
+        (f"{file_key}.json", f"/files/{file_key}"),
+        (f"{file_key}.images.json", f"/files/{file_key}/images"),
+    ]
+    if node_ids:
+        targets.append((f"{file_key}.nodes.json", f"/files/{file_key}/nodes?{urlencode({'ids': ','.join(node_ids)})}"))
+    for name, endpoint in targets:
+        request = urllib.request.Request(f"{base}{endpoint}", headers={"X-Figma-Token": token})
+        with urllib.request.urlopen(request) as response:
+            (out_dir / name).write_bytes(response.read())
+        print(f"saved {out_dir / name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command")
+    record_parser = subparsers.add_parser("record", help="录制真实 Figma 响应")
+    record_parser.add_argument("--token", required=True)
+    record_parser.add_argument("--file-key", required=True)
+    record_parser.add_argument("--out", required=True)
+    record_parser.add_argument("--node-ids", nargs="+", help="同时录制这些节点的 /files/:key/nodes 响应（1:2 格式）")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--fixtures", help="录制的响应目录（<file_key>.json、<file_key>.nodes.json、<file_key>.images.json、me.json）")
+    parser.add_argument("--latency", type=float, default=0.0, help="API 请求的模拟延迟（秒）")
+    parser.add_argument("--image-size", type=int, default=256, help="生成图片的边长（像素）")
+    parser.add_argument("--drop-rate", type=float, default=0.0, help="图片下载中途断开连接的概率")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        record(args.token, args.file_key, args.out, args.node_ids)
+        return
+
+    server = StubServer((args.host, args.port), FixtureStore(args.fixtures), latency=args.latency, image_size=args.image_size,
+                        drop_rate=args.drop_rate)
+    print(f"Figma stub API: {server.base_url}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
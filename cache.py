@@ -0,0 +1,314 @@
+import asyncio
+import contextvars
+import hashlib
+import os
+import struct
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Tuple
+
+from config import (
+    CACHE_BACKEND, CACHE_DIR, CACHE_MAX_MB, CACHE_MAX_STALE, DESIGN_CACHE_TTL, FILE_CACHE_TTL, IMAGE_CACHE_TTL,
+    IMAGE_URL_CACHE_TTL, REFRESH_CONCURRENCY, TOKEN_CACHE_TTL,
+)
+from metrics import CACHE_REFRESHES, CACHE_REQUESTS
+
+# 磁盘缓存文件头：过期时间（float64，大端）
+HEADER = struct.Struct(">d")
+# 缓存条目头：保鲜截止时间（float64）与版本号长度，之后依次为版本号与内容
+ENTRY = struct.Struct(">dH")
+# 超过该秒数仍未替换为正式文件的临时文件视为写入进程已退出，清理时删除
+TEMP_MAX_AGE = 600
+
+
+class CacheEntry(NamedTuple):
+    value: bytes
+    version: str
+    fresh: bool
+
+
+def hash_key(key: str) -> str:
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+class CacheBackend(ABC):
+    """
+    缓存后端：以 bytes 存取，blocking 为真时由 Cache 放到线程中调用
+    """
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    @abstractmethod
+    def delete(self, key: str):
+        pass
+
+
+class NullCache(CacheBackend):
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: bytes, ttl: float):
+        pass
+
+    def delete(self, key: str):
+        pass
+
+
+class MemoryCache(CacheBackend):
+    """
+    进程内 LRU，按总字节数淘汰；多 worker 时各进程独立
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.time():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        with self.lock:
+            self.remove(key)
+            self.entries[key] = (time.time() + ttl, value)
+            self.size += len(value)
+            while self.size > self.max_bytes:
+                self.remove(next(iter(self.entries)))
+
+    def delete(self, key: str):
+        with self.lock:
+            self.remove(key)
+
+    def remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+
+class DiskCache(CacheBackend):
+    """
+    每个键一个文件（文件名为键的 sha256），原子替换写入，多个 worker 进程可共享同一目录；
+    目录位于 /dev/shm 时即为共享内存缓存
+    """
+    blocking = True
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.writes = 0
+        self.lock = threading.Lock()
+
+    def path(self, key: str) -> Path:
+        return self.directory / hash_key(key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path(key)
+        try:
+            data = path.read_bytes()
+        except OSError:
+            return None
+        if len(data) < HEADER.size or HEADER.unpack_from(data)[0] < time.time():
+            path.unlink(missing_ok=True)
+            return None
+        return data[HEADER.size:]
+
+    def set(self, key: str, value: bytes, ttl: float):
+        if len(value) > self.max_bytes:
+            return
+        path = self.path(key)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            temp_path.write_bytes(HEADER.pack(time.time() + ttl) + value)
+            os.replace(temp_path, path)
+        except OSError:
+            # 写入失败（磁盘已满、临时文件被其他进程删除等）只是少一条缓存，不影响请求
+            temp_path.unlink(missing_ok=True)
+            return
+        with self.lock:
+            self.writes += 1
+            prune = self.writes % 64 == 0
+        if prune:
+            self.prune()
+
+    def delete(self, key: str):
+        self.path(key).unlink(missing_ok=True)
+
+    def prune(self):
+        """
+        删除过期文件，总大小超过上限时按修改时间从旧到新删除；其他进程正在写入的临时文件跳过，
+        只删除超过 TEMP_MAX_AGE 秒仍未替换的（写入进程已退出）
+        """
+        entries = []
+        now = time.time()
+        for path in self.directory.iterdir():
+            if path.name.endswith(".tmp"):
+                try:
+                    if path.stat().st_mtime < now - TEMP_MAX_AGE:
+                        path.unlink(missing_ok=True)
+                except OSError:
+                    pass
+                continue
+            try:
+                stat = path.stat()
+                with path.open("rb") as f:
+                    header = f.read(HEADER.size)
+            except OSError:
+                continue
+            if len(header) < HEADER.size or HEADER.unpack(header)[0] < now:
+                path.unlink(missing_ok=True)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+def create_backend(kind: str, name: str) -> CacheBackend:
+    max_bytes = int(CACHE_MAX_MB * 1024 * 1024)
+    if kind == "memory":
+        return MemoryCache(max_bytes)
+    if kind == "disk":
+        return DiskCache(os.path.join(CACHE_DIR, name), max_bytes)
+    if kind == "shm":
+        return DiskCache(os.path.join("/dev/shm", "mcp_figma_cache", name), max_bytes)
+    if kind == "none":
+        return NullCache()
+    raise ValueError(f"Unknown cache backend: {kind}")
+
+
+class Cache:
+    """
+    带 TTL 与命中统计的命名缓存，ttl 小于等于 0 时不缓存；
+    max_stale 大于 0 时过期条目仍保留 max_stale 秒，可通过 get_entry 取出并在后台重新验证（stale-while-revalidate）
+    """
+
+    def __init__(self, name: str, ttl: float, max_stale: float = 0, backend: Optional[CacheBackend] = None):
+        self.name = name
+        self.ttl = ttl
+        self.max_stale = max_stale
+        self.backend = backend if backend is not None else (create_backend(CACHE_BACKEND, name) if ttl > 0 else NullCache())
+
+    @property
+    def enabled(self) -> bool:
+        return not isinstance(self.backend, NullCache)
+
+    async def get_entry(self, key: str) -> Optional[CacheEntry]:
+        if not self.enabled:
+            return None
+        if self.backend.blocking:
+            data = await asyncio.to_thread(self.backend.get, key)
+        else:
+            data = self.backend.get(key)
+        entry = None
+        if data is not None and len(data) >= ENTRY.size:
+            fresh_until, version_size = ENTRY.unpack_from(data)
+            start = ENTRY.size + version_size
+            entry = CacheEntry(data[start:], data[ENTRY.size:start].decode("utf-8"), fresh_until >= time.time())
+        CACHE_REQUESTS.inc(cache=self.name, result="miss" if entry is None else "hit" if entry.fresh else "stale")
+        return entry
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = await self.get_entry(key)
+        return entry.value if entry is not None and entry.fresh else None
+
+    async def set(self, key: str, value: bytes, version: str = ""):
+        if not self.enabled:
+            return
+        version_bytes = version.encode("utf-8")
+        data = ENTRY.pack(time.time() + self.ttl, len(version_bytes)) + version_bytes + value
+        if self.backend.blocking:
+            await asyncio.to_thread(self.backend.set, key, data, self.ttl + self.max_stale)
+        else:
+            self.backend.set(key, data, self.ttl + self.max_stale)
+
+    async def delete(self, key: str):
+        if self.backend.blocking:
+            await asyncio.to_thread(self.backend.delete, key)
+        else:
+            self.backend.delete(key)
+
+
+class Revalidator:
+    """
+    后台刷新过期条目：同一个键同时只有一个刷新任务，总并发不超过 concurrency
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self.semaphore: Optional[asyncio.Semaphore] = None
+        self.pending: Dict[str, asyncio.Task] = {}
+
+    def schedule(self, cache: Cache, key: str, refresh: Callable[[], Awaitable[bool]]):
+        """
+        refresh 返回内容是否发生变化
+        """
+        task_key = f"{cache.name}:{key}"
+        if task_key in self.pending:
+            return
+        if self.semaphore is None:
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+        # 在空的上下文中创建任务，后台刷新不计入触发它的请求（如 profile 会话）
+        self.pending[task_key] = contextvars.Context().run(asyncio.create_task, self.run(cache, task_key, refresh))
+
+    async def run(self, cache: Cache, task_key: str, refresh: Callable[[], Awaitable[bool]]):
+        try:
+            async with self.semaphore:
+                changed = await refresh()
+            CACHE_REFRESHES.inc(cache=cache.name, result="changed" if changed else "unchanged")
+        except Exception:
+            CACHE_REFRESHES.inc(cache=cache.name, result="error")
+        finally:
+            self.pending.pop(task_key, None)
+
+
+# token 校验结果、Figma 文件/节点响应、解析后的设计数据、图片填充地址、下载的图片内容
+TOKEN_CACHE = Cache("token", TOKEN_CACHE_TTL)
+FILE_CACHE = Cache("file", FILE_CACHE_TTL, CACHE_MAX_STALE)
+DESIGN_CACHE = Cache("design", DESIGN_CACHE_TTL, CACHE_MAX_STALE)
+IMAGE_URL_CACHE = Cache("image_urls", IMAGE_URL_CACHE_TTL)
+IMAGE_CACHE = Cache("image", IMAGE_CACHE_TTL)
+# 每个文件的缓存代数，作为文件相关缓存键的一部分；有效期覆盖这些缓存的最长保留时间，
+# 因此代数条目过期时旧代数下的缓存也已全部过期
+GENERATION_CACHE = Cache("generation", max(FILE_CACHE_TTL, DESIGN_CACHE_TTL, IMAGE_URL_CACHE_TTL) + CACHE_MAX_STALE)
+
+REVALIDATOR = Revalidator(REFRESH_CONCURRENCY)
+
+
+async def file_generation(file_key: str) -> str:
+    value = await GENERATION_CACHE.get(f"file:{file_key}")
+    return value.decode("utf-8") if value is not None else "0"
+
+
+async def invalidate_file(file_key: str) -> str:
+    """
+    使文件的原始响应、解析结果与图片地址缓存全部失效：更新代数后旧键不再被访问，随 TTL 自然淘汰
+    """
+    generation = str(time.time_ns())
+    await GENERATION_CACHE.set(f"file:{file_key}", generation.encode("utf-8"))
+    return generation
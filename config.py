@@ -0,0 +1,91 @@
+import os
+import tempfile
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.getenv(name)
+    if value is None or value == "":
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.getenv(name)
+    return float(value) if value else default
+
+
+# Figma REST API 地址，基准测试时可指向本地桩服务（benchmarks/stub_server.py）
+FIGMA_API_BASE = os.getenv("FIGMA_API_BASE", "https://api.figma.com/v1").rstrip("/")
+
+# MCP 服务监听端口
+MCP_PORT = env_int("MCP_PORT", 10081)
+
+# uvicorn worker 进程数，大于 1 时多个进程共享同一端口
+MCP_WORKERS = env_int("MCP_WORKERS", 1)
+
+# 缓存后端：memory（进程内）、disk（FIGMA_CACHE_DIR）、shm（/dev/shm，多进程共享）、none；
+# 多 worker 且未指定时使用 shm，使各 worker 共享缓存
+CACHE_BACKEND = os.getenv("FIGMA_CACHE_BACKEND") or ("shm" if MCP_WORKERS > 1 and os.path.isdir("/dev/shm") else "memory")
+CACHE_DIR = os.getenv("FIGMA_CACHE_DIR", os.path.join(tempfile.gettempdir(), "mcp_figma_cache"))
+# 每个缓存的容量上限（MB）
+CACHE_MAX_MB = env_float("FIGMA_CACHE_MAX_MB", 128)
+# 各缓存的有效期（秒），0 表示不缓存；文件响应默认不缓存，以免返回过期的设计稿
+TOKEN_CACHE_TTL = env_float("FIGMA_TOKEN_CACHE_TTL", 300)
+FILE_CACHE_TTL = env_float("FIGMA_FILE_CACHE_TTL", 0)
+IMAGE_CACHE_TTL = env_float("FIGMA_IMAGE_CACHE_TTL", 3600)
+# 解析后的设计数据（parse_node 输出）与图片填充地址的缓存时间（秒），预取（/admin/prefetch）依赖这两个缓存
+DESIGN_CACHE_TTL = env_float("FIGMA_DESIGN_CACHE_TTL", 0)
+IMAGE_URL_CACHE_TTL = env_float("FIGMA_IMAGE_URL_CACHE_TTL", 0)
+# 文件响应与设计数据缓存过期后仍可返回的最长时间（秒）；期间先返回旧数据，
+# 再在后台检查文件版本，未变化时只延长有效期，变化时重新获取，0 表示不启用
+CACHE_MAX_STALE = env_float("FIGMA_CACHE_MAX_STALE", 0)
+REFRESH_CONCURRENCY = env_int("FIGMA_REFRESH_CONCURRENCY", 2)
+
+# Figma webhook（/webhooks/figma）的 passcode，为空时不接收 webhook；
+# FIGMA_WEBHOOK_REFRESH 为真时收到更新后立即在后台重新获取本进程最近请求过的设计数据
+WEBHOOK_PASSCODE = os.getenv("FIGMA_WEBHOOK_PASSCODE", "")
+WEBHOOK_REFRESH = env_bool("FIGMA_WEBHOOK_REFRESH", False)
+
+# 对 /nodes、/images 等幂等请求启用对冲：超过该类请求的 p95 耗时仍未返回时再发送一次，先返回的结果生效
+HEDGE_REQUESTS = env_bool("FIGMA_HEDGE_REQUESTS", False)
+
+# 准入控制：按估算的内存（MB）与 CPU 占用执行工具调用，超出时按优先级排队（get_figma_data 指定节点优先于整个文件，
+# 图片下载与打包导出最后），队列已满或排队超过 FIGMA_ADMISSION_TIMEOUT 秒时立即返回错误；
+# 内存预算为 0 时不启用，预算按 worker 进程计算；CPU 预算为同时执行的提取与图片处理数
+ADMISSION_MEMORY_MB = env_float("FIGMA_ADMISSION_MEMORY_MB", 0)
+ADMISSION_CPU = env_int("FIGMA_ADMISSION_CPU", os.cpu_count() or 1)
+ADMISSION_QUEUE = env_int("FIGMA_ADMISSION_QUEUE", 32)
+ADMISSION_TIMEOUT = env_float("FIGMA_ADMISSION_TIMEOUT", 10)
+
+# 完整文件响应的持久化存储目录，为空时不启用：节点压缩分块保存并按节点建立偏移索引，以 mmap 读取，
+# 重启后确认文件版本未变即可复用，指定节点的请求只解压、解析该节点的子树；总大小上限（MB）
+DOCSTORE_DIR = os.getenv("FIGMA_DOCSTORE_DIR", "")
+DOCSTORE_MAX_MB = env_float("FIGMA_DOCSTORE_MAX_MB", 1024)
+
+# 预取的并发请求数；设置 FIGMA_ADMIN_TOKEN 后管理接口需携带 Authorization: Bearer <token>
+PREFETCH_CONCURRENCY = env_int("FIGMA_PREFETCH_CONCURRENCY", 4)
+ADMIN_TOKEN = os.getenv("FIGMA_ADMIN_TOKEN", "")
+
+# 下载多个 SVG 时先以 geometry=paths 获取节点几何，几何与样式相同的节点只渲染、下载一次，其余复制文件
+SVG_DEDUP = env_bool("FIGMA_SVG_DEDUP", True)
+
+# 提取前对整棵树的颜色与几何做批量转换（安装 NumPy 时使用向量化计算）
+BATCH_CONVERT = env_bool("FIGMA_BATCH_CONVERT", False)
+
+# 顶层节点并行提取的进程数，小于等于 1 时在单个线程中顺序提取
+EXTRACT_WORKERS = env_int("FIGMA_EXTRACT_WORKERS", 0)
+
+# 请求 URL 带 profile=1 时生成的性能分析文件目录，以及保留的最近分析数量
+PROFILE_DIR = os.getenv("FIGMA_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "mcp_figma_profiles"))
+PROFILE_KEEP = env_int("FIGMA_PROFILE_KEEP", 50)
+
+# 全文索引（search_figma_text）最多保存的节点数，超过时淘汰最早加入的文件
+SEARCH_INDEX_MAX_NODES = env_int("FIGMA_SEARCH_INDEX_MAX_NODES", 1000000)
+
+# 图片下载中断后的续传次数：未完成的内容保存在 <文件名>.part 中，重试时以 Range 请求继续
+DOWNLOAD_RETRIES = env_int("FIGMA_DOWNLOAD_RETRIES", 3)
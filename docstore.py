@@ -0,0 +1,337 @@
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from cache import hash_key
+from config import DOCSTORE_DIR, DOCSTORE_MAX_MB
+from fast_json import dumps, loads
+
+# 文件头：魔数、节点数、块数、元数据（压缩的 JSON）与索引（压缩）的偏移和长度；之后依次为各数据块、元数据、索引
+MAGIC = b"FGDOC\x00\x01\x00"
+HEADER = struct.Struct("<8sIIQIQI")
+# 节点按文档顺序（先序）写入，每个数据块为节点组成的 JSON 数组，压缩前约为该大小；读取子树时只解压覆盖它的块，
+# 完全落在子树内的块整体解析
+BLOCK_SIZE = 64 * 1024
+COMPRESS_LEVEL = 6
+# 每个节点在索引中的字段：所在块、块内偏移、长度、子树结束位置（先序下标，不含）、深度
+INDEX_FIELDS = ("block", "start", "length", "end", "depth")
+# 保持打开（已 mmap 并解析索引）的文档数
+OPEN_DOCUMENTS = 8
+FILE_KEY = re.compile(r"[A-Za-z0-9_-]+")
+
+
+def to_little_endian(values: array) -> bytes:
+    if sys.byteorder != "little":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def from_little_endian(typecode: str, data: bytes) -> array:
+    values = array(typecode)
+    values.frombytes(data)
+    if sys.byteorder != "little":
+        values.byteswap()
+    return values
+
+
+def document_version(result: dict) -> str:
+    return str(result.get("version") or result.get("lastModified") or "")
+
+
+def write_document(path: Path, result: dict):
+    """
+    把 /files/:key 的完整响应写为存储格式：节点去掉 children（保留空列表占位）后逐个序列化，
+    父子关系由索引中的深度与子树结束位置还原
+    """
+    ids: List[str] = []
+    fields: Dict[str, array] = {name: array("I") for name in INDEX_FIELDS}
+    block_offsets = array("Q")
+    block_lengths = array("I")
+    block = bytearray(b"[")
+    temp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, "wb") as f:
+            f.write(bytes(HEADER.size))
+
+            def flush():
+                data = zlib.compress(bytes(block) + b"]", COMPRESS_LEVEL)
+                block_offsets.append(f.tell())
+                block_lengths.append(len(data))
+                f.write(data)
+                del block[1:]
+
+            # 整数项为子树结束标记（节点下标），弹出时记录子树结束位置
+            stack: List[Tuple[object, int]] = [(result.get("document") or {}, 0)]
+            while stack:
+                node, depth = stack.pop()
+                if isinstance(node, int):
+                    fields["end"][node] = len(ids)
+                    continue
+                record = dumps({**node, "children": []} if "children" in node else node).encode("utf-8")
+                if len(block) > 1 and len(block) + len(record) > BLOCK_SIZE:
+                    flush()
+                if len(block) > 1:
+                    block.extend(b",")
+                position = len(ids)
+                ids.append(node.get("id", ""))
+                fields["block"].append(len(block_offsets))
+                fields["start"].append(len(block))
+                fields["length"].append(len(record))
+                fields["end"].append(0)
+                fields["depth"].append(depth)
+                block.extend(record)
+                stack.append((position, depth))
+                stack.extend((child, depth + 1) for child in reversed(node.get("children") or []))
+            if len(block) > 1:
+                flush()
+
+            meta = zlib.compress(dumps({key: value for key, value in result.items() if key != "document"}).encode("utf-8"))
+            meta_offset = f.tell()
+            f.write(meta)
+            index = zlib.compress(b"".join([
+                to_little_endian(block_offsets),
+                to_little_endian(block_lengths),
+                *(to_little_endian(fields[name]) for name in INDEX_FIELDS),
+                "\n".join(ids).encode("utf-8"),
+            ]))
+            index_offset = f.tell()
+            f.write(index)
+            f.seek(0)
+            f.write(HEADER.pack(MAGIC, len(ids), len(block_offsets), meta_offset, len(meta), index_offset, len(index)))
+        os.replace(temp_path, path)
+    finally:
+        temp_path.unlink(missing_ok=True)
+
+
+class StoredDocument:
+    """
+    以 mmap 打开的存储文件：打开时只解压元数据与索引，节点内容在读取子树时按块解压、逐个解析；
+    checked_at 为本进程最近一次确认版本未变的时间
+    """
+
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.inode = os.fstat(f.fileno()).st_ino
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, count, blocks, meta_offset, meta_length, index_offset, index_length = HEADER.unpack_from(self.data)
+        if magic != MAGIC:
+            raise ValueError(f"Not a document store file: {path}")
+        self.meta = loads(zlib.decompress(self.data[meta_offset:meta_offset + meta_length]))
+        self.version = document_version(self.meta)
+        self.checked_at = 0.0
+
+        index = zlib.decompress(self.data[index_offset:index_offset + index_length])
+        self.block_offsets = from_little_endian("Q", index[:8 * blocks])
+        position = 8 * blocks
+        self.block_lengths = from_little_endian("I", index[position:position + 4 * blocks])
+        position += 4 * blocks
+        for name in INDEX_FIELDS:
+            setattr(self, name, from_little_endian("I", index[position:position + 4 * count]))
+            position += 4 * count
+        self.ids = index[position:].decode("utf-8").split("\n") if count else []
+        self.positions = {node_id: i for i, node_id in enumerate(self.ids)}
+
+    def confirmed(self, ttl: float) -> bool:
+        return ttl > 0 and time.time() - self.checked_at < ttl
+
+    def read_block(self, block: int) -> bytes:
+        offset = self.block_offsets[block]
+        return zlib.decompress(self.data[offset:offset + self.block_lengths[block]])
+
+    def first_node(self, block: int) -> int:
+        return bisect_left(self.block, block)
+
+    def load(self, position: int, depth: Optional[int] = None) -> dict:
+        """
+        还原 position 处节点的子树；depth 与 Figma 的 depth 参数相同，超过的节点不解析，所在块也不解压
+        """
+        blocks: Dict[int, bytes] = {}
+        parsed: Dict[int, Tuple[int, list]] = {}
+        base = self.depth[position]
+        stack: List[dict] = []
+        root: dict = {}
+        i = position
+        end = self.end[position]
+        while i < end:
+            block = self.block[i]
+            if block not in parsed and block not in blocks:
+                first, last = self.first_node(block), self.first_node(block + 1)
+                if depth is None and position <= first and last <= end:
+                    parsed[block] = (first, loads(self.read_block(block)))
+                else:
+                    blocks[block] = self.read_block(block)
+            if block in parsed:
+                first, nodes = parsed[block]
+                node = nodes[i - first]
+            else:
+                start = self.start[i]
+                node = loads(blocks[block][start:start + self.length[i]])
+            level = self.depth[i] - base
+            del stack[level:]
+            if stack:
+                stack[-1]["children"].append(node)
+            else:
+                root = node
+            stack.append(node)
+            if depth is not None and level >= depth:
+                node.pop("children", None)
+                i = self.end[i]
+            else:
+                i += 1
+        return root
+
+    def file_response(self, depth: Optional[int] = None) -> dict:
+        return {**self.meta, "document": self.load(0, depth)}
+
+    def nodes_response(self, node_ids: List[str], depth: Optional[int] = None) -> Optional[dict]:
+        """
+        与 /files/:key/nodes 相同结构的响应，components 等只包含子树中用到的条目；有节点不存在时返回 None
+        """
+        # URL 中的节点 id 以 - 分隔（1-2），API 中为 :（1:2）
+        positions = [self.positions.get(node_id, self.positions.get(node_id.replace("-", ":"))) for node_id in node_ids]
+        if any(position is None for position in positions):
+            return None
+        components = self.meta.get("components") or {}
+        component_sets = self.meta.get("componentSets") or {}
+        styles = self.meta.get("styles") or {}
+        nodes = {}
+        for node_id, position in zip(node_ids, positions):
+            document = self.load(position, depth)
+            used_components, used_styles = set(), set()
+            stack = [document]
+            while stack:
+                node = stack.pop()
+                if node.get("componentId"):
+                    used_components.add(node["componentId"])
+                if node.get("type") == "COMPONENT":
+                    used_components.add(node.get("id", ""))
+                used_styles.update((node.get("styles") or {}).values())
+                stack.extend(node.get("children") or [])
+            used = {key: components[key] for key in used_components if key in components}
+            nodes[node_id] = {
+                "document": document,
+                "components": used,
+                "componentSets": {
+                    key: component_sets[key] for key in {comp.get("componentSetId") for comp in used.values()} if key in component_sets
+                },
+                "styles": {key: styles[key] for key in used_styles if key in styles},
+                "schemaVersion": self.meta.get("schemaVersion", 0),
+            }
+        return {
+            **{key: self.meta[key] for key in ("name", "role", "lastModified", "editorType", "thumbnailUrl", "version", "linkAccess")
+               if key in self.meta},
+            "nodes": nodes,
+        }
+
+
+class DocumentStore:
+    """
+    按 token 与文件保存最近一次获取的完整文件，目录可放在持久卷上，重启后无需重新获取与完整解析；
+    写入为原子替换，多个 worker 可共享同一目录，总大小超过上限时按最近使用时间淘汰
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = Path(directory) if directory else None
+        if self.directory is not None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.documents: "OrderedDict[Path, StoredDocument]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.directory is not None
+
+    def path(self, token_key: str, file_key: str) -> Optional[Path]:
+        if self.directory is None or not FILE_KEY.fullmatch(file_key):
+            return None
+        # 文件名以文件键结尾，webhook 可按文件键删除所有 token 的副本
+        return self.directory / f"{hash_key(f'{token_key}:{file_key}')[:32]}.{file_key}.fgd"
+
+    def open(self, token_key: str, file_key: str) -> Optional[StoredDocument]:
+        path = self.path(token_key, file_key)
+        if path is None:
+            return None
+        try:
+            inode = path.stat().st_ino
+        except OSError:
+            return None
+        with self.lock:
+            document = self.documents.get(path)
+            if document is not None and document.inode == inode:
+                self.documents.move_to_end(path)
+                return document
+        try:
+            document = StoredDocument(path)
+            os.utime(path)
+        except (OSError, ValueError, zlib.error):
+            path.unlink(missing_ok=True)
+            return None
+        with self.lock:
+            self.documents[path] = document
+            while len(self.documents) > OPEN_DOCUMENTS:
+                # 不主动关闭 mmap，仍在读取的线程结束后随对象回收
+                self.documents.popitem(last=False)
+        return document
+
+    def write(self, token_key: str, file_key: str, result: dict):
+        path = self.path(token_key, file_key)
+        if path is None:
+            return
+        document = self.open(token_key, file_key)
+        if document is not None and document.version == document_version(result):
+            return
+        write_document(path, result)
+        self.prune()
+
+    def discard(self, document: StoredDocument):
+        """
+        读取时发现内容损坏的文件：删除（已被其他进程替换为新文件时保留）并不再保持打开
+        """
+        try:
+            if document.path.stat().st_ino == document.inode:
+                document.path.unlink(missing_ok=True)
+        except OSError:
+            pass
+        with self.lock:
+            if self.documents.get(document.path) is document:
+                self.documents.pop(document.path, None)
+
+    def remove_file(self, file_key: str):
+        if self.directory is None or not FILE_KEY.fullmatch(file_key):
+            return
+        for path in self.directory.glob(f"*.{file_key}.fgd"):
+            path.unlink(missing_ok=True)
+        with self.lock:
+            for path in [path for path in self.documents if path.name.endswith(f".{file_key}.fgd")]:
+                self.documents.pop(path, None)
+
+    def prune(self):
+        entries = []
+        for path in self.directory.glob("*.fgd"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+
+
+DOC_STORE = DocumentStore(DOCSTORE_DIR, int(DOCSTORE_MAX_MB * 1024 * 1024))
@@ -0,0 +1,97 @@
+from typing import Any, List, Literal
+from fast_json import dumps
+
+OutputFormat = Literal["json", "json-min", "table", "yaml"]
+OUTPUT_FORMATS = ("json", "json-min", "table", "yaml")
+
+# 表格编码中固定在前的列，其余列按首次出现的顺序追加
+TABLE_HEAD_COLUMNS = ["parent", "id", "name", "type"]
+
+
+def flatten_nodes(nodes: List[dict], parent: int = -1, rows: List[dict] = None) -> List[dict]:
+    """
+    前序遍历节点树，每个节点一行，children 替换为父节点行号（根节点为 -1）
+    """
+    if rows is None:
+        rows = []
+    for node in nodes:
+        index = len(rows)
+        rows.append({"parent": parent, **{key: value for key, value in node.items() if key != "children"}})
+        flatten_nodes(node.get("children", []), index, rows)
+    return rows
+
+
+def encode_table(design: dict) -> str:
+    rows = flatten_nodes(design.get("nodes", []))
+    columns = list(TABLE_HEAD_COLUMNS)
+    for row in rows:
+        for key in row:
+            if key not in columns:
+                columns.append(key)
+
+    table_rows = []
+    for row in rows:
+        values = [row.get(column) for column in columns]
+        # 去掉行尾的空值，减少输出体积
+        while values and values[-1] is None:
+            values.pop()
+        table_rows.append(values)
+
+    return dumps({
+        "metadata": design.get("metadata", {}),
+        "globalVars": design.get("globalVars", {}),
+        "columns": columns,
+        "rows": table_rows,
+    })
+
+
+def format_scalar(value: Any) -> str:
+    if isinstance(value, str):
+        # 不含空白和引号的字符串直接输出，否则使用 JSON 字符串
+        if value and not any(c.isspace() for c in value) and '"' not in value and "=" not in value:
+            return value
+        return dumps(value)
+    return dumps(value)
+
+
+def encode_yaml_nodes(nodes: List[dict], lines: List[str], indent: str):
+    for node in nodes:
+        head = f"{indent}- {node.get('type', '')} {node.get('id', '')} {dumps(node.get('name', ''))}"
+        fields = [
+            f"{key}={format_scalar(value)}"
+            for key, value in node.items()
+            if key not in ("id", "name", "type", "children")
+        ]
+        lines.append(" ".join([head, *fields]))
+        encode_yaml_nodes(node.get("children", []), lines, indent + "  ")
+
+
+def encode_yaml(design: dict) -> str:
+    """
+    类 YAML 的紧凑文本：每个节点一行 `- 类型 id "名称" 字段=值`，子节点通过缩进表示
+    """
+    lines = ["metadata:"]
+    for key, value in design.get("metadata", {}).items():
+        lines.append(f"  {key}: {format_scalar(value)}")
+
+    lines.append("globalVars:")
+    for section, values in design.get("globalVars", {}).items():
+        lines.append(f"  {section}:")
+        for var_id, value in values.items():
+            lines.append(f"    {var_id}: {dumps(value)}")
+
+    lines.append("nodes:")
+    encode_yaml_nodes(design.get("nodes", []), lines, "  ")
+    return "\n".join(lines)
+
+
+def encode_design(design: dict, output_format: OutputFormat = "json") -> str:
+    if output_format == "json":
+        return dumps(design, indent=True)
+    if output_format == "json-min":
+        return dumps(design)
+    if output_format == "table":
+        return encode_table(design)
+    if output_format == "yaml":
+        return encode_yaml(design)
+    raise ValueError(f"Unknown output format: {output_format}")
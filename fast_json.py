@@ -0,0 +1,25 @@
+import json
+from typing import Any, Union
+
+import pydantic_core
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，缺失时使用 pydantic_core / 标准库
+    orjson = None
+
+
+def loads(data: Union[bytes, str]) -> Any:
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(value: Any, indent: bool = False) -> str:
+    """
+    序列化为 JSON 字符串，非 ASCII 字符原样输出；indent 为 True 时缩进 2 个空格，
+    与 FastMCP 对非字符串返回值的默认序列化结果一致
+    """
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0).decode("utf-8")
+    return pydantic_core.to_json(value, indent=2 if indent else None).decode("utf-8")
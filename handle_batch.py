@@ -0,0 +1,178 @@
+from typing import Any, Dict, List, Optional, Tuple
+from utils import compute_color, pixel_round, prime_colors
+
+# NumPy 为可选依赖，首次批量转换时才导入（见 load_numpy），缺失时使用纯 Python 实现
+np = None
+numpy_checked = False
+
+ColorKey = Tuple[float, float, float, float, float]
+# 节点 id -> (相对父节点 x, 相对父节点 y, 宽, 高)，无法计算的项为 None
+Geometry = Dict[str, Tuple[Optional[float], Optional[float], Optional[float], Optional[float]]]
+
+GRADIENT_TYPES = ("GRADIENT_LINEAR", "GRADIENT_RADIAL", "GRADIENT_ANGULAR", "GRADIENT_DIAMOND")
+
+
+def is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value == value and value not in (float("inf"), float("-inf"))
+
+
+def color_key(color: Any, opacity: Any) -> Optional[ColorKey]:
+    if not isinstance(color, dict):
+        return None
+    key = (color.get("r", 0), color.get("g", 0), color.get("b", 0), color.get("a", 1), opacity)
+    return key if all(is_number(v) for v in key) else None
+
+
+def collect_paint_colors(paints: Any, colors: set):
+    if not isinstance(paints, list):
+        return
+    for paint in paints:
+        if not isinstance(paint, dict):
+            continue
+        if paint.get("type") == "SOLID":
+            key = color_key(paint.get("color", {}), paint.get("opacity", 1))
+            if key:
+                colors.add(key)
+        elif paint.get("type") in GRADIENT_TYPES:
+            for stop in paint.get("gradientStops", []):
+                key = color_key(stop.get("color"), 1.0)
+                if key:
+                    colors.add(key)
+
+
+def collect(nodes: List[dict]) -> Tuple[set, List[Tuple[str, Any, Any, Any, Any, Any, Any]]]:
+    """
+    遍历原始节点树，收集所有颜色（fills、strokes、effects、渐变节点）与包围盒
+    包围盒记录为 (节点 id, x, y, 父 x, 父 y, 宽, 高)，缺失的项为 None
+    """
+    colors: set = set()
+    boxes = []
+    stack: List[Tuple[dict, Optional[dict]]] = [(node, None) for node in nodes]
+    while stack:
+        node, parent = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        collect_paint_colors(node.get("fills"), colors)
+        collect_paint_colors(node.get("strokes"), colors)
+        for effect in node.get("effects", []) or []:
+            if isinstance(effect, dict):
+                key = color_key(effect.get("color", {}), 1.0)
+                if key:
+                    colors.add(key)
+
+        bbox = node.get("absoluteBoundingBox")
+        if isinstance(bbox, dict):
+            parent_box = parent.get("absoluteBoundingBox") if parent else None
+            if not isinstance(parent_box, dict) or not parent_box:
+                parent_box = {}
+            boxes.append((
+                node.get("id", ""),
+                bbox.get("x", 0) if parent_box else None,
+                bbox.get("y", 0) if parent_box else None,
+                parent_box.get("x", 0) if parent_box else None,
+                parent_box.get("y", 0) if parent_box else None,
+                bbox.get("width"),
+                bbox.get("height"),
+            ))
+
+        for child in node.get("children", []) or []:
+            stack.append((child, node))
+    return colors, boxes
+
+
+def convert_colors_python(keys: List[ColorKey]) -> Dict[ColorKey, Tuple[Tuple[str, float], str]]:
+    return {key: compute_color(*key) for key in keys}
+
+
+def convert_colors_numpy(keys: List[ColorKey]) -> Dict[ColorKey, Tuple[Tuple[str, float], str]]:
+    values = np.array(keys, dtype=np.float64)
+    # np.rint 与 Python round 一样采用银行家舍入，结果与逐个转换一致
+    channels = np.rint(values[:, :3] * 255).astype(np.int64).tolist()
+    alphas = (np.rint(values[:, 4] * values[:, 3] * 100) / 100).tolist()
+    entries = {}
+    for key, (red, green, blue), alpha in zip(keys, channels, alphas):
+        entries[key] = ("#{:02X}{:02X}{:02X}".format(red, green, blue), alpha), f"rgba({red}, {green}, {blue}, {alpha})"
+    return entries
+
+
+def round_numpy(values: "np.ndarray", integral: "np.ndarray", valid: "np.ndarray") -> "np.ndarray":
+    """
+    向量化的 pixel_round，返回 object 数组：整数输入保持为 int，无效项为 None。
+    rint(x * 100) / 100 仅在 x * 100 接近 .5 时可能与 round(x, 2) 不同，这些值退回 pixel_round 逐个计算
+    """
+    scaled = values * 100
+    result = (np.rint(scaled) / 100).astype(object)
+    integers = integral & valid
+    if integers.any():
+        result[integers] = values[integers].astype(np.int64).astype(object)
+    ambiguous = valid & ~integers & (np.abs(np.abs(scaled - np.trunc(scaled)) - 0.5) < 1e-6)
+    for index in np.flatnonzero(ambiguous):
+        result[index] = pixel_round(values[index].item())
+    result[~valid] = None
+    return result
+
+
+def convert_geometry_python(boxes: List[tuple]) -> Geometry:
+    geometry: Geometry = {}
+    for node_id, x, y, parent_x, parent_y, width, height in boxes:
+        relative = all(is_number(v) for v in (x, y, parent_x, parent_y))
+        geometry[node_id] = (
+            pixel_round(x - parent_x) if relative else None,
+            pixel_round(y - parent_y) if relative else None,
+            pixel_round(width) if is_number(width) else None,
+            pixel_round(height) if is_number(height) else None,
+        )
+    return geometry
+
+
+def convert_geometry_numpy(boxes: List[tuple]) -> Geometry:
+    flat = [value for box in boxes for value in box[1:]]
+    try:
+        # None 转为 NaN；出现非数值时退回纯 Python 实现
+        raw = np.array(flat, dtype=np.float64).reshape(-1, 6)
+    except (TypeError, ValueError):
+        return convert_geometry_python(boxes)
+    integral = np.fromiter((type(value) is int for value in flat), dtype=bool, count=len(flat)).reshape(-1, 6)
+    finite = np.isfinite(raw)
+    relative = finite[:, :4].all(axis=1)
+
+    # 无效项（NaN / inf）的计算结果会被替换为 None
+    with np.errstate(invalid="ignore"):
+        relative_x = round_numpy(raw[:, 0] - raw[:, 2], integral[:, 0] & integral[:, 2], relative)
+        relative_y = round_numpy(raw[:, 1] - raw[:, 3], integral[:, 1] & integral[:, 3], relative)
+        width = round_numpy(raw[:, 4], integral[:, 4], finite[:, 4])
+        height = round_numpy(raw[:, 5], integral[:, 5], finite[:, 5])
+
+    ids = [box[0] for box in boxes]
+    return dict(zip(ids, zip(relative_x.tolist(), relative_y.tolist(), width.tolist(), height.tolist())))
+
+
+def load_numpy() -> bool:
+    """
+    延迟导入 NumPy，避免拖慢服务启动；返回是否可用
+    """
+    global np, numpy_checked
+    if not numpy_checked:
+        numpy_checked = True
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            pass
+    return np is not None
+
+
+def prepare_batch(nodes: List[dict], use_numpy: Optional[bool] = None) -> Geometry:
+    """
+    批量转换：提取前一次性收集整棵树的颜色与包围盒并统一计算，
+    颜色结果写入 utils 的颜色缓存，几何结果返回给 build_layout 按节点 id 读取
+    """
+    if use_numpy is None:
+        use_numpy = load_numpy()
+    colors, boxes = collect(nodes)
+    if colors:
+        keys = list(colors)
+        prime_colors(convert_colors_numpy(keys) if use_numpy else convert_colors_python(keys))
+    if not boxes:
+        return {}
+    return convert_geometry_numpy(boxes) if use_numpy else convert_geometry_python(boxes)
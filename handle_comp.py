@@ -1,5 +1,10 @@
+import copy
+from typing import Any, Dict, List, Optional, Tuple
 from utils import has_value
 
+# extract_node 在子节点被 maxDepth 截断的实例与主组件上设置的标记，压缩时移除
+TRUNCATED = "_childrenTruncated"
+
 
 def extract_comp(node: dict, result: dict):
     if node.get("type") == "INSTANCE":
@@ -16,3 +21,150 @@ def extract_comp(node: dict, result: dict):
                 }
                 for name, prop in component_properties.items()
             ]
+
+
+def instance_prefix(instance_id: str) -> str:
+    # 实例子节点 id 形如 I<实例 id>;<组件内节点 id>，嵌套实例的 id 本身已带 I 前缀
+    return (instance_id if instance_id.startswith("I") else f"I{instance_id}") + ";"
+
+
+def relative_id(node_id: str, prefix: str) -> str:
+    return node_id[len(prefix):] if node_id.startswith(prefix) else node_id
+
+
+def relativize(nodes: List[dict], prefix: str) -> List[dict]:
+    """
+    将实例子树中的节点 id 转换为相对于主组件的 id，使同一组件的不同实例可以直接比较
+    """
+    result = []
+    for node in nodes:
+        item = {**node, "id": relative_id(node.get("id", ""), prefix)}
+        if "children" in node:
+            item["children"] = relativize(node.get("children", []), prefix)
+        result.append(item)
+    return result
+
+
+def flatten_tree(nodes: List[dict], parent_id: Optional[str] = None, flat: Optional[Dict[str, dict]] = None,
+                 orders: Optional[Dict[Optional[str], List[str]]] = None) -> Dict[str, dict]:
+    """
+    按 id 展开子树；传入 orders 时同时记录每个父节点（顶层为 None）的子节点 id 顺序
+    """
+    if flat is None:
+        flat = {}
+    if orders is not None:
+        orders[parent_id] = [node.get("id", "") for node in nodes]
+    for node in nodes:
+        fields = {key: value for key, value in node.items() if key != "children"}
+        fields["parentId"] = parent_id
+        flat[node.get("id", "")] = fields
+        flatten_tree(node.get("children", []), node.get("id", ""), flat, orders)
+    return flat
+
+
+def diff_children(template: List[dict], children: List[dict]) -> Tuple[Dict[str, Dict[str, Any]], Optional[List[str]]]:
+    """
+    对比实例子树与组件模板，仅保留不同的字段；模板中存在而实例中缺失的节点标记为 visible: False，
+    子节点顺序与模板不同（调整顺序或插入了节点）时在父节点上记录 childOrder；顶层的顺序单独返回
+    """
+    base_orders: Dict[Optional[str], List[str]] = {}
+    current_orders: Dict[Optional[str], List[str]] = {}
+    base = flatten_tree(template, orders=base_orders)
+    current = flatten_tree(children, orders=current_orders)
+    overrides: Dict[str, Dict[str, Any]] = {}
+
+    for node_id, fields in current.items():
+        origin = base.get(node_id)
+        if origin is None:
+            overrides[node_id] = fields
+            continue
+        changed = {key: value for key, value in fields.items() if key != "id" and origin.get(key) != value}
+        changed.update({key: None for key in origin if key not in fields})
+        if changed:
+            overrides[node_id] = changed
+
+    for node_id in base:
+        if node_id not in current:
+            overrides[node_id] = {"visible": False}
+
+    root_order = None
+    for parent_id, order in current_orders.items():
+        if parent_id is not None and parent_id not in base:
+            continue
+        present = set(order)
+        if order != [node_id for node_id in base_orders.get(parent_id, []) if node_id in present]:
+            if parent_id is None:
+                root_order = order
+            else:
+                overrides.setdefault(parent_id, {})["childOrder"] = order
+
+    return overrides, root_order
+
+
+class Templates:
+    """
+    各组件的模板：主组件在提取结果中（且未被 maxDepth 截断）时使用主组件的子树，否则使用首个实例的子树
+    """
+
+    def __init__(self, definitions: Dict[str, dict]):
+        self.definitions = definitions
+        self.components: Dict[str, Any] = {}
+
+    def get(self, component_id: str) -> Optional[dict]:
+        definition = self.definitions.pop(component_id, None)
+        if definition is not None:
+            # 主组件本身仍按原样输出，模板使用压缩后的副本（其中的嵌套实例同样压缩）
+            children = copy.deepcopy(definition.get("children", []))
+            compress_tree(children, self)
+            self.components[component_id] = {"children": children}
+        return self.components.get(component_id)
+
+
+def find_definitions(nodes: List[dict], definitions: Dict[str, dict]):
+    for node in nodes:
+        if node.get("type") == "COMPONENT" and not node.pop(TRUNCATED, False):
+            definitions.setdefault(node.get("id", ""), node)
+        find_definitions(node.get("children", []), definitions)
+
+
+def compress_instance(node: dict, templates: Templates):
+    truncated = node.pop(TRUNCATED, False)
+    component_id = node.get("componentId")
+    # 子节点被 maxDepth 截断的实例无法与模板比较，保持原样
+    if not component_id or truncated:
+        return
+
+    children = relativize(node.pop("children", []), instance_prefix(node.get("id", "")))
+    template = templates.get(component_id)
+    # 主组件不在结果中时首个实例作为模板，之后不再替换，否则先前按旧模板压缩的实例会被还原为新模板的子节点
+    if template is None:
+        templates.components[component_id] = {"children": children}
+        return
+
+    overrides, order = diff_children(template.get("children", []), children)
+    if overrides:
+        node["overrides"] = overrides
+    if order is not None:
+        node["childOrder"] = order
+
+
+def compress_tree(nodes: List[dict], templates: Templates):
+    # 后序遍历，保证嵌套实例先于外层实例被压缩
+    for node in nodes:
+        if "children" in node:
+            compress_tree(node.get("children", []), templates)
+        if node.get("type") == "INSTANCE":
+            compress_instance(node, templates)
+
+
+def compress_components(nodes: List[dict], global_vars: Dict[str, Any]):
+    """
+    组件压缩：每个主组件的简化子树只在 globalVars.components 中输出一次，
+    实例仅保留组件引用、属性覆盖以及与模板不同的子节点字段
+    """
+    definitions: Dict[str, dict] = {}
+    find_definitions(nodes, definitions)
+    templates = Templates(definitions)
+    compress_tree(nodes, templates)
+    if templates.components:
+        global_vars["components"] = templates.components
@@ -1,9 +1,20 @@
+import asyncio
+import base64
+import hashlib
+import json
 import os
-import aiohttp
+import re
+import shutil
 from pathlib import Path
-from PIL import Image
-from typing import Dict, Optional, Any, List
+from io import BytesIO
+from typing import AsyncIterator, Dict, Literal, Optional, Any, List, Tuple
 from urllib.parse import urlencode
+from profiling import stage
+from cache import IMAGE_CACHE
+from config import DOWNLOAD_RETRIES
+from metrics import RETRIES
+
+MD5_PATTERN = re.compile(r"[0-9a-fA-F]{32}")
 
 
 def filter_valid_images(images: Optional[Dict[str, Optional[str]]]) -> Dict[str, str]:
@@ -13,6 +24,95 @@ def filter_valid_images(images: Optional[Dict[str, Optional[str]]]) -> Dict[str,
     return {key: value for key, value in images.items() if value}
 
 
+# 影响 SVG 渲染结果的节点字段（不含 id、名称与在画布上的位置）
+GEOMETRY_FIELDS = (
+    "type", "fillGeometry", "strokeGeometry", "fills", "strokes", "strokeWeight", "strokeAlign", "strokeCap",
+    "strokeJoin", "strokeDashes", "strokeMiterAngle", "effects", "opacity", "blendMode", "isMask", "cornerRadius",
+    "rectangleCornerRadii", "characters", "style", "clipsContent", "background",
+)
+
+
+def geometry_hash(node: dict) -> str:
+    """
+    节点子树的几何与样式哈希（需以 geometry=paths 获取节点），哈希相同的节点渲染出的 SVG 相同；
+    子节点的位置相对于根节点计算，根节点只保留旋转与缩放
+    """
+    root_box = node.get("absoluteBoundingBox") or {}
+
+    def shape(n: dict) -> dict:
+        box = n.get("absoluteBoundingBox") or {}
+        item = {field: n[field] for field in GEOMETRY_FIELDS if field in n}
+        item["box"] = [
+            round(box.get("x", 0) - root_box.get("x", 0), 2), round(box.get("y", 0) - root_box.get("y", 0), 2),
+            box.get("width"), box.get("height"),
+        ]
+        if n.get("relativeTransform"):
+            item["transform"] = [row[:2] for row in n["relativeTransform"]]
+        item["children"] = [shape(child) for child in n.get("children", []) or [] if child.get("visible", True)]
+        return item
+
+    content = json.dumps(shape(node), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+VariantFormat = Literal["webp", "avif", "png", "jpg"]
+# 转码输出格式：Pillow 格式名与编码参数
+VARIANT_FORMATS = {
+    "png": ("PNG", {"optimize": True}),
+    "jpg": ("JPEG", {"quality": 85, "optimize": True}),
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "avif": ("AVIF", {"quality": 60}),
+}
+
+
+def format_scale(scale: float) -> str:
+    return f"{scale:g}"
+
+
+def generate_variants(image_path: str, formats: List[str], scales: List[float], base_scale: float) -> List[Dict[str, Any]]:
+    """
+    图片只解码一次，输出其他格式与缩小尺寸的版本；base_scale 为下载时的导出比例，scales 中的比例按 scale / base_scale 缩小，
+    指定 scales 时文件名带 @<scale>x 后缀，与原文件格式、尺寸都相同的版本即原文件本身，不再输出
+    """
+    from PIL import Image, features
+
+    original_bytes = os.path.getsize(image_path)
+    stem, ext = os.path.splitext(image_path)
+    original_format = ext.lstrip(".").lower().replace("jpeg", "jpg")
+    variants = []
+    with Image.open(image_path) as img:
+        img.load()
+        source = img if img.mode in ("RGB", "RGBA") else img.convert("RGBA")
+        for scale in sorted(set(scales), reverse=True) if scales else [base_scale]:
+            if scale > base_scale:
+                variants.append({"scale": scale, "error": f"scale exceeds the downloaded scale {format_scale(base_scale)}"})
+                continue
+            size = (max(1, round(source.width * scale / base_scale)), max(1, round(source.height * scale / base_scale)))
+            frame = source if size == source.size else source.resize(size, Image.LANCZOS)
+            suffix = f"@{format_scale(scale)}x" if scales else ""
+            for fmt in dict.fromkeys([original_format, *formats]):
+                if fmt == original_format and size == source.size:
+                    continue
+                if fmt not in VARIANT_FORMATS or (fmt in ("webp", "avif") and not features.check(fmt)):
+                    variants.append({"format": fmt, "scale": scale, "error": "format not supported by the installed Pillow"})
+                    continue
+                pillow_format, params = VARIANT_FORMATS[fmt]
+                output = frame.convert("RGB") if pillow_format == "JPEG" else frame
+                path = f"{stem}{suffix}.{fmt}"
+                output.save(path, pillow_format, **params)
+                size_bytes = os.path.getsize(path)
+                variants.append({
+                    "filePath": path,
+                    "format": fmt,
+                    "scale": scale,
+                    "width": size[0],
+                    "height": size[1],
+                    "bytes": size_bytes,
+                    "savings": round(1 - size_bytes / original_bytes, 4) if original_bytes else 0,
+                })
+    return variants
+
+
 def build_svg_query_params(svg_ids: List[str], svg_options: Dict[str, bool]) -> str:
     params = {
         "ids": ",".join(svg_ids),
@@ -24,28 +124,165 @@ def build_svg_query_params(svg_ids: List[str], svg_options: Dict[str, bool]) ->
     return urlencode(params)
 
 
+class IncompleteDownload(Exception):
+    pass
+
+
+class TransientStatus(Exception):
+    """
+    CDN 返回 429 或 5xx，与连接错误一样重试
+    """
+
+
+def expected_md5(response) -> Optional[str]:
+    """
+    响应中可用于校验的 MD5：Content-MD5，或单段上传对象（S3 等）形如 MD5 的 ETag
+    """
+    content_md5 = response.headers.get("Content-MD5")
+    if content_md5 and response.status == 200:
+        try:
+            return base64.b64decode(content_md5).hex()
+        except ValueError:
+            pass
+    etag = (response.headers.get("ETag") or "").strip('"')
+    return etag.lower() if MD5_PATTERN.fullmatch(etag) else None
+
+
+def file_md5(path: Path) -> str:
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+async def fetch_to_part(session, image_url: str, part_path: Path, meta_path: Path):
+    """
+    把图片写入 .part 文件：已有部分内容时带 Range 继续下载（有 ETag / Last-Modified 时同时带 If-Range，
+    文件已变化则服务端返回完整内容），并在 .part.json 中记录总长度与校验信息；内容不完整时抛出 IncompleteDownload
+    """
+    meta = {}
+    if part_path.exists() and meta_path.exists():
+        try:
+            meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except ValueError:
+            meta = {}
+    offset = part_path.stat().st_size if part_path.exists() else 0
+    validator = meta.get("etag") or meta.get("lastModified")
+    # 没有校验信息时只能在同一地址上续传
+    if offset and not validator and meta.get("url") != image_url:
+        offset = 0
+
+    headers = {}
+    if offset:
+        headers["Range"] = f"bytes={offset}-"
+        if validator:
+            headers["If-Range"] = validator
+
+    async with session.get(image_url, headers=headers) as response:
+        if response.status == 416:
+            # 本地内容超出服务端文件长度，丢弃后从头下载
+            part_path.unlink(missing_ok=True)
+            raise IncompleteDownload("Range not satisfiable")
+        if response.status == 429 or response.status >= 500:
+            raise TransientStatus(f"Failed to download image: {response.status} {response.reason}")
+        if response.status not in (200, 206):
+            raise Exception(f"Failed to download image: {response.status} {response.reason}")
+
+        if response.status == 206:
+            content_range = response.headers.get("Content-Range", "")
+            start, _, total = content_range.removeprefix("bytes ").partition("/")
+            if not start.startswith(f"{offset}-"):
+                part_path.unlink(missing_ok=True)
+                raise IncompleteDownload(f"Unexpected Content-Range: {content_range}")
+            meta["total"] = int(total) if total.isdigit() else None
+            mode = "ab"
+        else:
+            offset = 0
+            meta = {
+                "url": image_url,
+                "etag": response.headers.get("ETag"),
+                "lastModified": response.headers.get("Last-Modified"),
+                "md5": expected_md5(response),
+                "total": response.content_length,
+            }
+            mode = "wb"
+        meta["url"] = image_url
+        meta_path.write_text(json.dumps(meta), encoding="utf-8")
+
+        with open(part_path, mode) as f:
+            async for chunk in response.content.iter_chunked(65536):
+                f.write(chunk)
+
+    size = part_path.stat().st_size
+    if meta.get("total") is not None and size != meta["total"]:
+        raise IncompleteDownload(f"Received {size} of {meta['total']} bytes")
+    return meta
+
+
 async def download_figma_image(file_name: str, local_path: str, image_url: str) -> str:
+    """
+    下载到 <文件名>.part，中断时保留已下载的部分并以 Range 请求续传（最多 DOWNLOAD_RETRIES 次），
+    完成后校验长度与 MD5（服务端提供时）再替换为最终文件；重试用尽后 .part 保留，下次下载同一文件时继续
+    """
     # 确保目录存在
     Path(local_path).mkdir(parents=True, exist_ok=True)
     full_path = Path(local_path) / file_name
+    part_path = full_path.with_name(f"{full_path.name}.part")
+    meta_path = full_path.with_name(f"{full_path.name}.part.json")
 
-    try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(image_url) as response:
-                if response.status != 200:
-                    raise Exception(f"Failed to download image: {response.status} {response.reason}")
+    cached = await IMAGE_CACHE.get(image_url)
+    if cached is not None:
+        with open(full_path, "wb") as f:
+            f.write(cached)
+        return str(full_path)
 
-                # 以二进制写入流方式保存
-                with open(full_path, "wb") as f:
-                    async for chunk in response.content.iter_chunked(1024):
-                        f.write(chunk)
+    # aiohttp 与 Pillow 在首次下载时才导入，缩短服务启动时间
+    import aiohttp
+
+    last_error: Optional[Exception] = None
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=10, sock_read=30)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        for attempt in range(DOWNLOAD_RETRIES + 1):
+            if attempt:
+                RETRIES.inc(endpoint="download")
+                await asyncio.sleep(min(0.2 * 2 ** (attempt - 1), 2))
+            try:
+                with stage("download", file=file_name, attempt=attempt):
+                    meta = await fetch_to_part(session, image_url, part_path, meta_path)
+                if meta.get("md5") and await asyncio.to_thread(file_md5, part_path) != meta["md5"]:
+                    part_path.unlink(missing_ok=True)
+                    raise IncompleteDownload("Checksum mismatch")
+                break
+            except (aiohttp.ClientError, asyncio.TimeoutError, IncompleteDownload, TransientStatus) as e:
+                last_error = e
+        else:
+            raise Exception(f"Error downloading image: {last_error} (partial content kept in {part_path.name})")
+
+    os.replace(part_path, full_path)
+    meta_path.unlink(missing_ok=True)
+    if IMAGE_CACHE.enabled:
+        await IMAGE_CACHE.set(image_url, await asyncio.to_thread(full_path.read_bytes))
+    return str(full_path)
+
+
+async def stream_figma_image(image_url: str, chunk_size: int = 65536) -> AsyncIterator[bytes]:
+    """
+    逐块读取图片内容而不写入文件，已缓存的图片直接返回缓存内容
+    """
+    cached = await IMAGE_CACHE.get(image_url)
+    if cached is not None:
+        yield cached
+        return
 
-        return str(full_path)
+    import aiohttp
 
-    except Exception as e:
-        if full_path.exists():
-            os.remove(full_path)  # 删除半成品文件
-        raise Exception(f"Error downloading image: {e}") from e
+    async with aiohttp.ClientSession() as session:
+        async with session.get(image_url) as response:
+            if response.status != 200:
+                raise Exception(f"Failed to download image: {response.status} {response.reason}")
+            async for chunk in response.content.iter_chunked(chunk_size):
+                yield chunk
 
 
 async def get_image_dimensions(image_path: str) -> dict:
@@ -53,7 +290,9 @@ async def get_image_dimensions(image_path: str) -> dict:
     获取图片宽高，如果失败则返回默认值 1000x1000
     """
     try:
-        with Image.open(image_path) as img:
+        from PIL import Image
+
+        with stage("image_processing"), Image.open(image_path) as img:
             width, height = img.size
             if not width or not height:
                 raise ValueError(f"Could not get image dimensions for {image_path}")
@@ -72,45 +311,81 @@ def generate_image_css_variables(param: dict) -> str:
     return f"--original-width: {width}px; --original-height: {height}px;"
 
 
+def describe_variant(variant: dict, original_bytes: int) -> str:
+    """
+    转码结果的一行描述：尺寸、字节数以及相对原文件的大小变化
+    """
+    if "error" in variant:
+        return f"{variant.get('format', '*')}@{format_scale(variant['scale'])}x: {variant['error']}"
+    change = f"{-variant['savings'] * 100:+.0f}%" if original_bytes else "n/a"
+    return f"{os.path.basename(variant['filePath'])}: {variant['width']}x{variant['height']}, {variant['bytes'] / 1024:.1f} KB ({change})"
+
+
+def crop_box(width: int, height: int, crop_transform: list) -> Optional[Tuple[int, int, int, int]]:
+    """
+    按 Figma transform 矩阵计算裁剪区域 (left, top, right, bottom)，区域为空时返回 None
+    crop_transform 格式: [[scaleX, skewX, translateX], [skewY, scaleY, translateY]]
+    """
+    # 提取 transform 参数
+    scale_x = crop_transform[0][0] if crop_transform[0][0] is not None else 1
+    translate_x = crop_transform[0][2] if crop_transform[0][2] is not None else 0
+    scale_y = crop_transform[1][1] if crop_transform[1][1] is not None else 1
+    translate_y = crop_transform[1][2] if crop_transform[1][2] is not None else 0
+
+    # 计算裁剪区域
+    crop_left = max(0, round(translate_x * width))
+    crop_top = max(0, round(translate_y * height))
+    crop_width = min(width - crop_left, round(scale_x * width))
+    crop_height = min(height - crop_top, round(scale_y * height))
+
+    # 验证裁剪尺寸
+    if crop_width <= 0 or crop_height <= 0:
+        return None
+    return crop_left, crop_top, crop_left + crop_width, crop_top + crop_height
+
+
+def crop_image_bytes(data: bytes, crop_transform: list) -> bytes:
+    """
+    在内存中裁剪图片，用于流式导出；无法裁剪时返回原内容
+    """
+    try:
+        from PIL import Image
+
+        with Image.open(BytesIO(data)) as img:
+            box = crop_box(img.width, img.height, crop_transform)
+            if box is None:
+                return data
+            output = BytesIO()
+            img.crop(box).save(output, img.format or "PNG")
+            return output.getvalue()
+    except Exception:
+        return data
+
+
 def apply_crop_transform(image_path: str, crop_transform: list) -> str:
     """
     按 Figma transform 矩阵裁剪图片，覆盖原文件
     crop_transform 格式: [[scaleX, skewX, translateX], [skewY, scaleY, translateY]]
     """
     try:
-        # 提取 transform 参数
-        scale_x = crop_transform[0][0] if crop_transform[0][0] is not None else 1
-        translate_x = crop_transform[0][2] if crop_transform[0][2] is not None else 0
-        scale_y = crop_transform[1][1] if crop_transform[1][1] is not None else 1
-        translate_y = crop_transform[1][2] if crop_transform[1][2] is not None else 0
-
         # 打开图片获取尺寸
-        with Image.open(image_path) as img:
+        from PIL import Image
+
+        with stage("image_processing"), Image.open(image_path) as img:
             width, height = img.size
 
             if not width or not height:
                 raise ValueError(f"Could not get image dimensions for {image_path}")
 
-            # 计算裁剪区域
-            crop_left = max(0, round(translate_x * width))
-            crop_top = max(0, round(translate_y * height))
-            crop_width = min(width - crop_left, round(scale_x * width))
-            crop_height = min(height - crop_top, round(scale_y * height))
-
-            # 验证裁剪尺寸
-            if crop_width <= 0 or crop_height <= 0:
+            box = crop_box(width, height, crop_transform)
+            if box is None:
                 return image_path
 
             # 临时文件路径
             temp_path = image_path + ".tmp"
 
             # 裁剪并保存临时文件
-            cropped_img = img.crop((
-                crop_left,
-                crop_top,
-                crop_left + crop_width,
-                crop_top + crop_height
-            ))
+            cropped_img = img.crop(box)
             cropped_img.save(temp_path)
 
         # 替换原文件
@@ -128,7 +403,8 @@ async def download_and_process_image(
     image_url: str,
     needs_cropping: bool = False,
     crop_transform: Optional[list] = None,
-    requires_image_dimensions: bool = False
+    requires_image_dimensions: bool = False,
+    variants: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     processing_log = []
 
@@ -166,6 +442,17 @@ async def download_and_process_image(
     if requires_image_dimensions:
         css_variables = generate_image_css_variables(final_dimensions)
 
+    # 转码与多尺寸输出，编码在线程中进行，不阻塞事件循环
+    variant_files = None
+    if variants and not final_path.lower().endswith(".svg"):
+        with stage("transcode", file=file_name):
+            try:
+                variant_files = await asyncio.to_thread(
+                    generate_variants, final_path, variants.get("formats") or [], variants.get("scales") or [], variants.get("baseScale", 1),
+                )
+            except Exception as e:
+                processing_log.append(f"Failed to generate variants: {e}")
+
     return {
         "filePath": final_path,
         "originalDimensions": original_dimensions,
@@ -173,6 +460,34 @@ async def download_and_process_image(
         "wasCropped": was_cropped,
         "cropRegion": crop_region,
         "cssVariables": css_variables,
-        "processingLog": processing_log
+        "processingLog": processing_log,
+        "originalBytes": os.path.getsize(final_path),
+        "variants": variant_files,
     }
 
+
+async def download_deduplicated(items: List[Dict[str, Any]], local_path: str, image_url: str) -> List[Dict[str, Any]]:
+    """
+    渲染结果相同的一组节点只下载第一个，其余复制为各自的文件名，返回顺序与 items 一致
+    """
+    first = items[0]
+    result = await download_and_process_image(
+        first["fileName"],
+        local_path,
+        image_url,
+        first.get("needsCropping", False),
+        first.get("cropTransform"),
+        first.get("requiresImageDimensions", False),
+    )
+    results = [result]
+    for item in items[1:]:
+        copy_path = str(Path(local_path) / item["fileName"])
+        if copy_path != result["filePath"]:
+            await asyncio.to_thread(shutil.copyfile, result["filePath"], copy_path)
+        results.append({
+            **result,
+            "filePath": copy_path,
+            "cssVariables": generate_image_css_variables(result["finalDimensions"]) if item.get("requiresImageDimensions") else None,
+            "processingLog": [f"Copied from {os.path.basename(result['filePath'])} (identical geometry)"],
+        })
+    return results
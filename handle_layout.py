@@ -1,14 +1,47 @@
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from utils import (is_frame, legal_get, generate_css_shorthand, is_layout, is_in_auto_layout_flow, pixel_round,
                    is_rectangle, find_or_create_var)
 
 
+# 布局转换表：结果为字符串或共享的常量对象，调用方不可修改
+DIRECTIONS: Dict[Tuple[str, str], str] = {
+    ("primary", "row"): "horizontal",
+    ("counter", "row"): "vertical",
+    ("primary", "column"): "vertical",
+    ("counter", "column"): "horizontal",
+}
+AXIS_ALIGN: Dict[str, str] = {
+    # MIN 即 flex-start，默认值，返回 None
+    "MAX": "flex-end",
+    "CENTER": "center",
+    "SPACE_BETWEEN": "space-between",
+    "BASELINE": "baseline",
+}
+SELF_ALIGN: Dict[str, str] = {
+    "MAX": "flex-end",
+    "CENTER": "center",
+    "STRETCH": "stretch",
+}
+SIZING: Dict[str, str] = {
+    "FIXED": "fixed",
+    "FILL": "fill",
+    "HUG": "hug",
+}
+LAYOUT_MODES: Dict[str, str] = {
+    "NONE": "none",
+    "HORIZONTAL": "row",
+}
+OVERFLOW_SCROLL: Dict[str, List[str]] = {
+    "NONE": [],
+    "HORIZONTAL_SCROLLING": ["x"],
+    "VERTICAL_SCROLLING": ["y"],
+    "HORIZONTAL_AND_VERTICAL_SCROLLING": ["x", "y"],
+}
+NON_FRAME: Dict[str, str] = {"mode": "none"}
+
+
 def get_direction(axis: str, mode: str) -> str:
-    if mode == "row":
-        return "horizontal" if axis == "primary" else "vertical"
-    elif mode == "column":
-        return "vertical" if axis == "primary" else "horizontal"
-    return "horizontal"
+    return DIRECTIONS.get((axis, mode), "horizontal")
 
 
 def convert_align(axis_align: str = None, stretch: Optional[Dict[str, Any]] = None) -> Optional[str]:
@@ -18,81 +51,44 @@ def convert_align(axis_align: str = None, stretch: Optional[Dict[str, Any]] = No
         axis: str = stretch.get("axis", "primary")
 
         direction: str = get_direction(axis, mode)
+        sizing_key = "layoutSizingHorizontal" if direction == "horizontal" else "layoutSizingVertical"
 
-        def should_stretch_child(c: Dict[str, Any]) -> bool:
-            if c.get("layoutPositioning") == "ABSOLUTE":
-                return True
-            if direction == "horizontal":
-                return c.get("layoutSizingHorizontal") == "FILL"
-            elif direction == "vertical":
-                return c.get("layoutSizingVertical") == "FILL"
-            return False
-
-        if children and all(should_stretch_child(c) for c in children):
+        if children and all(c.get("layoutPositioning") == "ABSOLUTE" or c.get(sizing_key) == "FILL" for c in children):
             return "stretch"
 
     # 处理对齐方式
-    if axis_align == "MIN":
-        return None  # flex-start is default
-    elif axis_align == "MAX":
-        return "flex-end"
-    elif axis_align == "CENTER":
-        return "center"
-    elif axis_align == "SPACE_BETWEEN":
-        return "space-between"
-    elif axis_align == "BASELINE":
-        return "baseline"
-    else:
-        return None
+    return AXIS_ALIGN.get(axis_align)
 
 
 def convert_self_align(align: str = None) -> Optional[str]:
-    if align == "MIN":
-        # MIN 即 flex-start，默认值，返回 None
-        return None
-    elif align == "MAX":
-        return "flex-end"
-    elif align == "CENTER":
-        return "center"
-    elif align == "STRETCH":
-        return "stretch"
-    else:
-        return None
+    return SELF_ALIGN.get(align)
 
 
 def convert_sizing(s: str | None) -> str | None:
-    if s == "FIXED":
-        return "fixed"
-    if s == "FILL":
-        return "fill"
-    if s == "HUG":
-        return "hug"
-    return None
+    return SIZING.get(s)
+
+
+def overflow_scroll_of(overflow_dir: Optional[str]) -> List[str]:
+    if not overflow_dir:
+        return []
+    scroll = OVERFLOW_SCROLL.get(overflow_dir)
+    if scroll is None:
+        scroll = [axis for axis, key in (("x", "HORIZONTAL"), ("y", "VERTICAL")) if key in overflow_dir]
+    return scroll
 
 
 def build_frame(node: dict):
     if not is_frame(node):
-        return {
-            "mode": "none"
-        }
+        return NON_FRAME
 
     layout_mode = legal_get(node, "layoutMode", None)
     frame: dict = {
-        "mode": (
-            "none" if not layout_mode or layout_mode == "NONE"
-            else "row" if layout_mode == "HORIZONTAL"
-            else "column"
-        )
+        "mode": LAYOUT_MODES.get(layout_mode, "column") if layout_mode else "none"
     }
 
-    overflow_scroll = []
-    overflow_dir = legal_get(node, "overflowDirection", None)
-    if overflow_dir and "HORIZONTAL" in overflow_dir:
-        overflow_scroll.append("x")
-    if overflow_dir and "VERTICAL" in overflow_dir:
-        overflow_scroll.append("y")
+    overflow_scroll = overflow_scroll_of(legal_get(node, "overflowDirection", None))
     if overflow_scroll:
-        frame["overflowScroll"] = overflow_scroll
+        frame["overflowScroll"] = list(overflow_scroll)
 
     if frame["mode"] == "none":
         return frame
@@ -129,9 +125,13 @@ def build_frame(node: dict):
     return frame
 
 
-def build_layout(n: dict, mode: str, parent: Optional[dict] = None):
+def build_layout(n: dict, mode: str, parent: Optional[dict] = None, geometry: Optional[tuple] = None):
+    """
+    geometry 为批量转换预先计算的 (相对 x, 相对 y, 宽, 高)，为 None 的项按节点逐个计算
+    """
     if not is_layout(n):
         return None
+    geometry = geometry or (None, None, None, None)
 
     layout: dict = {
         "mode": mode,
@@ -145,10 +145,13 @@ def build_layout(n: dict, mode: str, parent: Optional[dict] = None):
         if n.get("layoutPositioning", None) == "ABSOLUTE":
             layout["position"] = "absolute"
         if n.get("absoluteBoundingBox", None) and parent.get("absoluteBoundingBox", None):
-            layout["locationRelativeToParent"] = {
-                "x": pixel_round(n.get("absoluteBoundingBox", {}).get("x", 0) - parent.get("absoluteBoundingBox", {}).get("x", 0)),
-                "y": pixel_round(n.get("absoluteBoundingBox", {}).get("y", 0) - parent.get("absoluteBoundingBox", {}).get("y", 0)),
-            }
+            if geometry[0] is not None and geometry[1] is not None:
+                layout["locationRelativeToParent"] = {"x": geometry[0], "y": geometry[1]}
+            else:
+                layout["locationRelativeToParent"] = {
+                    "x": pixel_round(n.get("absoluteBoundingBox", {}).get("x", 0) - parent.get("absoluteBoundingBox", {}).get("x", 0)),
+                    "y": pixel_round(n.get("absoluteBoundingBox", {}).get("y", 0) - parent.get("absoluteBoundingBox", {}).get("y", 0)),
+                }
 
     if is_rectangle("absoluteBoundingBox", n):
         dimensions = {}
@@ -180,17 +183,17 @@ def build_layout(n: dict, mode: str, parent: Optional[dict] = None):
         # Round numbers and assign if any dimensions exist
         if dimensions:
             if "width" in dimensions and dimensions["width"] is not None:
-                dimensions["width"] = pixel_round(dimensions["width"])
+                dimensions["width"] = geometry[2] if geometry[2] is not None else pixel_round(dimensions["width"])
             if "height" in dimensions and dimensions["height"] is not None:
-                dimensions["height"] = pixel_round(dimensions["height"])
+                dimensions["height"] = geometry[3] if geometry[3] is not None else pixel_round(dimensions["height"])
             layout["dimensions"] = dimensions
 
     return layout
 
 
-def simply_layout(node: dict, parent: Optional[dict] = None):
+def simply_layout(node: dict, parent: Optional[dict] = None, geometry: Optional[tuple] = None):
     frame = build_frame(node=node)
-    layout = build_layout(n=node, parent=parent, mode=frame.get("mode", "none")) or {}
+    layout = build_layout(n=node, parent=parent, mode=frame.get("mode", "none"), geometry=geometry) or {}
     return {
         **frame,
         **layout,
@@ -198,6 +201,7 @@ def simply_layout(node: dict, parent: Optional[dict] = None):
 
 
 def extract_layout(node: dict, result: dict, context: dict):
-    layout = simply_layout(node=node, parent=context.get("parent", None))
+    geometry = context["geometry"].get(node.get("id", "")) if "geometry" in context else None
+    layout = simply_layout(node=node, parent=context.get("parent", None), geometry=geometry)
     if len(layout) > 1:
-        result["layout"] = find_or_create_var(context.get("globalVars", {}), layout, "layout")
+        result["layout"] = find_or_create_var(context.get("globalVars", {}), layout, "layout", context.get("counters"))
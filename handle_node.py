@@ -1,8 +1,15 @@
 from handle_layout import extract_layout
 from handle_text import extract_text
 from handle_visual import extract_visual
-from handle_comp import extract_comp
-from utils import has_value
+from handle_comp import TRUNCATED, extract_comp
+from handle_batch import prepare_batch
+from utils import has_value, generate_var_id
+from typing import Any, Dict, List, Optional, Tuple
+from time import perf_counter
+import json
+
+# 节点中引用 globalVars.styles 变量的字段
+STYLE_REF_KEYS = ("layout", "textStyle", "fills", "strokes", "effects")
 
 
 def should_children(node: dict, context: dict, option: dict):
@@ -18,10 +25,28 @@ def extract_node(node: dict, context: dict, option: dict):
         "type": "IMAGE-SVG" if node.get("type") == "VECTOR" else node.get("type", ""),
     }
 
-    extract_layout(node=node, result=result, context=context)
-    extract_text(node=node, result=result, context=context)
-    extract_visual(node=node, result=result, context=context)
-    extract_comp(node=node, result=result)
+    timings = context.get("timings")
+    if "counters" in context:
+        context["counters"]["nodes"] += 1
+    if timings is None:
+        extract_layout(node=node, result=result, context=context)
+        extract_text(node=node, result=result, context=context)
+        extract_visual(node=node, result=result, context=context)
+        extract_comp(node=node, result=result)
+    else:
+        # 按提取器累计耗时，供 metrics 统计
+        start = perf_counter()
+        extract_layout(node=node, result=result, context=context)
+        layout_end = perf_counter()
+        extract_text(node=node, result=result, context=context)
+        text_end = perf_counter()
+        extract_visual(node=node, result=result, context=context)
+        visual_end = perf_counter()
+        extract_comp(node=node, result=result)
+        timings["layout"] += layout_end - start
+        timings["text"] += text_end - layout_end
+        timings["visual"] += visual_end - text_end
+        timings["comp"] += perf_counter() - visual_end
 
     if should_children(node=node, context=context, option=option):
         children_context = {
@@ -37,5 +62,104 @@ def extract_node(node: dict, context: dict, option: dict):
             children = [child for child in children if child is not None]
             if len(children) > 0:
                 result["children"] = children
+    elif option.get("compressComponents") and node.get("type") in ("INSTANCE", "COMPONENT") and node.get("children"):
+        result[TRUNCATED] = True
 
     return result
+
+
+def new_stats() -> Dict[str, Dict[str, float]]:
+    return {
+        # 各提取器累计耗时（秒）
+        "timings": {"layout": 0.0, "text": 0.0, "visual": 0.0, "comp": 0.0},
+        # 提取的节点数与 find_or_create_var 的比较次数
+        "counters": {"nodes": 0, "varComparisons": 0},
+    }
+
+
+def merge_stats(target: Dict[str, Dict[str, float]], source: Dict[str, Dict[str, float]]):
+    for group, values in source.items():
+        for key, value in values.items():
+            target[group][key] += value
+
+
+def extract_frames(nodes: List[dict], option: dict, depth: int = 0, parent: Optional[dict] = None) -> Tuple[List[dict], Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """
+    使用独立的 globalVars 提取一组相互独立的节点，可在进程池中执行；
+    返回的样式变量需通过 merge_global_vars 合并，option.collectStats 为真时返回提取统计（见 new_stats）
+    """
+    context: dict = {
+        "globalVars": {
+            "styles": {}
+        },
+        "currentDepth": depth,
+    }
+    if parent is not None:
+        context["parent"] = parent
+    stats = new_stats()
+    if option.get("collectStats"):
+        context["timings"] = stats["timings"]
+        context["counters"] = stats["counters"]
+    if option.get("batchConvert"):
+        context["geometry"] = prepare_batch(nodes)
+
+    results = [extract_node(node=node, context=context, option=option) for node in nodes if node.get("visible", True)]
+    return [node for node in results if node is not None], context["globalVars"], stats
+
+
+def extract_selected(entries: List[Tuple[dict, Optional[dict], int, int]], option: dict) -> Tuple[List[dict], Dict[str, Any], Dict[str, Dict[str, float]]]:
+    """
+    只提取选择器匹配的节点及其子树（entries 来自 NodeIndex.select），其余节点不做任何提取；
+    每个节点以原始父节点计算相对位置，深度沿用其在文档中的深度
+    """
+    context: dict = {
+        "globalVars": {
+            "styles": {}
+        },
+    }
+    stats = new_stats()
+    if option.get("collectStats"):
+        context["timings"] = stats["timings"]
+        context["counters"] = stats["counters"]
+
+    results = []
+    for node, parent, depth, _ in entries:
+        node_context = {**context, "currentDepth": depth}
+        if parent is not None:
+            node_context["parent"] = parent
+        results.append(extract_node(node=node, context=node_context, option=option))
+    return [node for node in results if node is not None], context["globalVars"], stats
+
+
+def rename_style_refs(nodes: List[dict], renames: Dict[str, str]):
+    for node in nodes:
+        for key in STYLE_REF_KEYS:
+            if key in node and node[key] in renames:
+                node[key] = renames[node[key]]
+        if "children" in node:
+            rename_style_refs(node["children"], renames)
+
+
+def merge_global_vars(target: Dict[str, Any], source: Dict[str, Any], nodes: List[dict]):
+    """
+    将 source 中的样式变量合并到 target：值相同的变量复用 target 中的 id，
+    id 冲突时重新生成，并同步改写 nodes 中的引用
+    """
+    styles = target.setdefault("styles", {})
+    index = {json.dumps(value, sort_keys=True): var_id for var_id, value in styles.items()}
+    renames: Dict[str, str] = {}
+
+    for var_id, value in source.get("styles", {}).items():
+        key = json.dumps(value, sort_keys=True)
+        merged_id = index.get(key)
+        if merged_id is None:
+            merged_id = var_id
+            while merged_id in styles:
+                merged_id = generate_var_id(var_id.rsplit("_", 1)[0])
+            styles[merged_id] = value
+            index[key] = merged_id
+        if merged_id != var_id:
+            renames[var_id] = merged_id
+
+    if renames:
+        rename_style_refs(nodes, renames)
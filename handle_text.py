@@ -41,4 +41,4 @@ def extract_text(node: dict, result: dict, context: dict):
 
     if has_text_style(node):
         text_style = extract_text_style(node)
-        result["textStyle"] = find_or_create_var(context.get("globalVars", {}), text_style, "style")
+        result["textStyle"] = find_or_create_var(context.get("globalVars", {}), text_style, "style", context.get("counters"))
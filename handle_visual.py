@@ -77,15 +77,15 @@ def extract_visual(node: dict, result: dict, context: dict):
 
     if has_value("fills", node) and isinstance(node.get("fills", []), list) and len(node.get("fills", [])) > 0:
         fills = [parse_paint(fill, has_children) for fill in node.get("fills", [])]
-        result["fills"] = find_or_create_var(context.get("globalVars", {}), fills, "fill")
+        result["fills"] = find_or_create_var(context.get("globalVars", {}), fills, "fill", context.get("counters"))
 
     strokes = build_stroke(node, has_children)
     if len(strokes.get("colors", [])) > 0:
-        result["strokes"] = find_or_create_var(context.get("globalVars", {}), strokes, "stroke")
+        result["strokes"] = find_or_create_var(context.get("globalVars", {}), strokes, "stroke", context.get("counters"))
 
     effects = build_effect(node)
     if len(effects) > 0:
-        result["effects"] = find_or_create_var(context.get("globalVars", {}), effects, "effect")
+        result["effects"] = find_or_create_var(context.get("globalVars", {}), effects, "effect", context.get("counters"))
 
     if has_value("opacity", node) and isinstance(node.get("opacity", 1), (int, float)) and node.get("opacity", 1) != 1:
         result["opacity"] = node.get("opacity", 1)
@@ -0,0 +1,118 @@
+import math
+import threading
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+# 样本不足时各类接口的超时（秒）：整文件响应可能有几十 MB，/me 与版本检查应很快返回
+DEFAULT_TIMEOUTS = {"me": 5.0, "version": 10.0, "files": 60.0, "nodes": 30.0, "images": 30.0, "image_fills": 15.0}
+MIN_TIMEOUT = 2.0
+MAX_TIMEOUT = 120.0
+# 计算百分位数所需的最少样本数与保留的最近样本数
+MIN_SAMPLES = 20
+WINDOW = 200
+# 只有大于该字节数的响应用于估算吞吐
+THROUGHPUT_MIN_BYTES = 64 * 1024
+# 最近请求中超时的比例超过该值时，超时时间不低于该类的默认值
+TIMEOUT_RATIO = 0.05
+# 对冲请求数不超过该类请求总数的比例，避免慢响应时请求数翻倍
+HEDGE_RATIO = 0.1
+# 记录最近响应大小的地址数
+SIZE_ENTRIES = 1024
+
+
+def endpoint_class(endpoint: str) -> str:
+    """
+    按路径归类 Figma API 地址：me、version（depth=1 的文件请求）、files、nodes、image_fills（/files/:key/images）、images（渲染）
+    """
+    url = urlparse(endpoint)
+    parts = [part for part in url.path.split("/") if part]
+    if len(parts) >= 2 and parts[-2] == "images":
+        return "images"
+    if parts[-1:] == ["me"]:
+        return "me"
+    if parts[-1:] == ["nodes"]:
+        return "nodes"
+    if parts[-1:] == ["images"]:
+        return "image_fills"
+    if parse_qs(url.query).get("depth") == ["1"]:
+        return "version"
+    return "files"
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))]
+
+
+class LatencyTracker:
+    """
+    按接口类别记录最近的耗时与响应大小，据此计算超时时间与对冲请求的等待时间；超时的请求没有实际耗时，
+    不计入耗时样本，只记录在最近的请求结果中
+    """
+
+    def __init__(self, window: int = WINDOW):
+        self.window = window
+        self.samples: Dict[str, Deque[Tuple[float, int]]] = {}
+        self.sizes: "OrderedDict[str, int]" = OrderedDict()
+        self.requests: Dict[str, int] = {}
+        self.hedges: Dict[str, int] = {}
+        self.outcomes: Dict[str, Deque[bool]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, endpoint_cls: str, endpoint: str, seconds: float, size: Optional[int] = None):
+        with self.lock:
+            self.samples.setdefault(endpoint_cls, deque(maxlen=self.window)).append((seconds, size or 0))
+            self.outcomes.setdefault(endpoint_cls, deque(maxlen=self.window)).append(False)
+            self.requests[endpoint_cls] = self.requests.get(endpoint_cls, 0) + 1
+            if size:
+                self.sizes[endpoint] = size
+                self.sizes.move_to_end(endpoint)
+                while len(self.sizes) > SIZE_ENTRIES:
+                    self.sizes.popitem(last=False)
+
+    def observe_timeout(self, endpoint_cls: str):
+        with self.lock:
+            self.outcomes.setdefault(endpoint_cls, deque(maxlen=self.window)).append(True)
+            self.requests[endpoint_cls] = self.requests.get(endpoint_cls, 0) + 1
+
+    def timeout(self, endpoint_cls: str, endpoint: str) -> float:
+        """
+        p99 耗时的 3 倍；同一地址上次响应较大时，再按最慢 10% 的吞吐估算传输时间，取两者较大值。
+        最近超时较多时说明耗时样本偏小，不低于默认值，但不会因超时而继续增长
+        """
+        default = DEFAULT_TIMEOUTS.get(endpoint_cls, 30.0)
+        with self.lock:
+            samples = list(self.samples.get(endpoint_cls, ()))
+            outcomes = self.outcomes.get(endpoint_cls, ())
+            timeouts = sum(outcomes)
+            total = len(outcomes)
+            expected_size = self.sizes.get(endpoint)
+        if len(samples) < MIN_SAMPLES:
+            return default
+        latencies = [seconds for seconds, _ in samples]
+        timeout = percentile(latencies, 0.99) * 3
+        throughputs = [size / seconds for seconds, size in samples if size >= THROUGHPUT_MIN_BYTES and seconds > 0]
+        if expected_size and len(throughputs) >= 5:
+            timeout = max(timeout, percentile(latencies, 0.5) + expected_size / percentile(throughputs, 0.1) * 2)
+        if timeouts > total * TIMEOUT_RATIO:
+            timeout = max(timeout, default)
+        return min(max(timeout, MIN_TIMEOUT), MAX_TIMEOUT)
+
+    def hedge_delay(self, endpoint_cls: str) -> Optional[float]:
+        with self.lock:
+            samples = list(self.samples.get(endpoint_cls, ()))
+        if len(samples) < MIN_SAMPLES:
+            return None
+        return percentile([seconds for seconds, _ in samples], 0.95)
+
+    def allow_hedge(self, endpoint_cls: str) -> bool:
+        with self.lock:
+            hedges = self.hedges.get(endpoint_cls, 0)
+            if hedges + 1 > self.requests.get(endpoint_cls, 0) * HEDGE_RATIO:
+                return False
+            self.hedges[endpoint_cls] = hedges + 1
+            return True
+
+
+LATENCY = LatencyTracker()
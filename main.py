@@ -1,52 +1,216 @@
 from mcp.server.fastmcp import FastMCP
 from starlette.requests import Request
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse, Response
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Literal, Any, Union
+from typing import Awaitable, Optional, List, Dict, Literal, Any, Union
 import httpx
 import os
 import asyncio
-from handle_node import extract_node
-from handle_image import filter_valid_images, build_svg_query_params, download_and_process_image
+import functools
+import hmac
+import time
+import uuid
+import zlib
+import math
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from handle_node import extract_node, extract_frames, extract_selected, merge_global_vars, should_children, new_stats, merge_stats
+from selector import IndexCache, Selector, document_index
+from spatial import RegionMode, SpatialIndex
+from search import TEXT_INDEX
+from handle_comp import TRUNCATED, compress_components
+from encoding import OutputFormat, encode_design
+from fast_json import dumps, loads
+from config import (
+    ADMIN_TOKEN, BATCH_CONVERT, EXTRACT_WORKERS, FIGMA_API_BASE, HEDGE_REQUESTS, MCP_PORT, MCP_WORKERS, PREFETCH_CONCURRENCY,
+    SVG_DEDUP, WEBHOOK_PASSCODE, WEBHOOK_REFRESH,
+)
+from cache import Cache, CacheEntry, DESIGN_CACHE, FILE_CACHE, IMAGE_URL_CACHE, REVALIDATOR, TOKEN_CACHE, file_generation, hash_key, invalidate_file
+from profiling import PROFILE_FORMATS, add_counters, profile_link, profile_path, profile_request, profiled, profiling_active, stage
+from metrics import CACHE_REQUESTS, EXTRACTOR_SECONDS, HEDGES, SVG_RENDERS, TOOL_ERRORS, UPSTREAM_TIMEOUT, WEBHOOK_EVENTS, metrics_scraped, track_tool, render_metrics
+from latency import LATENCY, endpoint_class
+from handle_image import (
+    filter_valid_images, build_svg_query_params, crop_image_bytes, download_and_process_image, describe_variant, download_deduplicated,
+    geometry_hash, stream_figma_image, VariantFormat,
+)
+from archive import ArchiveEntry, stream_zip
+from docstore import DOC_STORE, document_version
+from admission import (
+    ADMISSION, PRIORITY_BACKGROUND, PRIORITY_EXPORT, PRIORITY_FILE, PRIORITY_IMAGES, PRIORITY_NODE, AdmittedStreamingResponse, Cost,
+    Overloaded, design_cost, image_cost,
+)
+
+
+# 可以安全地重复发送的接口类别
+HEDGE_CLASSES = ("nodes", "images", "image_fills")
 
 
 class FigmaClient:
     def __init__(self, token: str):
-        self.base = "https://api.figma.com/v1"
+        self.base = FIGMA_API_BASE
         self.head = {
             "X-Figma-Token": token
         }
+        # 缓存键使用 token 的哈希，不同 token 的文件响应互不共享
+        self.token_key = hash_key(token)
 
     async def validate(self) -> bool:
+        if await TOKEN_CACHE.get(self.token_key) is not None:
+            return True
         try:
-            async with httpx.AsyncClient(timeout=5) as client:
-                response = await client.get(f"{self.base}/me", headers=self.head)
-                return response.status_code == 200
+            with stage("validate"):
+                await self.send(f"{self.base}/me", "me")
         except httpx.HTTPError:
             return False
+        await TOKEN_CACHE.set(self.token_key, b"1")
+        return True
+
+    async def send(self, endpoint: str, endpoint_cls: str) -> bytes:
+        """
+        超时时间按该类接口最近的耗时与响应大小计算（见 latency.LatencyTracker）；超时不作为耗时样本，
+        超时较多时该类接口的超时时间回到默认值
+        """
+        timeout = LATENCY.timeout(endpoint_cls, endpoint)
+        UPSTREAM_TIMEOUT.set(timeout, endpoint=endpoint_cls)
+        start = time.perf_counter()
+        try:
+            async with httpx.AsyncClient(timeout=httpx.Timeout(timeout, connect=min(timeout, 5))) as client:
+                response = await asyncio.wait_for(client.get(endpoint, headers=self.head), timeout)
+        except (asyncio.TimeoutError, httpx.TimeoutException) as e:
+            LATENCY.observe_timeout(endpoint_cls)
+            raise httpx.TimeoutException(f"{endpoint_cls} request timed out after {timeout:.1f}s") from e
+        response.raise_for_status()
+        LATENCY.observe(endpoint_cls, endpoint, time.perf_counter() - start, len(response.content))
+        return response.content
+
+    async def fetch(self, endpoint: str, stage_name: str = "fetch") -> bytes:
+        """
+        幂等的 /nodes、/images 请求在开启 FIGMA_HEDGE_REQUESTS 时，超过该类请求的 p95 耗时仍未返回则再发送一次，
+        先成功的结果生效；对冲请求数不超过该类请求的 10%
+        """
+        endpoint_cls = endpoint_class(endpoint)
+        with stage(stage_name, endpoint=endpoint):
+            delay = LATENCY.hedge_delay(endpoint_cls) if HEDGE_REQUESTS and endpoint_cls in HEDGE_CLASSES else None
+            if delay is None:
+                return await self.send(endpoint, endpoint_cls)
+
+            first = asyncio.ensure_future(self.send(endpoint, endpoint_cls))
+            done, _ = await asyncio.wait({first}, timeout=delay)
+            if done or not LATENCY.allow_hedge(endpoint_cls):
+                return await first
+            HEDGES.inc(endpoint=endpoint_cls)
+            second = asyncio.ensure_future(self.send(endpoint, endpoint_cls))
+            try:
+                pending = {first, second}
+                while pending:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        if task.exception() is None:
+                            return task.result()
+                # 两次都失败时抛出第一个请求的异常
+                return first.result()
+            finally:
+                first.cancel()
+                second.cancel()
+
+    async def request_json(self, endpoint: str, stage_name: str = "fetch", cache: Optional[Cache] = None,
+                           file_key: Optional[str] = None, refresh: bool = False) -> Any:
+        """
+        cache 与 file_key 同时提供时，已过期但未超过最长保留时间的响应直接返回，并在后台按文件版本重新验证；
+        refresh 为真时跳过缓存读取
+        """
+        # 带 file_key 的缓存键包含文件代数，webhook 使其失效（见 invalidate_file）
+        generation = await file_generation(file_key) if cache is not None and file_key else ""
+        cache_key = f"{self.token_key}:{generation}:{endpoint}"
+        entry = await cache.get_entry(cache_key) if cache is not None and not refresh else None
+        if entry is not None and (entry.fresh or file_key):
+            if not entry.fresh:
+                REVALIDATOR.schedule(cache, cache_key, lambda: self.revalidate(cache, cache_key, endpoint, file_key, entry))
+            ADMISSION.record_size(endpoint, len(entry.value))
+            with stage("decode"):
+                return loads(entry.value)
+
+        content = await self.fetch(endpoint, stage_name)
+        ADMISSION.record_size(endpoint, len(content))
+        with stage("decode"):
+            result = loads(content)
+        if cache is not None:
+            await cache.set(cache_key, content, str(result.get("version", "")) if isinstance(result, dict) else "")
+        return result
+
+    async def get_version(self, file_key: str) -> str:
+        # depth=1 只返回页面列表，用于低成本地判断文件是否有变化
+        result = await self.request_json(f"{self.base}/files/{file_key}?depth=1", stage_name="version_check")
+        return str(result.get("version") or result.get("lastModified") or "")
+
+    async def revalidate(self, cache: Cache, cache_key: str, endpoint: str, file_key: str, entry: CacheEntry) -> bool:
+        version = await self.get_version(file_key)
+        if version and version == entry.version:
+            await cache.set(cache_key, entry.value, version)
+            return False
+        await self.request_json(endpoint, cache=cache, file_key=file_key, refresh=True)
+        return True
+
+    def design_endpoint(self, file_key: str, node_id: str = "", depth: Optional[int] = None) -> str:
+        if node_id:
+            query = f"&depth={depth}" if depth else ""
+            return f"{self.base}/files/{file_key}/nodes?ids={node_id}{query}"
+        query = f"?depth={depth}" if depth else ""
+        return f"{self.base}/files/{file_key}{query}"
+
+    def design_cost(self, file_key: str, node_id: str = "", depth: Optional[int] = None) -> Cost:
+        return design_cost(ADMISSION.expected_size(self.design_endpoint(file_key, node_id, depth)), bool(node_id), depth)
 
-    async def get_node(self, file_key: str, node_id: str, depth: Optional[int] = None) -> dict:
-        query = f"&depth={depth}" if depth else ""
-        endpoint = f"{self.base}/files/{file_key}/nodes?ids={node_id}{query}"
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get(endpoint, headers=self.head)
-            response.raise_for_status()
-            return response.json()
-
-    async def get_file(self, file_key: str, depth: Optional[int] = None) -> dict:
-        query = f"&depth={depth}" if depth else ""
-        endpoint = f"{self.base}/files/{file_key}{query}"
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get(endpoint, headers=self.head)
-            response.raise_for_status()
-            return response.json()
+    async def load_stored(self, file_key: str, node_id: str = "", depth: Optional[int] = None) -> Optional[dict]:
+        """
+        从持久化存储（见 docstore.DocumentStore）读取文件或节点响应：本进程在 FILE_CACHE 有效期内未确认过时，
+        先用 depth=1 请求确认文件版本未变；指定节点时只解压、解析该节点的子树
+        """
+        document = await asyncio.to_thread(DOC_STORE.open, self.token_key, file_key)
+        if document is not None and not document.confirmed(FILE_CACHE.ttl):
+            if await self.get_version(file_key) == document.version:
+                document.checked_at = time.time()
+            else:
+                document = None
+        result = None
+        if document is not None:
+            try:
+                with stage("docstore", file_key=file_key):
+                    if node_id:
+                        result = await asyncio.to_thread(document.nodes_response, node_id.split(","), depth)
+                    else:
+                        result = await asyncio.to_thread(document.file_response, depth)
+            except (zlib.error, ValueError):
+                # 打开时只校验了文件头、元数据与索引，数据块损坏时删除该文件并改为从网络获取
+                await asyncio.to_thread(DOC_STORE.discard, document)
+                result = None
+        CACHE_REQUESTS.inc(cache="docstore", result="miss" if result is None else "hit")
+        return result
+
+    async def get_node(self, file_key: str, node_id: str, depth: Optional[int] = None, refresh: bool = False) -> dict:
+        result = await self.load_stored(file_key, node_id, depth) if DOC_STORE.enabled and not refresh else None
+        if result is None:
+            endpoint = self.design_endpoint(file_key, node_id, depth)
+            result = await self.request_json(endpoint, cache=FILE_CACHE, file_key=file_key, refresh=refresh)
+        index_text(self, file_key, result, depth)
+        return result
+
+    async def get_file(self, file_key: str, depth: Optional[int] = None, refresh: bool = False) -> dict:
+        result = await self.load_stored(file_key, depth=depth) if DOC_STORE.enabled and not refresh else None
+        if result is None:
+            endpoint = self.design_endpoint(file_key, depth=depth)
+            result = await self.request_json(endpoint, cache=FILE_CACHE, file_key=file_key, refresh=refresh)
+            if depth is None:
+                store_document(self, file_key, result)
+        # 文件响应的 depth 从文档根算起，索引单位（页面）的深度少一层
+        index_text(self, file_key, result, depth - 1 if depth else None)
+        return result
 
     async def get_image(self, file_key: str):
         endpoint = f"{self.base}/files/{file_key}/images"
-        async with httpx.AsyncClient(timeout=5) as client:
-            response = await client.get(endpoint, headers=self.head)
-            response.raise_for_status()
-            res = response.json()
-            return res.get("meta", {}).get("images", {})
+        res = await self.request_json(endpoint, stage_name="image_urls", cache=IMAGE_URL_CACHE, file_key=file_key)
+        return res.get("meta", {}).get("images", {})
 
     async def get_node_render_urls(self, file_key: str, node_ids: list[str],  img_format: Literal["png", "svg"], options: Optional[Dict[str, Any]] = None):
         if not node_ids:
@@ -57,10 +221,6 @@ class FigmaClient:
         if img_format == "png":
             scale = options.get("pngScale", 2) or 2
             endpoint = f"{self.base}/images/{file_key}?ids={','.join(node_ids)}&format=png&scale={scale}"
-            async with httpx.AsyncClient(timeout=5) as client:
-                response = await client.get(endpoint, headers=self.head)
-                response.raise_for_status()
-                return filter_valid_images(response.json().get("images", {}))
         else:
             def_option = {
                 "outlineText": True,
@@ -70,10 +230,8 @@ class FigmaClient:
             svg_options = options.get("svgOptions", def_option) or def_option
             params = build_svg_query_params(svg_ids=node_ids, svg_options=svg_options)
             endpoint = f"{self.base}/images/{file_key}?{params}"
-            async with httpx.AsyncClient(timeout=5) as client:
-                response = await client.get(endpoint, headers=self.head)
-                response.raise_for_status()
-                return filter_valid_images(response.json().get("images", {}))
+        res = await self.request_json(endpoint, stage_name="image_urls")
+        return filter_valid_images(res.get("images", {}))
 
     async def download_images(self, file_key: str, local_path: str, items: List[Dict[str, Any]], options: Dict[str, Any] = None):
         if not items:
@@ -81,12 +239,14 @@ class FigmaClient:
 
         png_scale = options.get("pngScale", 2) if options else 2
         svg_options = options.get("svgOptions") if options else None
+        variants = options.get("variants") if options else None
         download_tasks = []
         # 按类型分组
         image_fills = [item for item in items if item.get("imageRef")]
         render_nodes = [item for item in items if item.get("nodeId")]
-        # 下载 image fills
+        # 下载 image fills：按原图分辨率下载，与 png_scale 无关，不输出尺寸变体
         if image_fills:
+            fill_variants = {**variants, "scales": []} if variants and variants.get("formats") else None
             fill_urls = await self.get_image(file_key)
             fill_downloads = [
                 download_and_process_image(
@@ -96,6 +256,7 @@ class FigmaClient:
                     item.get("needsCropping", False),
                     item.get("cropTransform"),
                     item.get("requiresImageDimensions", False),
+                    fill_variants,
                 )
                 for item in image_fills if fill_urls.get(item["imageRef"])
             ]
@@ -114,6 +275,7 @@ class FigmaClient:
                     "png",
                     {"pngScale": png_scale},
                 )
+                png_variants = {**variants, "baseScale": float(png_scale or 2)} if variants else None
                 png_downloads = [
                     download_and_process_image(
                         n["fileName"],
@@ -122,37 +284,107 @@ class FigmaClient:
                         n.get("needsCropping", False),
                         n.get("cropTransform"),
                         n.get("requiresImageDimensions", False),
+                        png_variants,
                     )
                     for n in png_nodes if png_urls.get(n["nodeId"])
                 ]
                 if png_downloads:
                     download_tasks.append(asyncio.gather(*png_downloads))
 
-            # SVG 渲染
+            # SVG 渲染：几何相同的节点只渲染第一个
             if svg_nodes:
+                svg_groups = await self.group_svg_nodes(file_key, svg_nodes, svg_options)
                 svg_urls = await self.get_node_render_urls(
                     file_key,
-                    [n["nodeId"] for n in svg_nodes],
+                    [group[0]["nodeId"] for group in svg_groups],
                     "svg",
                     {"svgOptions": svg_options},
                 )
+                SVG_RENDERS.inc(len(svg_groups), result="rendered")
+                SVG_RENDERS.inc(len(svg_nodes) - len(svg_groups), result="deduplicated")
+                svg_groups = [group for group in svg_groups if svg_urls.get(group[0]["nodeId"])]
                 svg_downloads = [
-                    download_and_process_image(
-                        n["fileName"],
-                        local_path,
-                        svg_urls.get(n["nodeId"]),
-                        n.get("needsCropping", False),
-                        n.get("cropTransform"),
-                        n.get("requiresImageDimensions", False),
-                    )
-                    for n in svg_nodes if svg_urls.get(n["nodeId"])
+                    download_deduplicated(group, local_path, svg_urls.get(group[0]["nodeId"]))
+                    for group in svg_groups
                 ]
                 if svg_downloads:
-                    download_tasks.append(asyncio.gather(*svg_downloads))
+                    download_tasks.append(ungroup(svg_nodes, svg_groups, asyncio.gather(*svg_downloads)))
 
         results_nested = await asyncio.gather(*download_tasks)
         return [item for sublist in results_nested for item in sublist]
 
+    async def group_svg_nodes(self, file_key: str, svg_nodes: List[Dict[str, Any]], svg_options: Optional[Dict[str, bool]]) -> List[List[Dict[str, Any]]]:
+        """
+        按节点几何与样式的哈希分组（见 geometry_hash）；包含节点 id 的 SVG 各不相同，此时不分组
+        """
+        groups: Dict[str, List[Dict[str, Any]]] = {}
+        if not SVG_DEDUP or len(svg_nodes) < 2 or (svg_options or {}).get("includeId"):
+            for n in svg_nodes:
+                groups.setdefault(n["nodeId"], []).append(n)
+            return list(groups.values())
+
+        node_ids = ",".join(dict.fromkeys(n["nodeId"] for n in svg_nodes))
+        try:
+            res = await self.request_json(f"{self.base}/files/{file_key}/nodes?ids={node_ids}&geometry=paths",
+                                          stage_name="geometry", cache=FILE_CACHE, file_key=file_key)
+            documents = res.get("nodes") or {}
+        except httpx.HTTPError:
+            documents = {}
+        for n in svg_nodes:
+            document = (documents.get(n["nodeId"]) or {}).get("document")
+            groups.setdefault(geometry_hash(document) if document else n["nodeId"], []).append(n)
+        return list(groups.values())
+
+
+async def ungroup(items: List[Dict[str, Any]], groups: List[List[Dict[str, Any]]], results: Awaitable[List[List[Any]]]) -> List[Any]:
+    """
+    把按组下载的结果恢复为 items 中的顺序
+    """
+    by_item = {id(item): result for group, group_results in zip(groups, await results) for item, result in zip(group, group_results)}
+    return [by_item[id(item)] for item in items if id(item) in by_item]
+
+
+text_index_tasks: Dict[tuple, asyncio.Task] = {}
+
+
+def index_text(client: FigmaClient, file_key: str, result: dict, depth: Optional[int] = None):
+    """
+    获取到的文件/节点响应在后台线程中加入全文索引；depth 为相对根节点（页面或请求的节点）的深度，None 为完整子树。
+    同一版本只索引一次，更深的响应替换较浅的
+    """
+    if "nodes" in result:
+        documents = [node for node in (result.get("nodes") or {}).values() if node]
+        roots = [node.get("document") or {} for node in documents]
+        components = {key: value for node in documents for key, value in (node.get("components") or {}).items()}
+    else:
+        roots = (result.get("document") or {}).get("children", [])
+        components = result.get("components") or {}
+    roots = [root for root in roots if root.get("visible", True)]
+    version = str(result.get("version") or result.get("lastModified") or "")
+    task_key = (client.token_key, file_key, version, depth, tuple(root.get("id", "") for root in roots))
+    if not roots or task_key in text_index_tasks or TEXT_INDEX.indexed(client.token_key, file_key, version, list(task_key[4]), depth):
+        return
+    task = asyncio.create_task(asyncio.to_thread(TEXT_INDEX.add, client.token_key, file_key, version, roots, components, depth))
+    text_index_tasks[task_key] = task
+    task.add_done_callback(lambda _: text_index_tasks.pop(task_key, None))
+
+
+doc_store_tasks: Dict[tuple, asyncio.Task] = {}
+
+
+def store_document(client: FigmaClient, file_key: str, result: dict):
+    """
+    完整文件响应在后台线程中写入持久化存储，同一版本只写一次
+    """
+    if not DOC_STORE.enabled or "document" not in result:
+        return
+    task_key = (client.token_key, file_key, document_version(result))
+    if task_key in doc_store_tasks:
+        return
+    task = asyncio.create_task(asyncio.to_thread(DOC_STORE.write, client.token_key, file_key, result))
+    doc_store_tasks[task_key] = task
+    task.add_done_callback(lambda _: doc_store_tasks.pop(task_key, None))
+
 
 async def get_figma(request: Request) -> FigmaClient:
     query_params = request.query_params if request else {}
@@ -171,14 +403,92 @@ async def get_figma(request: Request) -> FigmaClient:
 
 class FigmaMCP(FastMCP):
     async def list_tools(self):
-        request: Request = self.session_manager.app.request_context.request
-        await get_figma(request=request)
+        with track_tool("list_tools"):
+            request: Request = self.session_manager.app.request_context.request
+            await get_figma(request=request)
 
-        return await super().list_tools()
+            return await super().list_tools()
 
 
 # Init
-mcp = FigmaMCP("figma", stateless_http=True, host="0.0.0.0", port=10081)
+mcp = FigmaMCP("figma", stateless_http=True, host="0.0.0.0", port=MCP_PORT)
+
+
+extract_pool: Optional[ProcessPoolExecutor] = None
+extract_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> Optional[ProcessPoolExecutor]:
+    global extract_pool
+    if EXTRACT_WORKERS <= 1:
+        return None
+    with extract_pool_lock:
+        if extract_pool is None:
+            # spawn 避免在已有事件循环和线程的进程中 fork
+            extract_pool = ProcessPoolExecutor(max_workers=EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+    return extract_pool
+
+
+def extract_parallel(parse: List[dict], option: dict, pool: ProcessPoolExecutor):
+    """
+    将顶层节点的子节点按连续分块分发到进程池提取，顶层节点本身在当前进程提取，
+    最后把各进程的样式变量合并为一份 globalVars
+    """
+    context = {
+        "globalVars": {
+            "styles": {}
+        },
+        "currentDepth": 0,
+    }
+    stats = new_stats()
+    if option.get("collectStats"):
+        context["timings"] = stats["timings"]
+        context["counters"] = stats["counters"]
+    tops = [node for node in parse if node.get("visible", True)]
+    owners: List[Optional[dict]] = []
+    units = []
+    for top in tops:
+        children = top.get("children", [])
+        visible = [c for c in children if c.get("visible", True)] if isinstance(children, list) else []
+        if visible and should_children(node=top, context=context, option=option):
+            # 顶层节点只提取自身，子节点交给进程池；父节点去掉 children 以减少序列化开销
+            owner = extract_node(node=top, context=context, option={**option, "maxDepth": 0})
+            # 子节点由进程池提取，不是被 maxDepth 截断
+            owner.pop(TRUNCATED, None)
+            owner["children"] = []
+            parent = {key: value for key, value in top.items() if key != "children"}
+            units.extend((owner, child, parent) for child in visible)
+        else:
+            owner = None
+            units.append((None, top, None))
+        owners.append(owner)
+
+    size = max(1, math.ceil(len(units) / (EXTRACT_WORKERS * 4)))
+    chunks = []
+    for owner, node, parent in units:
+        chunk = chunks[-1] if chunks else None
+        if chunk is None or chunk["owner"] is not owner or len(chunk["nodes"]) >= size:
+            chunk = {"owner": owner, "parent": parent, "nodes": []}
+            chunks.append(chunk)
+        chunk["nodes"].append(node)
+
+    futures = [
+        pool.submit(extract_frames, chunk["nodes"], option, 1 if chunk["owner"] is not None else 0, chunk["parent"])
+        for chunk in chunks
+    ]
+    loose: List[dict] = []
+    for chunk, future in zip(chunks, futures):
+        nodes, global_vars, chunk_stats = future.result()
+        merge_global_vars(context["globalVars"], global_vars, nodes)
+        merge_stats(stats, chunk_stats)
+        if chunk["owner"] is not None:
+            chunk["owner"]["children"].extend(nodes)
+        else:
+            loose.extend(nodes)
+
+    # 按原始顺序组装：被拆分的顶层节点使用其自身结果，其余节点按顺序取自 loose
+    rest = iter(loose)
+    return [owner if owner is not None else next(rest) for owner in owners], context["globalVars"], stats
 
 
 def parse_node(result: dict, option: dict):
@@ -200,7 +510,7 @@ def parse_node(result: dict, option: dict):
             component.update(result.get("components", {}))
         if "componentSets" in result:
             component_set.update(result.get("componentSets", {}))
-        if "document" in result and "children" in result.get("document", {}).get("children", []):
+        if "document" in result and "children" in result.get("document", {}):
             parse = [n for n in result.get("document", {}).get("children", []) if not n.get("visible", True) is False]
 
     simplify_component = {
@@ -217,54 +527,262 @@ def parse_node(result: dict, option: dict):
             "key": comp.get("key", ""),
             "name": comp.get("name", ""),
             "description": comp.get("description", ""),
-        } for comp_id, comp in component.items()
+        } for comp_id, comp in component_set.items()
     }
 
-    context = {
-        "globalVars": {
-            "styles": {}
-        },
-        "currentDepth": 0,
-    }
+    selector: Optional[Selector] = option.get("selector")
+    pool = get_extract_pool()
+    if selector is not None:
+        index = document_index(parse, option.get("maxDepth"), option.get("indexKey"))
+        extract_nodes, global_vars, stats = extract_selected(index.select(selector), option)
+    elif pool is not None:
+        extract_nodes, global_vars, stats = extract_parallel(parse, option, pool)
+    else:
+        extract_nodes, global_vars, stats = extract_frames(parse, option)
+    if option.get("collectStats"):
+        for extractor, seconds in stats["timings"].items():
+            EXTRACTOR_SECONDS.observe(seconds, extractor=extractor)
+        add_counters(
+            **stats["counters"],
+            **{f"{extractor}Seconds": seconds for extractor, seconds in stats["timings"].items()},
+            styles=len(global_vars.get("styles", {})),
+        )
 
-    extract_nodes = [extract_node(node=node, context=context, option=option) for node in parse if node.get("visible", True)]
-    extract_nodes = [node for node in extract_nodes if node is not None]
+    if option.get("compressComponents"):
+        compress_components(extract_nodes, global_vars)
+
+    metadata = {
+        "name": result.get("name", ""),
+        "lastModified": result.get("lastModified", ""),
+        "thumbnailUrl": result.get("thumbnailUrl", ""),
+        "components": simplify_component,
+        "componentSets": simplify_component_set,
+    }
+    if selector is not None:
+        metadata["selector"] = {"query": selector.query, "matches": len(extract_nodes)}
 
     return {
-        "metadata": {
-            "name": result.get("name", ""),
-            "lastModified": result.get("lastModified", ""),
-            "thumbnailUrl": result.get("thumbnailUrl", ""),
-            "components": simplify_component,
-            "componentSets": simplify_component_set,
-        },
+        "metadata": metadata,
         "nodes": extract_nodes,
-        "globalVars": context["globalVars"],
+        "globalVars": global_vars,
     }
 
 
 
-@mcp.tool()
-async def get_figma_data(file_key: str, node_id: str, depth: Optional[int] = None) -> dict:
+recent_designs: Dict[str, Dict[tuple, tuple]] = {}
+RECENT_DESIGN_FILES = 256
+RECENT_DESIGNS_PER_FILE = 32
+
+
+def remember_design(client: FigmaClient, file_key: str, node_id: str, depth: Optional[int], compress_components: bool,
+                    selector: Optional[str] = None):
+    """
+    记录本进程最近请求过的设计数据，收到 webhook 时用于主动刷新
+    """
+    designs = recent_designs.pop(file_key, {})
+    designs.pop((client.token_key, node_id, depth, compress_components, selector), None)
+    designs[(client.token_key, node_id, depth, compress_components, selector)] = (client, node_id, depth, compress_components, selector)
+    while len(designs) > RECENT_DESIGNS_PER_FILE:
+        designs.pop(next(iter(designs)))
+    recent_designs[file_key] = designs
+    while len(recent_designs) > RECENT_DESIGN_FILES:
+        recent_designs.pop(next(iter(recent_designs)))
+
+
+def design_cache_key(client: FigmaClient, generation: str, file_key: str, node_id: str, depth: Optional[int], compress_components: bool,
+                     selector: Optional[str] = None) -> str:
+    key = f"{client.token_key}:{generation}:{file_key}:{node_id or ''}:{depth or ''}:{int(compress_components)}"
+    return f"{key}:{selector}" if selector else key
+
+
+async def load_design(client: FigmaClient, file_key: str, node_id: str, depth: Optional[int], compress_components: bool,
+                      refresh: bool = False, selector: Optional[str] = None, priority: Optional[int] = None) -> dict:
+    """
+    获取并解析设计数据，DESIGN_CACHE 启用时缓存 parse_node 的输出；过期条目先返回旧数据并在后台重新验证；
+    selector 非空时只提取匹配的节点（见 selector.Selector）；缓存未命中时获取与提取经过准入控制，
+    priority 默认按是否指定 node_id 决定
+    """
+    node_selector = Selector(selector) if selector else None
+    generation = await file_generation(file_key)
+    if not DESIGN_CACHE.enabled:
+        cache_key = ""
+    else:
+        cache_key = design_cache_key(client, generation, file_key, node_id, depth, compress_components, selector)
+        if WEBHOOK_REFRESH:
+            remember_design(client, file_key, node_id, depth, compress_components, selector)
+    entry = await DESIGN_CACHE.get_entry(cache_key) if cache_key and not refresh else None
+    if entry is not None:
+        if not entry.fresh:
+            REVALIDATOR.schedule(DESIGN_CACHE, cache_key, lambda: revalidate_design(
+                client, cache_key, entry, file_key, node_id, depth, compress_components, selector,
+            ))
+        with stage("decode"):
+            return loads(entry.value)
+
+    if priority is None:
+        priority = PRIORITY_NODE if node_id else PRIORITY_FILE
+    # 原始文档与提取结果同时在内存中的阶段按估算的占用排队
+    cost = client.design_cost(file_key, node_id, depth)
+    async with ADMISSION.memory_stage("get_figma_data", cost, priority):
+        if node_id:
+            res = await client.get_node(file_key=file_key, node_id=node_id, depth=depth, refresh=refresh)
+        else:
+            res = await client.get_file(file_key=file_key, depth=depth, refresh=refresh)
+
+        # 提取为 CPU 密集操作，放到线程中执行以免阻塞事件循环上的其他会话
+        option = {
+            "maxDepth": depth,
+            "compressComponents": compress_components,
+            "batchConvert": BATCH_CONVERT,
+            # 各提取器逐节点计时有额外开销，只在开启 profile 或 /metrics 正在被抓取时记录
+            "collectStats": profiling_active() or metrics_scraped(),
+        }
+        if node_selector is not None:
+            option["selector"] = node_selector
+            # 同一版本的文档重复查询时复用节点索引
+            if res.get("version"):
+                option["indexKey"] = f"{client.token_key}:{generation}:{file_key}:{node_id or ''}:{depth or ''}:{res['version']}"
+        async with ADMISSION.cpu_stage("get_figma_data", cost):
+            with stage("extract"):
+                design = await asyncio.to_thread(profiled, parse_node, res, option)
+        version = str(res.get("version", ""))
+    if DESIGN_CACHE.enabled:
+        await DESIGN_CACHE.set(cache_key, dumps(design).encode("utf-8"), version)
+    return design
+
+
+async def revalidate_design(client: FigmaClient, cache_key: str, entry: CacheEntry, file_key: str, node_id: str,
+                            depth: Optional[int], compress_components: bool, selector: Optional[str] = None) -> bool:
+    version = await client.get_version(file_key)
+    if version and version == entry.version:
+        await DESIGN_CACHE.set(cache_key, entry.value, version)
+        return False
+    await load_design(client, file_key, node_id, depth, compress_components, refresh=True, selector=selector,
+                      priority=PRIORITY_BACKGROUND)
+    return True
+
+
+@mcp.tool(structured_output=False)
+async def get_figma_data(
+    file_key: str,
+    node_id: str,
+    depth: Optional[int] = None,
+    compress_components: bool = False,
+    output_format: OutputFormat = "json",
+    selector: Optional[str] = None,
+) -> Union[str, List[str]]:
     """获取全面的 Figma 文件数据，包括布局、内容、视觉效果和组件信息
 
     :arg:
         file_key: 要获取的 Figma 文件的键，通常位于提供的 URL 中，例如 figma.com/(file|design)/<file_key>/...
         node_id: 要获取的节点 ID，通常位于 URL 参数 node-id=<node_id> 中，如果提供则始终使用
         depth: 控制遍历节点树的层级深度；可选，默认为 None，除非用户明确指定
+        compress_components: 是否启用组件压缩；启用后主组件子树只在 globalVars.components 中输出一次，实例仅包含 componentId、属性覆盖以及 overrides（按相对节点 id 记录与组件不同的字段，子节点顺序不同时记录 childOrder）；主组件不在结果中时以首个实例的子树作为模板；可选，默认为 False
+        output_format: 输出编码；json 为默认的嵌套 JSON，json-min 为压缩 JSON，table 为每个节点一行（parent 为父节点行号）的列式表格，yaml 为每个节点一行的类 YAML 紧凑文本；可选，默认为 json
+        selector: 节点选择器，只返回匹配的节点及其子树（嵌套的匹配随最外层匹配一起返回）；空格分隔的条件需同时满足，同一条件内用 | 分隔多个可选值，
+            支持 type=TEXT|INSTANCE、name="Button*"（通配）、componentId=1:2、hasImage=true；可选，默认为 None 返回完整节点树
     :return:
         包含 Figma 文件数据的 JSON 字符串
     """
     request: Request = mcp.session_manager.app.request_context.request
-    client = await get_figma(request=request)
-    if node_id:
-        res = await client.get_node(file_key=file_key, node_id=node_id, depth=depth)
-    else:
-        res = await client.get_file(file_key=file_key, depth=depth)
+    with track_tool("get_figma_data"), profile_request(request, "get_figma_data") as profile:
+        client = await get_figma(request=request)
+        design = await load_design(client, file_key, node_id, depth, compress_components, selector=selector)
 
-    design = parse_node(result=res, option={ "maxDepth": depth })
+        with stage("serialize"):
+            output = encode_design(design, output_format)
+        if profile is not None:
+            return [output, profile_link(request, profile)]
+        return output
 
-    return design
+
+# 每个文件（token、代数）一个空间索引，持有的是精简后的节点几何而非原始文档
+spatial_indexes = IndexCache(16)
+
+
+async def load_spatial_index(client: FigmaClient, file_key: str) -> SpatialIndex:
+    """
+    按文件版本复用空间索引：文件缓存未过期时直接使用，否则先用 depth=1 请求确认版本，版本变化时才重新获取完整文件并构建
+    """
+    generation = await file_generation(file_key)
+    key = f"{client.token_key}:{generation}:{file_key}"
+    index: Optional[SpatialIndex] = spatial_indexes.get(key)
+    if index is not None:
+        if FILE_CACHE.enabled and time.time() - index.checked_at < FILE_CACHE.ttl:
+            return index
+        if index.version and await client.get_version(file_key) == index.version:
+            index.checked_at = time.time()
+            return index
+
+    cost = client.design_cost(file_key)
+    async with ADMISSION.memory_stage("find_figma_nodes_in_region", cost, PRIORITY_FILE):
+        res = await client.get_file(file_key=file_key, refresh=index is not None)
+        async with ADMISSION.cpu_stage("find_figma_nodes_in_region", cost):
+            with stage("spatial_index"):
+                index = await asyncio.to_thread(SpatialIndex, res.get("document", {}), str(res.get("version") or res.get("lastModified") or ""))
+    spatial_indexes.set(key, index)
+    return index
+
+
+@mcp.tool(structured_output=False)
+async def find_figma_nodes_in_region(
+    file_key: str,
+    x: float,
+    y: float,
+    width: float = 0,
+    height: float = 0,
+    mode: RegionMode = "intersects",
+    page: Optional[str] = None,
+    limit: int = 200,
+) -> Union[str, List[str]]:
+    """按画布坐标查找区域或点上的节点，只返回节点 id、名称、类型与包围盒，无需获取完整节点树
+
+    :arg:
+        file_key: Figma 文件的键
+        x: 区域左上角的横坐标（与节点 absoluteBoundingBox 相同的画布坐标）
+        y: 区域左上角的纵坐标
+        width: 区域宽度；可选，默认为 0，与 height 都为 0 时按点查询
+        height: 区域高度；可选，默认为 0
+        mode: intersects 返回与区域相交的节点，contains 返回包含整个区域的节点（点查询时即该点下的所有节点），within 返回完全位于区域内的节点；可选，默认为 intersects
+        page: 页面 ID 或名称；可选，默认为 None 查询所有页面
+        limit: 最多返回的节点数（按文档顺序）；可选，默认为 200
+    :return:
+        包含匹配节点的 JSON 字符串，节点可再通过 get_figma_data 的 node_id 获取详情
+    """
+    request: Request = mcp.session_manager.app.request_context.request
+    with track_tool("find_figma_nodes_in_region"), profile_request(request, "find_figma_nodes_in_region") as profile:
+        client = await get_figma(request=request)
+        index = await load_spatial_index(client, file_key)
+        with stage("spatial_query"):
+            result = index.query(x, y, width, height, mode=mode, page=page, limit=limit)
+
+        output = dumps({"fileKey": file_key, "version": index.version, **result})
+        if profile is not None:
+            return [output, profile_link(request, profile)]
+        return output
+
+
+@mcp.tool(structured_output=False)
+async def search_figma_text(query: str, file_key: Optional[str] = None, limit: int = 20) -> Union[str, List[str]]:
+    """在已获取过的 Figma 文件中搜索文本内容、节点名称与组件名称，返回节点 id、文件键与祖先路径
+
+    :arg:
+        query: 搜索词；多个词需同时出现在同一节点中，中文按字匹配
+        file_key: 只在该文件中搜索；可选，默认为 None 搜索所有已索引的文件
+        limit: 最多返回的结果数；可选，默认为 20
+    :return:
+        包含匹配节点的 JSON 字符串；文件在通过 get_figma_data 或预取获取后才会被索引，找到节点后可用 get_figma_data 的 node_id 只获取该节点
+    """
+    request: Request = mcp.session_manager.app.request_context.request
+    with track_tool("search_figma_text"), profile_request(request, "search_figma_text") as profile:
+        client = await get_figma(request=request)
+        with stage("text_search"):
+            result = await asyncio.to_thread(TEXT_INDEX.search, client.token_key, query, file_key, limit)
+
+        output = dumps(result)
+        if profile is not None:
+            return [output, profile_link(request, profile)]
+        return output
 
 
 class NodeParams(BaseModel):
@@ -277,8 +795,17 @@ class NodeParams(BaseModel):
     filenameSuffix: Optional[str] = Field(None, description="文件名后缀")
 
 
+def node_file_name(node: NodeParams) -> str:
+    final_file_name = node.fileName
+    if node.filenameSuffix and node.filenameSuffix not in final_file_name:
+        name, ext = os.path.splitext(final_file_name)
+        final_file_name = f"{name}-{node.filenameSuffix}{ext}"
+    return final_file_name
+
+
 @mcp.tool()
-async def download_image(file_key: str, nodes: List[NodeParams],  png_scale: Union[int, float, str], local_path: str):
+async def download_image(file_key: str, nodes: List[NodeParams],  png_scale: Union[int, float, str], local_path: str,
+                         formats: Optional[List[VariantFormat]] = None, scales: Optional[List[float]] = None):
     """
     用于下载 Figma 节点的图片资源（PNG / SVG）。
     **调用时机**：
@@ -289,74 +816,390 @@ async def download_image(file_key: str, nodes: List[NodeParams],  png_scale: Uni
         nodes: 要作为图片提取的节点
         png_scale: PNG 图片的导出比例。可选，如果未指定，则默认为 2。仅适用于 PNG 图片。
         local_path: 项目中存储图像的目录的绝对路径。如果该目录不存在，则会创建。此路径的格式应遵循您正在运行的操作系统的目录格式。路径名中也不要使用任何特殊转义字符。
+        formats: 额外输出的图片格式（webp / avif / png / jpg），与原文件同目录、同名不同后缀。可选，默认不转码。仅适用于位图。
+        scales: 额外输出的尺寸比例，例如 [1, 2]，按 png_scale 导出的图片缩小得到，文件名带 @1x、@2x 后缀；不能大于 png_scale。可选，默认不输出。仅适用于按 nodeId 渲染的 PNG，imageRef 图片按原图分辨率下载，忽略该参数。
     :return:
         包含图片下载结果的 JSON 字符串
     """
-    try:
-        download_items = []
-        download_to_requests: Dict[int, List[str]] = {}
-        seen_downloads: Dict[str, int] = {}
-        for node in nodes:
-            final_file_name = node.fileName
-            if node.filenameSuffix and node.filenameSuffix not in final_file_name:
-                name, ext = os.path.splitext(final_file_name)
-                final_file_name = f"{name}-{node.filenameSuffix}{ext}"
-            download_item = {
-                "fileName": final_file_name,
-                "needsCropping": node.needsCropping or False,
-                "cropTransform": node.cropTransform,
-                "requiresImageDimensions": node.requiresImageDimensions or False,
-            }
-            if node.imageRef:
-                unique_key = f"{node.imageRef}-{node.filenameSuffix or 'none'}"
-                if not node.filenameSuffix and unique_key in seen_downloads:
-                    download_index = seen_downloads[unique_key]
-                    requests = download_to_requests.get(download_index, [])
-                    if final_file_name not in requests:
-                        requests.append(final_file_name)
-                    if download_item["requiresImageDimensions"]:
-                        download_items[download_index]["requiresImageDimensions"] = True
+    request: Request = mcp.session_manager.app.request_context.request
+    with track_tool("download_image"), profile_request(request, "download_image") as profile:
+        try:
+            download_items = []
+            download_to_requests: Dict[int, List[str]] = {}
+            seen_downloads: Dict[str, int] = {}
+            for node in nodes:
+                final_file_name = node_file_name(node)
+                download_item = {
+                    "fileName": final_file_name,
+                    "needsCropping": node.needsCropping or False,
+                    "cropTransform": node.cropTransform,
+                    "requiresImageDimensions": node.requiresImageDimensions or False,
+                }
+                if node.imageRef:
+                    unique_key = f"{node.imageRef}-{node.filenameSuffix or 'none'}"
+                    if not node.filenameSuffix and unique_key in seen_downloads:
+                        download_index = seen_downloads[unique_key]
+                        requests = download_to_requests.get(download_index, [])
+                        if final_file_name not in requests:
+                            requests.append(final_file_name)
+                        if download_item["requiresImageDimensions"]:
+                            download_items[download_index]["requiresImageDimensions"] = True
+                    else:
+                        download_index = len(download_items)
+                        download_items.append({**download_item, "imageRef": node.imageRef})
+                        download_to_requests[download_index] = [final_file_name]
+                        seen_downloads[unique_key] = download_index
                 else:
                     download_index = len(download_items)
-                    download_items.append({**download_item, "imageRef": node.imageRef})
+                    download_items.append({**download_item, "nodeId": node.nodeId})
                     download_to_requests[download_index] = [final_file_name]
-                    seen_downloads[unique_key] = download_index
-            else:
-                download_index = len(download_items)
-                download_items.append({**download_item, "nodeId": node.nodeId})
-                download_to_requests[download_index] = [final_file_name]
 
-        request: Request = mcp.session_manager.app.request_context.request
+            client = await get_figma(request=request)
+            # 执行下载
+            options: Dict[str, Any] = {"pngScale": png_scale}
+            if formats or scales:
+                options["variants"] = {"formats": formats or [], "scales": scales or []}
+            cost = image_cost(len(download_items), float(png_scale or 2), bool(formats or scales))
+            async with ADMISSION.admit("download_image", cost, PRIORITY_IMAGES):
+                all_downloads = await client.download_images(file_key, local_path, download_items, options)
+            success_count = sum(1 for item in all_downloads if item)
+            # 格式化结果
+            images_list = []
+            for index, result in enumerate(all_downloads):
+                file_name = os.path.basename(result["filePath"])
+                dimensions = f"{result['finalDimensions']['width']}x{result['finalDimensions']['height']}"
+                crop_status = " (cropped)" if result.get("wasCropped") else ""
+
+                if result.get("cssVariables"):
+                    dimension_info = f"{dimensions} | {result['cssVariables']}"
+                else:
+                    dimension_info = dimensions
+
+                requested_names = download_to_requests.get(index, [file_name])
+                alias_text = ""
+                if len(requested_names) > 1:
+                    aliases = [name for name in requested_names if name != file_name]
+                    alias_text = f" (also requested as: {', '.join(aliases)})" if aliases else ""
+
+                images_list.append(f"- {file_name}: {dimension_info}{crop_status}{alias_text}")
+                for variant in result.get("variants") or []:
+                    images_list.append(f"  - {describe_variant(variant, result['originalBytes'])}")
+                for message in result.get("processingLog") or []:
+                    if message.startswith("Failed to generate variants"):
+                        images_list.append(f"  - {message}")
+            output = f"Downloaded {success_count} images:\n" + "\n".join(images_list)
+            if profile is not None:
+                return [output, profile_link(request, profile)]
+            return output
+        except Exception as e:
+            TOOL_ERRORS.inc(tool="download_image")
+            return f"Failed to download images: {str(e)}"
+
+
+exports: Dict[str, dict] = {}
+# 导出地址的有效期（秒）与同时进行的下载数
+EXPORT_TTL = 600
+EXPORT_CONCURRENCY = 4
+
+
+@mcp.tool()
+async def export_images(file_key: str, nodes: List[NodeParams], png_scale: Union[int, float, str]):
+    """
+    将 Figma 节点的图片资源（PNG / SVG）打包为 zip 供下载，不写入服务端目录。
+    **调用时机**：
+    - 与 download_image 相同，但 MCP 服务与当前项目不在同一台机器（无法共享 local_path）时使用
+
+    :arg:
+        file_key: 包含图片的 Figma 文件的键
+        nodes: 要作为图片提取的节点，fileName 为压缩包中的文件名
+        png_scale: PNG 图片的导出比例。可选，如果未指定，则默认为 2。仅适用于 PNG 图片。
+    :return:
+        压缩包的下载地址，10 分钟内有效，可用 curl -o assets.zip <地址> 下载后解压到项目目录
+    """
+    request: Request = mcp.session_manager.app.request_context.request
+    with track_tool("export_images"):
         client = await get_figma(request=request)
-        # 执行下载
-        all_downloads = await client.download_images(file_key, local_path, download_items, {
-            "pngScale": png_scale
+        now = time.time()
+        for export_id in [key for key, export in exports.items() if export["expires"] < now]:
+            exports.pop(export_id, None)
+        export_id = uuid.uuid4().hex
+        exports[export_id] = {
+            "client": client,
+            "fileKey": file_key,
+            "pngScale": png_scale,
+            "items": [{
+                "fileName": node_file_name(node),
+                "nodeId": node.nodeId,
+                "imageRef": node.imageRef,
+                "cropTransform": node.cropTransform if node.needsCropping else None,
+            } for node in nodes],
+            "expires": now + EXPORT_TTL,
+        }
+        return f"Archive ({len(nodes)} files, expires in {EXPORT_TTL // 60} minutes): {request.base_url}exports/{export_id}"
+
+
+async def missing_image(message: str):
+    raise Exception(message)
+    yield b""
+
+
+async def export_entries(export: dict) -> List[ArchiveEntry]:
+    """
+    解析导出中每个文件的图片地址（SVG 按几何去重后渲染），按请求顺序返回压缩包条目
+    """
+    client: FigmaClient = export["client"]
+    file_key = export["fileKey"]
+    items = export["items"]
+    urls: Dict[int, Optional[str]] = {}
+
+    fills = [(index, item) for index, item in enumerate(items) if item["imageRef"]]
+    if fills:
+        fill_urls = await client.get_image(file_key)
+        urls.update({index: fill_urls.get(item["imageRef"]) for index, item in fills})
+    renders = [(index, item) for index, item in enumerate(items) if not item["imageRef"] and item["nodeId"]]
+    pngs = [(index, item) for index, item in renders if not item["fileName"].lower().endswith(".svg")]
+    if pngs:
+        png_urls = await client.get_node_render_urls(file_key, list(dict.fromkeys(item["nodeId"] for _, item in pngs)), "png", {
+            "pngScale": export["pngScale"],
         })
-        success_count = sum(1 for item in all_downloads if item)
-        # 格式化结果
-        images_list = []
-        for index, result in enumerate(all_downloads):
-            file_name = os.path.basename(result["filePath"])
-            dimensions = f"{result['finalDimensions']['width']}x{result['finalDimensions']['height']}"
-            crop_status = " (cropped)" if result.get("wasCropped") else ""
-
-            if result.get("cssVariables"):
-                dimension_info = f"{dimensions} | {result['cssVariables']}"
-            else:
-                dimension_info = dimensions
+        urls.update({index: png_urls.get(item["nodeId"]) for index, item in pngs})
+    svgs = [{**item, "index": index} for index, item in renders if item["fileName"].lower().endswith(".svg")]
+    if svgs:
+        groups = await client.group_svg_nodes(file_key, svgs, None)
+        svg_urls = await client.get_node_render_urls(file_key, [group[0]["nodeId"] for group in groups], "svg")
+        urls.update({item["index"]: svg_urls.get(group[0]["nodeId"]) for group in groups for item in group})
+
+    entries: List[ArchiveEntry] = []
+    for index, item in enumerate(items):
+        url = urls.get(index)
+        source = functools.partial(stream_figma_image, url) if url else functools.partial(missing_image, "No image URL returned by Figma")
+        transform = None
+        if item["cropTransform"] and not item["fileName"].lower().endswith(".svg"):
+            transform = functools.partial(crop_image_bytes, crop_transform=item["cropTransform"])
+        entries.append((item["fileName"], source, transform))
+    return entries
+
+
+@mcp.custom_route("/exports/{export_id}", methods=["GET"])
+async def export_archive(request: Request) -> Response:
+    """
+    以 zip 流式输出 export_images 创建的导出：下载与打包同时进行，不写入中间文件，内存占用与文件数量无关；
+    下载中途失败的文件以 <文件名>.partial 列出，并在 manifest.json 中记录失败原因
+    """
+    export = exports.get(request.path_params["export_id"])
+    if export is None or export["expires"] < time.time():
+        return PlainTextResponse("Export not found or expired", status_code=404)
+    # 同时进行的下载与裁剪最多 EXPORT_CONCURRENCY + 1 个
+    cost = image_cost(min(len(export["items"]), EXPORT_CONCURRENCY + 1), float(export["pngScale"] or 2))
+    try:
+        ticket = await ADMISSION.acquire("export_images", cost, PRIORITY_EXPORT)
+    except Overloaded as e:
+        return PlainTextResponse(str(e), status_code=503, headers={"Retry-After": str(math.ceil(e.retry_after))})
+    try:
+        entries = await export_entries(export)
+    except httpx.HTTPError as e:
+        ADMISSION.release(ticket)
+        return PlainTextResponse(f"Failed to resolve image URLs: {e}", status_code=502)
+    except BaseException:
+        ADMISSION.release(ticket)
+        raise
+    return AdmittedStreamingResponse(
+        stream_zip(entries, EXPORT_CONCURRENCY, {"fileKey": export["fileKey"]}),
+        ticket,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{export["fileKey"]}-images.zip"'},
+    )
+
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> Response:
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@mcp.custom_route("/profiles/{profile_id}", methods=["GET"])
+async def profiles(request: Request) -> Response:
+    """
+    获取 profile=1 请求生成的分析结果：summary 为 JSON 摘要，pstats 为 cProfile 文件（可用 snakeviz 打开），trace 为 Chrome trace（chrome://tracing / Perfetto）
+    """
+    profile_format = request.query_params.get("format", "summary")
+    path = profile_path(request.path_params["profile_id"], profile_format)
+    if path is None:
+        return PlainTextResponse(f"Profile not found (formats: {', '.join(PROFILE_FORMATS)})", status_code=404)
+    if profile_format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=path.name)
+    return FileResponse(path, media_type="application/json")
+
+
+WEBHOOK_FILE_EVENTS = ("FILE_UPDATE", "FILE_VERSION_UPDATE", "FILE_DELETE")
+
+
+@mcp.custom_route("/webhooks/figma", methods=["POST"])
+async def figma_webhook(request: Request) -> Response:
+    """
+    接收 Figma webhook（v2）：FILE_UPDATE / FILE_VERSION_UPDATE / FILE_DELETE 使该文件的缓存失效，
+    FIGMA_WEBHOOK_REFRESH 为真时随后在后台重新获取本进程最近请求过的设计数据
+    """
+    if not WEBHOOK_PASSCODE:
+        return JSONResponse({"error": "webhook disabled, set FIGMA_WEBHOOK_PASSCODE"}, status_code=404)
+    try:
+        payload = loads(await request.body())
+    except ValueError:
+        return JSONResponse({"error": "invalid payload"}, status_code=400)
+    if not isinstance(payload, dict) or not isinstance(payload.get("file_key") or "", str):
+        return JSONResponse({"error": "invalid payload"}, status_code=400)
+    event = str(payload.get("event_type", ""))
+    if not hmac.compare_digest(str(payload.get("passcode", "")).encode("utf-8"), WEBHOOK_PASSCODE.encode("utf-8")):
+        WEBHOOK_EVENTS.inc(event=event, result="unauthorized")
+        return JSONResponse({"error": "invalid passcode"}, status_code=403)
+
+    file_key = payload.get("file_key")
+    if event not in WEBHOOK_FILE_EVENTS or not file_key:
+        # PING 等事件直接确认，避免 Figma 重试
+        WEBHOOK_EVENTS.inc(event=event, result="ignored")
+        return JSONResponse({"event": event, "ignored": True})
+
+    generation = await invalidate_file(file_key)
+    # 大文件的索引条目可达百万个，与删除存储文件一样放到线程中，不阻塞事件循环
+    await asyncio.to_thread(TEXT_INDEX.remove_file, file_key)
+    await asyncio.to_thread(DOC_STORE.remove_file, file_key)
+    refreshing = 0
+    if WEBHOOK_REFRESH and event != "FILE_DELETE":
+        for client, node_id, depth, compress, selector in recent_designs.get(file_key, {}).values():
+            key = design_cache_key(client, generation, file_key, node_id, depth, compress, selector)
+            REVALIDATOR.schedule(DESIGN_CACHE, key, functools.partial(refresh_design, client, file_key, node_id, depth, compress, selector))
+            refreshing += 1
+    WEBHOOK_EVENTS.inc(event=event, result="invalidated")
+    return JSONResponse({"event": event, "fileKey": file_key, "invalidated": True, "refreshing": refreshing})
+
+
+async def refresh_design(client: FigmaClient, file_key: str, node_id: str, depth: Optional[int], compress_components: bool,
+                         selector: Optional[str] = None) -> bool:
+    await load_design(client, file_key, node_id, depth, compress_components, refresh=True, selector=selector,
+                      priority=PRIORITY_BACKGROUND)
+    return True
 
-            requested_names = download_to_requests.get(index, [file_name])
-            alias_text = ""
-            if len(requested_names) > 1:
-                aliases = [name for name in requested_names if name != file_name]
-                alias_text = f" (also requested as: {', '.join(aliases)})" if aliases else ""
 
-            images_list.append(f"- {file_name}: {dimension_info}{crop_status}{alias_text}")
-        return f"Downloaded {success_count} images:\n" + "\n".join(images_list)
-    except Exception as e:
-        return f"Failed to download images: {str(e)}"
+prefetch_jobs: Dict[str, dict] = {}
+prefetch_tasks: set = set()
+PREFETCH_JOBS_KEEP = 50
+
+
+def check_admin(request: Request) -> Optional[Response]:
+    if ADMIN_TOKEN and not hmac.compare_digest(
+        request.headers.get("authorization", "").encode("utf-8"), f"Bearer {ADMIN_TOKEN}".encode("utf-8")
+    ):
+        return JSONResponse({"error": "unauthorized"}, status_code=401)
+    return None
+
+
+async def run_prefetch(job: dict, client: FigmaClient, items: List[dict], images: bool):
+    """
+    按有限并发预取并解析设计稿，结果写入 DESIGN_CACHE；images 为真时同时预取图片填充地址
+    """
+    semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+    async def prefetch(kind: str, item: dict):
+        async with semaphore:
+            try:
+                if kind == "design":
+                    await load_design(client, item["fileKey"], item["nodeId"], item["depth"], item["compressComponents"],
+                                      priority=PRIORITY_BACKGROUND)
+                else:
+                    await client.get_image(item["fileKey"])
+                job["done"] += 1
+            except Exception as e:
+                job["failed"] += 1
+                job["errors"].append({**item, "kind": kind, "error": str(e)})
+
+    tasks = []
+    for item in items:
+        tasks.append(prefetch("design", item))
+    if images:
+        for file_key in dict.fromkeys(item["fileKey"] for item in items):
+            tasks.append(prefetch("image_urls", {"fileKey": file_key}))
+    await asyncio.gather(*tasks)
+    job["status"] = "finished"
+    job["finishedAt"] = time.time()
+
+
+@mcp.custom_route("/admin/prefetch", methods=["POST"])
+async def prefetch_designs(request: Request) -> Response:
+    """
+    预取设计稿：请求体为 {"files": [{"fileKey", "nodeIds"?, "depth"?, "compressComponents"?}], "images"?: bool}，
+    figma_token 与 MCP 地址相同（缓存按 token 隔离）；返回任务 id，通过 GET /admin/prefetch/{job_id} 查询进度
+    """
+    denied = check_admin(request)
+    if denied is not None:
+        return denied
+    if not DESIGN_CACHE.enabled:
+        return JSONResponse({"error": "design cache disabled, set FIGMA_DESIGN_CACHE_TTL"}, status_code=400)
+    try:
+        body = loads(await request.body())
+        client = await get_figma(request=request)
+    except ValueError as e:
+        return JSONResponse({"error": str(e)}, status_code=400)
+    if not isinstance(body, dict) or not isinstance(body.get("files", []), list):
+        return JSONResponse({"error": "body must be an object with a files list"}, status_code=400)
+
+    items = []
+    for entry in body.get("files", []):
+        if not isinstance(entry, dict) or not isinstance(entry.get("nodeIds") or [], list):
+            return JSONResponse({"error": "each file must be an object, nodeIds must be a list"}, status_code=400)
+        if not entry.get("fileKey"):
+            return JSONResponse({"error": "fileKey is required"}, status_code=400)
+        for node_id in entry.get("nodeIds") or [""]:
+            items.append({
+                "fileKey": entry["fileKey"],
+                "nodeId": node_id,
+                "depth": entry.get("depth"),
+                "compressComponents": bool(entry.get("compressComponents", False)),
+            })
+
+    images = bool(body.get("images", False))
+    total = len(items) + (len({item["fileKey"] for item in items}) if images else 0)
+    job_id = uuid.uuid4().hex
+    job = {"id": job_id, "status": "running", "total": total, "done": 0, "failed": 0, "errors": [], "startedAt": time.time()}
+    prefetch_jobs[job_id] = job
+    for old_id in list(prefetch_jobs)[:-PREFETCH_JOBS_KEEP]:
+        prefetch_jobs.pop(old_id, None)
+
+    task = asyncio.create_task(run_prefetch(job, client, items, images))
+    prefetch_tasks.add(task)
+    task.add_done_callback(prefetch_tasks.discard)
+    return JSONResponse(job, status_code=202)
+
+
+@mcp.custom_route("/admin/prefetch/{job_id}", methods=["GET"])
+async def prefetch_status(request: Request) -> Response:
+    denied = check_admin(request)
+    if denied is not None:
+        return denied
+    job = prefetch_jobs.get(request.path_params["job_id"])
+    if job is None:
+        # 多 worker 模式下任务只记录在接收请求的 worker 中
+        return JSONResponse({"error": "job not found"}, status_code=404)
+    return JSONResponse(job)
+
+
+def create_app():
+    """
+    多 worker 模式下由 uvicorn 在每个 worker 进程中调用
+    """
+    return mcp.streamable_http_app()
 
 
 if __name__ == "__main__":
-    mcp.run(transport="streamable-http")
+    if MCP_WORKERS > 1:
+        import uvicorn
+
+        uvicorn.run(
+            "main:create_app",
+            factory=True,
+            host=mcp.settings.host,
+            port=mcp.settings.port,
+            workers=MCP_WORKERS,
+            log_level=mcp.settings.log_level.lower(),
+        )
+    else:
+        mcp.run(transport="streamable-http")
 
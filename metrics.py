@@ -0,0 +1,212 @@
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 最近一次抓取 /metrics 后的该秒数内视为指标正在被采集，按需开启的额外统计（如各提取器耗时）在此期间记录
+SCRAPE_WINDOW = 600
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+LabelValues = Tuple[str, ...]
+
+
+def format_labels(names: Tuple[str, ...], values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(zip(names, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')) for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.lock = threading.Lock()
+
+    def key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    @abstractmethod
+    def samples(self) -> List[str]:
+        pass
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[LabelValues, float] = {} if labelnames else {(): 0.0}
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted(self.values.items())
+        return [f"{self.name}{format_labels(self.labelnames, key)} {format_value(value)}" for key, value in items]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, amount: float = 1, **labels: str):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels: str):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    @contextmanager
+    def track(self, **labels: str) -> Iterator[None]:
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # 每组标签：(各桶计数, 总和, 总数)
+        self.values: Dict[LabelValues, Tuple[List[int], float, int]] = {}
+
+    def observe(self, value: float, **labels: str):
+        key = self.key(labels)
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * len(self.buckets), 0.0, 0)
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            self.values[key] = (counts, total + value, count + 1)
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> List[str]:
+        with self.lock:
+            items = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self.values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{format_labels(self.labelnames, key, ('le', format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.labelnames, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+REGISTRY: List[Metric] = []
+
+
+def register(metric: Metric) -> Metric:
+    REGISTRY.append(metric)
+    return metric
+
+
+last_scrape = 0.0
+
+
+def render_metrics() -> str:
+    """
+    Prometheus 文本格式（0.0.4）
+    """
+    global last_scrape
+    last_scrape = time.monotonic()
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
+
+
+def metrics_scraped() -> bool:
+    return last_scrape > 0 and time.monotonic() - last_scrape < SCRAPE_WINDOW
+
+
+# 各阶段耗时：validate、fetch、decode、extract、image_urls、download、image_processing、serialize
+STAGE_SECONDS: Histogram = register(Histogram(
+    "figma_stage_duration_seconds", "Duration of each processing stage.", ("stage",),
+))
+# 每次提取中各提取器（layout、text、visual、comp）的累计耗时
+EXTRACTOR_SECONDS: Histogram = register(Histogram(
+    "figma_extractor_duration_seconds", "Total time spent in each extractor per extraction.", ("extractor",),
+))
+TOOL_SECONDS: Histogram = register(Histogram(
+    "figma_tool_duration_seconds", "End-to-end duration of MCP tool calls.", ("tool",),
+))
+TOOL_ERRORS: Counter = register(Counter(
+    "figma_tool_errors_total", "MCP tool calls that raised an error.", ("tool",),
+))
+INFLIGHT: Gauge = register(Gauge(
+    "figma_inflight_requests", "MCP tool calls currently in progress.", ("tool",),
+))
+CACHE_REQUESTS: Counter = register(Counter(
+    "figma_cache_requests_total", "Cache lookups by cache and result (hit / stale / miss).", ("cache", "result"),
+))
+CACHE_REFRESHES: Counter = register(Counter(
+    "figma_cache_refreshes_total", "Background revalidations of stale entries by result (unchanged / changed / error).", ("cache", "result"),
+))
+WEBHOOK_EVENTS: Counter = register(Counter(
+    "figma_webhook_events_total", "Received Figma webhook events by type and result.", ("event", "result"),
+))
+SVG_RENDERS: Counter = register(Counter(
+    "figma_svg_renders_total", "Requested SVG files by result (rendered / deduplicated).", ("result",),
+))
+UPSTREAM_TIMEOUT: Gauge = register(Gauge(
+    "figma_upstream_timeout_seconds", "Timeout applied to the most recent Figma API request by endpoint class.", ("endpoint",),
+))
+ADMISSION_WAIT: Histogram = register(Histogram(
+    "figma_admission_wait_seconds", "Time spent queued by the admission controller.", ("tool",),
+))
+ADMISSION_REJECTED: Counter = register(Counter(
+    "figma_admission_rejected_total", "Requests rejected by the admission controller by reason (queue_full / timeout).", ("tool", "reason"),
+))
+ADMISSION_RESERVED: Gauge = register(Gauge(
+    "figma_admission_reserved", "Reserved admission budget (memory_mb / cpu) and queued requests.", ("resource",),
+))
+RETRIES: Counter = register(Counter(
+    "figma_retries_total", "Retried upstream requests by endpoint.", ("endpoint",),
+))
+HEDGES: Counter = register(Counter(
+    "figma_hedged_requests_total", "Hedged (duplicate) upstream requests by endpoint class.", ("endpoint",),
+))
+
+
+@contextmanager
+def track_tool(tool: str) -> Iterator[None]:
+    with INFLIGHT.track(tool=tool), TOOL_SECONDS.time(tool=tool):
+        try:
+            yield
+        except Exception:
+            TOOL_ERRORS.inc(tool=tool)
+            raise
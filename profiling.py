@@ -0,0 +1,201 @@
+import cProfile
+import json
+import pstats
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from config import PROFILE_DIR, PROFILE_KEEP
+from metrics import STAGE_SECONDS
+
+PROFILE_FORMATS = ("summary", "pstats", "trace")
+
+CURRENT: ContextVar[Optional["ProfileSession"]] = ContextVar("figma_profile", default=None)
+
+# 同一线程同时只能有一个 cProfile 生效，事件循环线程被占用时新会话只记录 trace 和计数
+loop_profiler_lock = threading.Lock()
+
+
+class ProfileSession:
+    def __init__(self, tool: str):
+        self.id = uuid.uuid4().hex
+        self.tool = tool
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        self.profilers: List[cProfile.Profile] = []
+        self.events: List[Dict[str, Any]] = []
+        self.counters: Dict[str, float] = {}
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def profile(self) -> Iterator[None]:
+        """
+        对当前线程启用 cProfile；会话内可在多个线程分别调用，保存时合并
+        """
+        profiler = cProfile.Profile()
+        with self.lock:
+            self.profilers.append(profiler)
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+
+    def span(self, name: str, start: float, end: float, args: Optional[Dict[str, Any]] = None):
+        # Chrome trace event 格式（ph=X 完整事件），时间单位为微秒
+        event = {
+            "name": name,
+            "ph": "X",
+            "ts": round((start - self.started) * 1e6),
+            "dur": round((end - start) * 1e6),
+            "pid": 1,
+            "tid": threading.get_ident(),
+        }
+        if args:
+            event["args"] = args
+        with self.lock:
+            self.events.append(event)
+
+    def add_counters(self, **values: float):
+        with self.lock:
+            for key, value in values.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def combined_stats(self) -> Optional[pstats.Stats]:
+        profilers = [p for p in self.profilers if p.getstats()]
+        if not profilers:
+            return None
+        stats = pstats.Stats(profilers[0])
+        for profiler in profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+    def summary(self, stats: Optional[pstats.Stats], top: int = 30) -> Dict[str, Any]:
+        functions = []
+        if stats is not None:
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+            for (file_name, line, function), (_, calls, total, cumulative, _) in rows:
+                functions.append({
+                    "function": f"{file_name}:{line}({function})",
+                    "calls": calls,
+                    "totalSeconds": round(total, 6),
+                    "cumulativeSeconds": round(cumulative, 6),
+                })
+        return {
+            "id": self.id,
+            "tool": self.tool,
+            "startedAt": self.started_at,
+            "durationSeconds": round((self.finished or time.perf_counter()) - self.started, 6),
+            "counters": self.counters,
+            "stages": self.events,
+            "topFunctions": functions,
+            # 事件循环线程的 profile 会包含同一时段内其他会话的协程
+            "note": "event-loop samples include other sessions running concurrently",
+        }
+
+    def save(self):
+        self.finished = time.perf_counter()
+        directory = Path(PROFILE_DIR)
+        directory.mkdir(parents=True, exist_ok=True)
+        stats = self.combined_stats()
+        if stats is not None:
+            stats.dump_stats(str(directory / f"{self.id}.prof"))
+        (directory / f"{self.id}.summary.json").write_text(json.dumps(self.summary(stats), indent=2), encoding="utf-8")
+        (directory / f"{self.id}.trace.json").write_text(json.dumps({
+            "traceEvents": self.events,
+            "otherData": {"tool": self.tool, **{k: str(v) for k, v in self.counters.items()}},
+        }), encoding="utf-8")
+        prune_profiles(directory)
+
+
+def prune_profiles(directory: Path):
+    summaries = sorted(directory.glob("*.summary.json"), key=lambda p: p.stat().st_mtime, reverse=True)
+    for summary in summaries[PROFILE_KEEP:]:
+        profile_id = summary.name.split(".", 1)[0]
+        for path in directory.glob(f"{profile_id}.*"):
+            path.unlink(missing_ok=True)
+
+
+def profile_enabled(request: Any) -> bool:
+    query_params = request.query_params if request else {}
+    return query_params.get("profile", "").lower() in ("1", "true", "yes", "on")
+
+
+@contextmanager
+def profile_request(request: Any, tool: str) -> Iterator[Optional[ProfileSession]]:
+    """
+    请求 URL 带 profile=1 时，为本次工具调用采集 cProfile、阶段 trace 与提取计数，结束后保存到 PROFILE_DIR
+    """
+    if not profile_enabled(request):
+        yield None
+        return
+
+    session = ProfileSession(tool)
+    token = CURRENT.set(session)
+    owns_loop = loop_profiler_lock.acquire(blocking=False)
+    try:
+        if owns_loop:
+            with session.profile():
+                yield session
+        else:
+            yield session
+    finally:
+        if owns_loop:
+            loop_profiler_lock.release()
+        CURRENT.reset(token)
+        session.save()
+
+
+def profiled(fn: Callable[..., Any], *args: Any) -> Any:
+    """
+    在工作线程中执行 fn，当前请求开启 profile 时同时采集该线程的 cProfile
+    """
+    session = CURRENT.get()
+    if session is None:
+        return fn(*args)
+    with session.profile():
+        return fn(*args)
+
+
+def profiling_active() -> bool:
+    return CURRENT.get() is not None
+
+
+def add_counters(**values: float):
+    session = CURRENT.get()
+    if session is not None:
+        session.add_counters(**values)
+
+
+@contextmanager
+def stage(name: str, **args: Any) -> Iterator[None]:
+    """
+    记录阶段耗时到 metrics，开启 profile 时同时记录为 trace span
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        STAGE_SECONDS.observe(end - start, stage=name)
+        session = CURRENT.get()
+        if session is not None:
+            session.span(name, start, end, args)
+
+
+def profile_link(request: Any, session: ProfileSession) -> str:
+    base = str(request.base_url) if request else "/"
+    return f"Profile: {base}profiles/{session.id}?format=summary (formats: {', '.join(PROFILE_FORMATS)})"
+
+
+def profile_path(profile_id: str, profile_format: str) -> Optional[Path]:
+    if profile_format not in PROFILE_FORMATS or not profile_id.isalnum():
+        return None
+    suffix = {"summary": "summary.json", "pstats": "prof", "trace": "trace.json"}[profile_format]
+    path = Path(PROFILE_DIR) / f"{profile_id}.{suffix}"
+    return path if path.exists() else None
@@ -0,0 +1,174 @@
+import re
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+from config import SEARCH_INDEX_MAX_NODES
+from handle_text import extract_node_text
+
+# 拉丁字母与数字按词切分，中日韩文字按单字切分
+TOKEN = re.compile(r"[0-9a-z]+|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]")
+# 结果中文本内容的最大长度
+SNIPPET_LENGTH = 120
+FIELDS = ("text", "name", "component")
+
+# (token 哈希, 文件 key, 根节点 id)
+UnitKey = Tuple[str, str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN.findall(text.casefold())
+
+
+class Entry(NamedTuple):
+    token_key: str
+    file_key: str
+    node_id: str
+    name: str
+    type: str
+    text: str
+    component: str
+    parent: Optional[int]
+
+
+def covers(indexed_depth: Optional[int], depth: Optional[int]) -> bool:
+    """
+    已索引的深度（None 为完整子树）是否包含 depth 深度的内容
+    """
+    return indexed_depth is None or (depth is not None and indexed_depth >= depth)
+
+
+class TextIndex:
+    """
+    文本内容、节点名称与组件名称的倒排索引；以文件中的根节点（页面或请求的节点）为单位增量加入，
+    同一单位的新版本或同一版本更深的响应替换已有内容；按 token 隔离，只能搜索到同一 token 获取过的文件
+    """
+
+    def __init__(self, max_nodes: int):
+        self.max_nodes = max_nodes
+        # 单位 -> (版本, 相对根节点的深度, 条目 id)
+        self.units: "OrderedDict[UnitKey, Tuple[str, Optional[int], List[int]]]" = OrderedDict()
+        self.entries: Dict[int, Entry] = {}
+        self.postings: Dict[str, Set[int]] = defaultdict(set)
+        self.next_id = 0
+        self.lock = threading.Lock()
+
+    def unit_current(self, unit: UnitKey, version: str, depth: Optional[int]) -> bool:
+        indexed = self.units.get(unit)
+        return indexed is not None and indexed[0] == version and covers(indexed[1], depth)
+
+    def indexed(self, token_key: str, file_key: str, version: str, root_ids: List[str], depth: Optional[int] = None) -> bool:
+        with self.lock:
+            return all(self.unit_current((token_key, file_key, root_id), version, depth) for root_id in root_ids)
+
+    def add(self, token_key: str, file_key: str, version: str, roots: List[dict], components: Dict[str, dict],
+            depth: Optional[int] = None):
+        for root in roots:
+            unit = (token_key, file_key, root.get("id", ""))
+            with self.lock:
+                if self.unit_current(unit, version, depth):
+                    continue
+            # 在锁外遍历节点树，只在合并时持有锁
+            entries: List[Entry] = []
+            stack: List[Tuple[dict, Optional[int]]] = [(root, None)]
+            while stack:
+                node, parent = stack.pop()
+                component_id = node.get("componentId")
+                entries.append(Entry(
+                    token_key, file_key, node.get("id", ""), node.get("name", ""), node.get("type", ""),
+                    (extract_node_text(node) or "") if node.get("type") == "TEXT" else "",
+                    components.get(component_id, {}).get("name", "") if component_id else "",
+                    parent,
+                ))
+                position = len(entries) - 1
+                children = [child for child in node.get("children", []) or [] if child.get("visible", True)]
+                stack.extend((child, position) for child in reversed(children))
+
+            with self.lock:
+                # 等待锁期间可能已有更深的同版本响应加入
+                if self.unit_current(unit, version, depth):
+                    continue
+                self.remove_unit(unit)
+                base = self.next_id
+                self.next_id += len(entries)
+                for offset, entry in enumerate(entries):
+                    entry_id = base + offset
+                    self.entries[entry_id] = entry._replace(parent=None if entry.parent is None else base + entry.parent)
+                    for token in set(tokenize(f"{entry.name} {entry.text} {entry.component}")):
+                        self.postings[token].add(entry_id)
+                self.units[unit] = (version, depth, list(range(base, base + len(entries))))
+                while len(self.entries) > self.max_nodes and len(self.units) > 1:
+                    self.remove_unit(next(iter(self.units)))
+
+    def remove_file(self, file_key: str):
+        with self.lock:
+            for unit in [unit for unit in self.units if unit[1] == file_key]:
+                self.remove_unit(unit)
+
+    def remove_unit(self, unit: UnitKey):
+        _, _, entry_ids = self.units.pop(unit, ("", None, []))
+        for entry_id in entry_ids:
+            entry = self.entries.pop(entry_id)
+            for token in set(tokenize(f"{entry.name} {entry.text} {entry.component}")):
+                posting = self.postings.get(token)
+                if posting is not None:
+                    posting.discard(entry_id)
+                    if not posting:
+                        del self.postings[token]
+
+    def path(self, entry: Entry) -> List[dict]:
+        path = []
+        parent = entry.parent
+        while parent is not None:
+            ancestor = self.entries[parent]
+            path.append({"id": ancestor.node_id, "name": ancestor.name, "type": ancestor.type})
+            parent = ancestor.parent
+        return path[::-1]
+
+    def search(self, token_key: str, query: str, file_key: Optional[str] = None, limit: int = 20) -> dict:
+        """
+        所有词都出现在节点的文本、名称或组件名称中即为匹配；整句出现在同一字段中的结果排在前面
+        """
+        tokens = set(tokenize(query))
+        if not tokens:
+            raise ValueError("Search query contains no searchable words")
+        phrase = " ".join(query.casefold().split())
+        with self.lock:
+            postings = sorted((self.postings.get(token, set()) for token in tokens), key=len)
+            matched = set(postings[0]).intersection(*postings[1:])
+            ranked = []
+            seen: Set[Tuple[str, str]] = set()
+            for entry_id in sorted(matched):
+                entry = self.entries[entry_id]
+                if entry.token_key != token_key or (file_key and entry.file_key != file_key):
+                    continue
+                # 页面与其中请求过的节点可能同时被索引，同一节点只返回一次
+                if (entry.file_key, entry.node_id) in seen:
+                    continue
+                seen.add((entry.file_key, entry.node_id))
+                values = dict(zip(FIELDS, (entry.text, entry.name, entry.component)))
+                fields = [field for field, value in values.items() if value and tokens & set(tokenize(value))]
+                exact = any(phrase in value.casefold() for value in values.values())
+                ranked.append((not exact, entry_id, entry, fields))
+            ranked.sort(key=lambda item: item[:2])
+            results = [{
+                "fileKey": entry.file_key,
+                "nodeId": entry.node_id,
+                "name": entry.name,
+                "type": entry.type,
+                "matched": fields,
+                **({"text": entry.text[:SNIPPET_LENGTH]} if entry.text else {}),
+                **({"component": entry.component} if entry.component else {}),
+                "path": self.path(entry),
+            } for _, _, entry, fields in ranked[:limit]]
+            files = {unit[1] for unit in self.units if unit[0] == token_key}
+        return {
+            "query": query,
+            "total": len(ranked),
+            "truncated": len(ranked) > len(results),
+            "results": results,
+            "indexedFiles": len(files),
+        }
+
+
+TEXT_INDEX = TextIndex(SEARCH_INDEX_MAX_NODES)
@@ -0,0 +1,170 @@
+import shlex
+import threading
+from collections import OrderedDict, defaultdict
+from fnmatch import fnmatchcase
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 选择器中的类型名与 Figma 原始类型不同的情况（输出中 VECTOR 显示为 IMAGE-SVG）
+TYPE_ALIASES = {"IMAGE-SVG": "VECTOR"}
+SELECTOR_KEYS = {
+    "type": "types",
+    "name": "names",
+    "componentId": "component_ids",
+    "component": "component_ids",
+    "hasImage": "has_image",
+    "image": "has_image",
+}
+# 缓存的索引持有整份原始文档，只保留少量最近使用的版本
+INDEX_CACHE_SIZE = 4
+
+# 节点 id -> (原始节点, 父节点, 深度, 文档顺序)
+IndexEntry = Tuple[dict, Optional[dict], int, int]
+
+
+def has_image(node: dict) -> bool:
+    return any(paint.get("type") == "IMAGE" and paint.get("imageRef") for paint in node.get("fills", []) or [])
+
+
+class Selector:
+    """
+    节点选择器：空格分隔的条件同时满足，同一条件内用 | 分隔多个可选值，例如
+    `type=TEXT|INSTANCE name="Button*" componentId=1:2 hasImage=true`；name 支持 * ? [] 通配
+    """
+
+    def __init__(self, query: str):
+        self.query = query
+        self.types: Optional[Set[str]] = None
+        self.names: Optional[List[str]] = None
+        self.component_ids: Optional[Set[str]] = None
+        self.has_image: Optional[bool] = None
+
+        for term in shlex.split(query):
+            key, sep, value = term.partition("=")
+            if not sep or key not in SELECTOR_KEYS or not value:
+                raise ValueError(f"Invalid selector term: {term} (expected type=, name=, componentId=, hasImage=)")
+            values = value.split("|")
+            attribute = SELECTOR_KEYS[key]
+            if attribute == "types":
+                self.types = {TYPE_ALIASES.get(v.upper(), v.upper()) for v in values}
+            elif attribute == "names":
+                self.names = values
+            elif attribute == "component_ids":
+                self.component_ids = set(values)
+            else:
+                if value.lower() not in ("true", "false"):
+                    raise ValueError(f"Invalid selector term: {term} (hasImage must be true or false)")
+                self.has_image = value.lower() == "true"
+        if self.types is None and self.names is None and self.component_ids is None and self.has_image is None:
+            raise ValueError("Empty selector")
+
+    def matches(self, node: dict) -> bool:
+        if self.types is not None and node.get("type") not in self.types:
+            return False
+        if self.component_ids is not None and node.get("componentId") not in self.component_ids:
+            return False
+        if self.has_image is not None and has_image(node) != self.has_image:
+            return False
+        if self.names is not None and not any(fnmatchcase(node.get("name", ""), pattern) for pattern in self.names):
+            return False
+        return True
+
+
+class NodeIndex:
+    """
+    原始文档中可见节点的索引（按类型、组件与图片填充），深度超过 max_depth 的节点不在索引中
+    """
+
+    def __init__(self, roots: List[dict], max_depth: Optional[int] = None):
+        self.entries: Dict[str, IndexEntry] = {}
+        self.parents: Dict[str, str] = {}
+        self.by_type: Dict[str, List[str]] = defaultdict(list)
+        self.by_component: Dict[str, List[str]] = defaultdict(list)
+        self.with_image: List[str] = []
+
+        stack: List[Tuple[dict, Optional[dict], int]] = [(root, None, 0) for root in reversed(roots)]
+        while stack:
+            node, parent, depth = stack.pop()
+            node_id = node.get("id", "")
+            self.entries[node_id] = (node, parent, depth, len(self.entries))
+            if parent is not None:
+                self.parents[node_id] = parent.get("id", "")
+            self.by_type[node.get("type", "")].append(node_id)
+            if node.get("componentId"):
+                self.by_component[node["componentId"]].append(node_id)
+            if has_image(node):
+                self.with_image.append(node_id)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            children = [child for child in node.get("children", []) or [] if child.get("visible", True)]
+            stack.extend((child, node, depth + 1) for child in reversed(children))
+
+    def candidates(self, selector: Selector) -> Iterable[str]:
+        """
+        选择索引中最小的候选集合，没有可用索引时遍历全部节点
+        """
+        options = []
+        if selector.types is not None:
+            options.append([node_id for node_type in selector.types for node_id in self.by_type.get(node_type, [])])
+        if selector.component_ids is not None:
+            options.append([node_id for component_id in selector.component_ids for node_id in self.by_component.get(component_id, [])])
+        if selector.has_image:
+            options.append(self.with_image)
+        if not options:
+            return self.entries.keys()
+        return min(options, key=len)
+
+    def select(self, selector: Selector) -> List[IndexEntry]:
+        """
+        返回最外层的匹配节点（按文档顺序）；嵌套在其他匹配节点内的匹配随外层节点一起输出
+        """
+        matched = {node_id for node_id in self.candidates(selector) if selector.matches(self.entries[node_id][0])}
+        outermost = []
+        for node_id in matched:
+            ancestor = self.parents.get(node_id)
+            while ancestor is not None and ancestor not in matched:
+                ancestor = self.parents.get(ancestor)
+            if ancestor is None:
+                outermost.append(self.entries[node_id])
+        return sorted(outermost, key=lambda entry: entry[3])
+
+
+class IndexCache:
+    """
+    进程内按键缓存构建好的索引（LRU），键中应包含文件版本或代数
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self.lock:
+            index = self.entries.get(key)
+            if index is not None:
+                self.entries.move_to_end(key)
+            return index
+
+    def set(self, key: str, index: Any):
+        with self.lock:
+            self.entries[key] = index
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+index_cache = IndexCache(INDEX_CACHE_SIZE)
+
+
+def document_index(roots: List[dict], max_depth: Optional[int] = None, key: Optional[str] = None) -> NodeIndex:
+    """
+    构建节点索引；key（包含文件版本）非空时在进程内缓存，同一版本的文档重复查询时复用
+    """
+    if key is None:
+        return NodeIndex(roots, max_depth)
+    # 缓存的索引引用的是上一次解码的原始文档，内容相同
+    index = index_cache.get(key)
+    if index is None:
+        index = NodeIndex(roots, max_depth)
+        index_cache.set(key, index)
+    return index
@@ -0,0 +1,151 @@
+import math
+import time
+from collections import defaultdict
+from typing import Dict, List, Literal, Optional, Tuple
+
+RegionMode = Literal["intersects", "contains", "within"]
+# 覆盖格子数超过该值的节点（页面级 Frame 等）不放入网格，查询时逐个检查
+MAX_NODE_CELLS = 64
+# 平均每个格子的节点数，决定格子边长
+NODES_PER_CELL = 4
+
+
+class PageGrid:
+    """
+    单个页面的均匀网格索引：节点按 absoluteBoundingBox 放入覆盖的格子，查询只检查与区域相交的格子
+    """
+
+    def __init__(self, page: dict):
+        self.page_id = page.get("id", "")
+        self.page_name = page.get("name", "")
+        # 节点属性按文档顺序存放在并列数组中，格子中只保存下标
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.types: List[str] = []
+        self.parents: List[Optional[str]] = []
+        self.depths: List[int] = []
+        self.boxes: List[Tuple[float, float, float, float]] = []
+
+        stack: List[Tuple[dict, Optional[str], int]] = [
+            (child, None, 0) for child in reversed(page.get("children", []) or []) if child.get("visible", True)
+        ]
+        while stack:
+            node, parent_id, depth = stack.pop()
+            box = node.get("absoluteBoundingBox")
+            if box:
+                x, y = box.get("x", 0), box.get("y", 0)
+                self.ids.append(node.get("id", ""))
+                self.names.append(node.get("name", ""))
+                self.types.append(node.get("type", ""))
+                self.parents.append(parent_id)
+                self.depths.append(depth)
+                self.boxes.append((x, y, x + box.get("width", 0), y + box.get("height", 0)))
+            children = [child for child in node.get("children", []) or [] if child.get("visible", True)]
+            stack.extend((child, node.get("id", ""), depth + 1) for child in reversed(children))
+
+        self.cells: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+        self.large: List[int] = []
+        if not self.boxes:
+            self.cell_size = 1.0
+            return
+        min_x = min(box[0] for box in self.boxes)
+        min_y = min(box[1] for box in self.boxes)
+        max_x = max(box[2] for box in self.boxes)
+        max_y = max(box[3] for box in self.boxes)
+        area = max((max_x - min_x) * (max_y - min_y), 1.0)
+        self.cell_size = max(math.sqrt(area * NODES_PER_CELL / len(self.boxes)), 1.0)
+        for i, box in enumerate(self.boxes):
+            x0, y0, x1, y1 = self.cell_range(*box)
+            if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_NODE_CELLS:
+                self.large.append(i)
+                continue
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    self.cells[(cx, cy)].append(i)
+
+    def cell_range(self, x0: float, y0: float, x1: float, y1: float) -> Tuple[int, int, int, int]:
+        size = self.cell_size
+        return math.floor(x0 / size), math.floor(y0 / size), math.floor(x1 / size), math.floor(y1 / size)
+
+    def candidates(self, x0: float, y0: float, x1: float, y1: float) -> List[int]:
+        cx0, cy0, cx1, cy1 = self.cell_range(x0, y0, x1, y1)
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(self.cells):
+            # 区域覆盖的格子多于非空格子时直接遍历非空格子
+            found = {i for (cx, cy), items in self.cells.items() if cx0 <= cx <= cx1 and cy0 <= cy <= cy1 for i in items}
+        else:
+            found = set()
+            for cx in range(cx0, cx1 + 1):
+                for cy in range(cy0, cy1 + 1):
+                    items = self.cells.get((cx, cy))
+                    if items:
+                        found.update(items)
+        found.update(self.large)
+        return sorted(found)
+
+    def query(self, x0: float, y0: float, x1: float, y1: float, mode: RegionMode) -> List[int]:
+        """
+        返回按文档顺序排列的节点下标；边界相接也算相交，宽高为 0 时即为点查询
+        """
+        if mode == "contains":
+            # 包含整个区域的节点必然包含其左上角，只需检查该点所在的格子
+            candidates = self.candidates(x0, y0, x0, y0)
+        else:
+            candidates = self.candidates(x0, y0, x1, y1)
+        boxes = self.boxes
+        if mode == "intersects":
+            return [i for i in candidates if boxes[i][0] <= x1 and x0 <= boxes[i][2] and boxes[i][1] <= y1 and y0 <= boxes[i][3]]
+        if mode == "contains":
+            return [i for i in candidates if boxes[i][0] <= x0 and x1 <= boxes[i][2] and boxes[i][1] <= y0 and y1 <= boxes[i][3]]
+        return [i for i in candidates if x0 <= boxes[i][0] and boxes[i][2] <= x1 and y0 <= boxes[i][1] and boxes[i][3] <= y1]
+
+    def describe(self, i: int) -> dict:
+        x0, y0, x1, y1 = self.boxes[i]
+        return {
+            "id": self.ids[i],
+            "name": self.names[i],
+            "type": self.types[i],
+            "parentId": self.parents[i],
+            "depth": self.depths[i],
+            "box": {"x": x0, "y": y0, "width": x1 - x0, "height": y1 - y0},
+        }
+
+
+class SpatialIndex:
+    """
+    文件中各页面的网格索引；version 为构建时的文件版本，checked_at 为最近一次确认版本未变的时间
+    """
+
+    def __init__(self, document: dict, version: str):
+        self.version = version
+        self.checked_at = time.time()
+        self.pages = [PageGrid(page) for page in document.get("children", []) or []]
+        self.node_count = sum(len(page.ids) for page in self.pages)
+
+    def find_pages(self, page: Optional[str]) -> List[PageGrid]:
+        if not page:
+            return self.pages
+        pages = [grid for grid in self.pages if page in (grid.page_id, grid.page_name)]
+        if not pages:
+            raise ValueError(f"Page not found: {page}")
+        return pages
+
+    def query(self, x: float, y: float, width: float, height: float, mode: RegionMode = "intersects",
+              page: Optional[str] = None, limit: int = 200) -> dict:
+        if width < 0 or height < 0:
+            raise ValueError("width and height must not be negative")
+        start = time.perf_counter()
+        nodes = []
+        total = 0
+        for grid in self.find_pages(page):
+            matched = grid.query(x, y, x + width, y + height, mode)
+            total += len(matched)
+            for i in matched[:max(limit - len(nodes), 0)]:
+                nodes.append({**grid.describe(i), "pageId": grid.page_id})
+        return {
+            "mode": mode,
+            "region": {"x": x, "y": y, "width": width, "height": height},
+            "total": total,
+            "truncated": total > len(nodes),
+            "nodes": nodes,
+            "queryMs": round((time.perf_counter() - start) * 1000, 3),
+        }
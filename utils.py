@@ -88,12 +88,17 @@ def generate_var_id(prefix: str = "var") -> str:
     return f"{prefix}_{result}"
 
 
-def find_or_create_var(global_vars: Dict[str, Any], value: Any, prefix: str) -> str:
-    # 查找已存在的变量名
-    for var_id, existing_value in global_vars.get("styles", {}).items():
+def find_or_create_var(global_vars: Dict[str, Any], value: Any, prefix: str, counters: Optional[Dict[str, int]] = None) -> str:
+    # 查找已存在的变量名，counters 不为 None 时记录比较次数
+    for index, (var_id, existing_value) in enumerate(global_vars.get("styles", {}).items()):
         if json.dumps(existing_value, sort_keys=True) == json.dumps(value, sort_keys=True):
+            if counters is not None:
+                counters["varComparisons"] += index + 1
             return var_id
 
+    if counters is not None:
+        counters["varComparisons"] += len(global_vars.get("styles", {}))
+
     # 不存在则创建新变量
     var_id = generate_var_id(prefix)
     global_vars.setdefault("styles", {})[var_id] = value
@@ -123,38 +128,22 @@ def is_truthy(val) -> bool:
     return bool(val)
 
 
-def translate_scale_mode(scale_mode: str, has_children: bool, scaling_factor: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, bool]]:
-    is_background = has_children
+# 图片缩放模式转换表：(scaleMode, 是否为背景) -> CSS；结果对象在各节点间共享，调用方不可修改
+SCALE_MODE_CSS: Dict[Tuple[str, bool], Dict[str, Any]] = {
+    ("FILL", True): {"backgroundSize": "cover", "backgroundRepeat": "no-repeat", "isBackground": True},
+    ("FILL", False): {"objectFit": "cover", "isBackground": False},
+    ("FIT", True): {"backgroundSize": "contain", "backgroundRepeat": "no-repeat", "isBackground": True},
+    ("FIT", False): {"objectFit": "contain", "isBackground": False},
+    ("STRETCH", True): {"backgroundSize": "100% 100%", "backgroundRepeat": "no-repeat", "isBackground": True},
+    ("STRETCH", False): {"objectFit": "fill", "isBackground": False},
+}
+DEFAULT_PROCESSING: Dict[str, bool] = {"needsCropping": False, "requiresImageDimensions": False}
+TILE_PROCESSING: Dict[str, bool] = {"needsCropping": False, "requiresImageDimensions": True}
+EMPTY_CSS: Dict[str, Any] = {}
 
-    if scale_mode == "FILL":
-        css = {
-            "backgroundSize": "cover",
-            "backgroundRepeat": "no-repeat",
-            "isBackground": True
-        } if is_background else {
-            "objectFit": "cover",
-            "isBackground": False
-        }
-        processing = {
-            "needsCropping": False,
-            "requiresImageDimensions": False
-        }
 
-    elif scale_mode == "FIT":
-        css = {
-            "backgroundSize": "contain",
-            "backgroundRepeat": "no-repeat",
-            "isBackground": True
-        } if is_background else {
-            "objectFit": "contain",
-            "isBackground": False
-        }
-        processing = {
-            "needsCropping": False,
-            "requiresImageDimensions": False
-        }
-
-    elif scale_mode == "TILE":
+def translate_scale_mode(scale_mode: str, has_children: bool, scaling_factor: Optional[float] = None) -> Tuple[Dict[str, Any], Dict[str, bool]]:
+    if scale_mode == "TILE":
         background_size = (
             f"calc(var(--original-width) * {scaling_factor}) "
             f"calc(var(--original-height) * {scaling_factor})"
@@ -165,33 +154,10 @@ def translate_scale_mode(scale_mode: str, has_children: bool, scaling_factor: Op
             "backgroundSize": background_size,
             "isBackground": True
         }
-        processing = {
-            "needsCropping": False,
-            "requiresImageDimensions": True
-        }
-
-    elif scale_mode == "STRETCH":
-        css = {
-            "backgroundSize": "100% 100%",
-            "backgroundRepeat": "no-repeat",
-            "isBackground": True
-        } if is_background else {
-            "objectFit": "fill",
-            "isBackground": False
-        }
-        processing = {
-            "needsCropping": False,
-            "requiresImageDimensions": False
-        }
+        return css, dict(TILE_PROCESSING)
 
-    else:
-        css = {}
-        processing = {
-            "needsCropping": False,
-            "requiresImageDimensions": False
-        }
-
-    return css, processing
+    # processing 直接作为节点的 imageDownloadArguments 输出，每次返回新对象；css 由调用方展开，可以共享
+    return SCALE_MODE_CSS.get((scale_mode, bool(has_children)), EMPTY_CSS), dict(DEFAULT_PROCESSING)
 
 
 def generate_transform_hash(transform: List[List[float]]) -> str:
@@ -218,34 +184,52 @@ def handle_image_transform(image_transform: List[List[float]]) -> Dict[str, Any]
     }
 
 
-def convert_color(color: dict, opacity: Optional[float] = 1.0) -> Tuple[str, float]:
-    r = round(color.get("r", 0) * 255)
-    g = round(color.get("g", 0) * 255)
-    b = round(color.get("b", 0) * 255)
+# 颜色转换缓存：(r, g, b, a, opacity) -> ((#RRGGBB, alpha), rgba(...))，可由批量转换预先填充
+COLOR_CACHE: Dict[Tuple[float, float, float, float, float], Tuple[Tuple[str, float], str]] = {}
+COLOR_CACHE_SIZE = 65536
 
-    # 透明度相乘，并保留两位小数
-    a = round(opacity * color.get("a", 1) * 100) / 100
 
+def compute_color(r: float, g: float, b: float, a: float, opacity: float) -> Tuple[Tuple[str, float], str]:
+    red, green, blue = round(r * 255), round(g * 255), round(b * 255)
+    # 透明度相乘，并保留两位小数
+    alpha = round(opacity * a * 100) / 100
     # 构造 #RRGGBB
-    hex_color = "#{:02X}{:02X}{:02X}".format(r, g, b)
+    hex_color = "#{:02X}{:02X}{:02X}".format(red, green, blue)
+    return (hex_color, alpha), f"rgba({red}, {green}, {blue}, {alpha})"
+
+
+def color_entry(color: dict, opacity: float) -> Tuple[Tuple[str, float], str]:
+    key = (color.get("r", 0), color.get("g", 0), color.get("b", 0), color.get("a", 1), opacity)
+    entry = COLOR_CACHE.get(key)
+    if entry is None:
+        entry = compute_color(*key)
+        if len(COLOR_CACHE) >= COLOR_CACHE_SIZE:
+            COLOR_CACHE.clear()
+        COLOR_CACHE[key] = entry
+    return entry
 
-    return hex_color, a
+
+def prime_colors(entries: Dict[Tuple[float, float, float, float, float], Tuple[Tuple[str, float], str]]):
+    if len(COLOR_CACHE) + len(entries) > COLOR_CACHE_SIZE:
+        COLOR_CACHE.clear()
+    COLOR_CACHE.update(entries)
+
+
+def convert_color(color: dict, opacity: Optional[float] = 1.0) -> Tuple[str, float]:
+    return color_entry(color, opacity)[0]
 
 
 def format_rgba_color(color: dict, opacity: Optional[float] = 1.0):
-    r = round(color.get("r", 0) * 255)
-    g = round(color.get("g", 0) * 255)
-    b = round(color.get("b", 0) * 255)
-    # 透明度相乘，并保留两位小数
-    a = round(opacity * color.get("a", 1) * 100) / 100
+    return color_entry(color, opacity)[1]
+
 
-    return f"rgba({r}, {g}, {b}, {a})"
+PATTERN_HORIZONTAL = {"CENTER": "center", "END": "right"}
+PATTERN_VERTICAL = {"CENTER": "center", "END": "bottom"}
 
 
 def parse_pattern_paint(raw: dict):
-    background_repeat = "repeat"
-    horizontal = "center" if raw.get("horizontalAlignment") == "CENTER" else "right" if raw.get("horizontalAlignment") == "END" else "left"
-    vertical = "center" if raw.get("verticalAlignment") == "CENTER" else "bottom" if raw.get("verticalAlignment") == "END" else "top"
+    horizontal = PATTERN_HORIZONTAL.get(raw.get("horizontalAlignment"), "left")
+    vertical = PATTERN_VERTICAL.get(raw.get("verticalAlignment"), "top")
 
     return {
         "type": raw.get("type"),
@@ -253,57 +237,74 @@ def parse_pattern_paint(raw: dict):
             "type": "IMAGE-PNG",
             "nodeId": raw.get("sourceNodeId"),
         },
-        "backgroundRepeat": background_repeat,
+        "backgroundRepeat": "repeat",
         "backgroundSize": str(round(raw.get("scalingFactor", 1) * 100)) + "%",
         "backgroundPosition": f"{horizontal} {vertical}"
     }
 
 
-def parse_paint(raw: dict, has_children=False):
-    if raw.get("type") == "IMAGE":
-        base = {
-            "type": "IMAGE",
-            "imageRef": raw.get("imageRef"),
-            "scaleMode": raw.get("scaleMode"),
-            "scalingFactor": raw.get("scalingFactor"),
+def parse_image_paint(raw: dict, has_children=False):
+    base = {
+        "type": "IMAGE",
+        "imageRef": raw.get("imageRef"),
+        "scaleMode": raw.get("scaleMode"),
+        "scalingFactor": raw.get("scalingFactor"),
+    }
+
+    is_background = has_children or base.get("scaleMode") == "TILE"
+    css, processing = translate_scale_mode(base.get("scaleMode"), is_background, raw.get("scalingFactor"))
+
+    final_processing = processing
+    if raw.get("imageTransform"):
+        transform_processing = handle_image_transform(raw.get("imageTransform"))
+        final_processing = {
+            **processing,
+            **transform_processing,
+            "requiresImageDimensions": processing.get("requiresImageDimensions") or transform_processing.get("requiresImageDimensions")
         }
 
-        is_background = has_children or base.get("scaleMode") == "TILE"
-        css, processing = translate_scale_mode(base.get("scaleMode"), is_background, raw.get("scalingFactor"))
+    return {
+        **base,
+        **css,
+        "imageDownloadArguments": final_processing,
+    }
+
 
-        final_processing = processing
-        if raw.get("imageTransform"):
-            transform_processing = handle_image_transform(raw.get("imageTransform"))
-            final_processing = {
-                **processing,
-                **transform_processing,
-                "requiresImageDimensions": processing.get("requiresImageDimensions") or transform_processing.get("requiresImageDimensions")
+def parse_solid_paint(raw: dict, has_children=False):
+    (color, opacity), rgba = color_entry(raw.get("color", {}), raw.get("opacity", 1))
+    return color if opacity == 1 else rgba
+
+
+def parse_gradient_paint(raw: dict, has_children=False):
+    return {
+        "type": raw.get("type"),
+        "gradientHandlePositions": raw.get("gradientHandlePositions"),
+        "gradientStops": [
+            {
+                "position": stop.get("position"),
+                "color": convert_color(stop.get("color"))
             }
+            for stop in raw.get("gradientStops", [])
+        ]
+    }
 
-        return {
-            **base,
-            **css,
-            "imageDownloadArguments": final_processing,
-        }
-    elif raw.get("type") == "SOLID":
-        color, opacity = convert_color(raw.get("color", {}), raw.get("opacity", 1))
-        return color if opacity == 1 else format_rgba_color(raw.get("color", {}), raw.get("opacity", 1))
-    elif raw.get("type") == "PATTERN":
-        return parse_pattern_paint(raw)
-    elif raw.get("type") in ["GRADIENT_LINEAR", "GRADIENT_RADIAL", "GRADIENT_ANGULAR", "GRADIENT_DIAMOND"]:
-        return {
-            "type": raw.get("type"),
-            "gradientHandlePositions": raw.get("gradientHandlePositions"),
-            "gradientStops": [
-                {
-                    "position": stop.get("position"),
-                    "color": convert_color(stop.get("color"))
-                }
-                for stop in raw.get("gradientStops", [])
-            ]
-        }
-    else:
+
+PAINT_PARSERS: Dict[str, Callable[..., Any]] = {
+    "IMAGE": parse_image_paint,
+    "SOLID": parse_solid_paint,
+    "PATTERN": lambda raw, has_children=False: parse_pattern_paint(raw),
+    "GRADIENT_LINEAR": parse_gradient_paint,
+    "GRADIENT_RADIAL": parse_gradient_paint,
+    "GRADIENT_ANGULAR": parse_gradient_paint,
+    "GRADIENT_DIAMOND": parse_gradient_paint,
+}
+
+
+def parse_paint(raw: dict, has_children=False):
+    parser = PAINT_PARSERS.get(raw.get("type"))
+    if parser is None:
         raise ValueError("Unknown paint type: " + raw.get("type"))
+    return parser(raw, has_children)
 
 
 def is_stroke_weights(val: object) -> bool: